@@ -0,0 +1,127 @@
+import time
+import threading
+from collections import OrderedDict
+import numpy as np
+
+from helper_functions import tracing
+from helper_functions.grant_detector import normalize_question
+from helper_functions.vectorstore import get_index_version
+
+class AnswerCache:
+    """
+    Cache of final answers in front of the QA chain.
+
+    A lookup first tries the exact normalized question, then any cached question about the
+    same detected grant whose embedding has cosine similarity of at least
+    `similarity_threshold`. Entries expire after `ttl_seconds`, the least recently used
+    entry is evicted past `max_entries`, and everything is dropped when the published
+    index version changes.
+
+    Questions are embedded as asked, the same text the retriever embeds, so with the
+    shared CachedEmbeddings a miss costs one embedding call rather than two.
+    """
+
+    def __init__(self, embedder=None, max_entries=256, ttl_seconds=6 * 3600,
+                 similarity_threshold=0.95, version_fn=get_index_version, embedder_fn=None):
+        # `embedder_fn` is called for the embedder at lookup time, for callers that
+        # should not build one up front
+        self.embedder = embedder
+        self.embedder_fn = embedder_fn
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.similarity_threshold = similarity_threshold
+        self.version_fn = version_fn
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.latency_saved = 0.0
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._version = None
+
+    def _check_version(self):
+        version = self.version_fn()
+        if version != self._version:
+            self._entries.clear()
+            self._version = version
+
+    def _expire(self, now):
+        expired = [key for key, entry in self._entries.items() if now - entry["created"] > self.ttl_seconds]
+        for key in expired:
+            del self._entries[key]
+
+    def _embed(self, question):
+        embedder = self.embedder if self.embedder is not None or self.embedder_fn is None else self.embedder_fn()
+        if embedder is None:
+            return None
+        try:
+            vector = np.asarray(embedder.embed_query(question), dtype=np.float32)
+        except Exception as error:
+            # Semantic lookup is best effort; exact matches still work without it
+            tracing.record_error("answer_cache_embed", error)
+            return None
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else None
+
+    def _serve(self, key, entry):
+        self._entries.move_to_end(key)
+        self.latency_saved += entry["compute_time"]
+        return entry["answer"]
+
+    def get(self, question, grant=None):
+        normalized = normalize_question(question)
+        with self._lock:
+            self._check_version()
+            self._expire(time.monotonic())
+            entry = self._entries.get(normalized)
+            if entry is not None and entry["grant"] == grant:
+                self.exact_hits += 1
+                return self._serve(normalized, entry)
+            candidates = [(key, e) for key, e in self._entries.items()
+                          if e["grant"] == grant and e["vector"] is not None]
+
+        vector = self._embed(question) if candidates else None
+        with self._lock:
+            if vector is not None:
+                matrix = np.stack([e["vector"] for _, e in candidates])
+                scores = matrix @ vector
+                best = int(np.argmax(scores))
+                key, entry = candidates[best]
+                if scores[best] >= self.similarity_threshold and self._entries.get(key) is entry:
+                    self.semantic_hits += 1
+                    return self._serve(key, entry)
+            self.misses += 1
+            return None
+
+    def put(self, question, grant, answer, compute_time=0.0):
+        normalized = normalize_question(question)
+        vector = self._embed(question)
+        with self._lock:
+            self._check_version()
+            self._entries[normalized] = {
+                "answer": answer,
+                "grant": grant,
+                "vector": vector,
+                "created": time.monotonic(),
+                "compute_time": compute_time,
+            }
+            self._entries.move_to_end(normalized)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def metrics(self):
+        with self._lock:
+            hits = self.exact_hits + self.semantic_hits
+            total = hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "exact_hits": self.exact_hits,
+                "semantic_hits": self.semantic_hits,
+                "misses": self.misses,
+                "hit_rate": hits / total if total else 0.0,
+                "latency_saved_seconds": self.latency_saved,
+            }
@@ -0,0 +1,145 @@
+import time
+import asyncio
+import weakref
+
+from helper_functions import clients, qa_chain, resilience, tracing
+from helper_functions.qa_chain import get_retriever
+from helper_functions.single_flight import AsyncSingleFlight
+from helper_functions.grant_detector import detect_grant_from_question, detect_section_from_question, normalize_question
+
+# Max number of LLM and embedding calls in flight at once across all questions
+upstream_concurrency = 8
+
+_semaphores = weakref.WeakKeyDictionary()
+
+# Identical questions, and identical completion prompts, in flight on the event loop share one answer
+answer_flight = AsyncSingleFlight("answer")
+prompt_flight = AsyncSingleFlight("prompt")
+
+def _upstream_semaphore():
+    # asyncio primitives belong to one event loop, so keep one semaphore per loop
+    loop = asyncio.get_running_loop()
+    if loop not in _semaphores:
+        _semaphores[loop] = asyncio.Semaphore(upstream_concurrency)
+    return _semaphores[loop]
+
+async def call_upstream(fn, *args, **kwargs):
+    """
+    Awaits an upstream LLM or embedding coroutine under the global concurrency cap.
+    """
+    async with _upstream_semaphore():
+        return await fn(*args, **kwargs)
+
+async def _search(base_retriever, query):
+    return await asyncio.to_thread(base_retriever.invoke, query)
+
+async def aretrieve(question, detected_grant):
+    """
+    Async counterpart of ExpandingRetriever.invoke: the fast path runs one search,
+    otherwise the expanded variants are embedded in one batch and searched together on
+    the in-memory index, or in parallel against Chroma.
+    """
+    from helper_functions import retriever as retriever_module
+
+    retriever = get_retriever(grant_filter=detected_grant if detected_grant else None,
+                              section=detect_section_from_question(question))
+    base = retriever.retriever
+
+    if retriever.fast_path and (retriever.filter_key or await asyncio.to_thread(retriever._is_confident, question)):
+        return await _search(base, question)
+
+    variants = retriever.cache.get(question, retriever.filter_key) if retriever.cache else None
+    if variants is None:
+        variants = await call_upstream(retriever.llm_chain.ainvoke, {"question": question})
+        if retriever.cache:
+            retriever.cache.put(question, retriever.filter_key, variants)
+
+    # Warm the embedding cache with one batched call before the parallel searches
+    await call_upstream(clients.get_embedding().aembed_documents, list(variants))
+    if retriever_module.vector_backend == "numpy" and hasattr(base, "batch_search"):
+        results = await asyncio.to_thread(retriever_module.batch_search, base, list(variants))
+    else:
+        results = await asyncio.gather(*(_search(base, variant) for variant in variants))
+    return retriever.unique_union([doc for docs in results for doc in docs])
+
+async def aget_final_response(question: str, timeout=None) -> str:
+    """
+    Async version of qa_chain.get_final_response. Grant detection and embedding the
+    question run concurrently; upstream calls share the global semaphore. Identical
+    questions in flight share one answer, each caller waiting at most `timeout` seconds.
+    """
+    try:
+        detected_grant, _ = await asyncio.gather(
+            asyncio.to_thread(detect_grant_from_question, question),
+            call_upstream(clients.get_embedding().aembed_query, question),
+        )
+    except Exception as error:
+        tracing.record_error("detection", error)
+        return qa_chain.fallback_response
+
+    if qa_chain.is_security_agency_question(question, detected_grant):
+        return qa_chain.security_agency_response
+
+    overview = qa_chain.answer_from_profile(question, detected_grant)
+    if overview is not None:
+        return overview
+
+    if not qa_chain.coalesce_questions:
+        return await _agenerate_answer(question, detected_grant)
+    try:
+        response, _ = await answer_flight.do(
+            (normalize_question(question), detected_grant),
+            lambda: _agenerate_answer(question, detected_grant),
+            timeout=timeout
+        )
+        return response
+    except asyncio.TimeoutError as error:
+        tracing.record_error("answer", error)
+        return qa_chain.fallback_response
+
+async def _agenerate_answer(question, detected_grant):
+    cached = qa_chain.answer_cache.get(question, detected_grant)
+    if cached is not None:
+        return cached
+
+    from helper_functions.context_packer import pack_context
+    start = time.perf_counter()
+    try:
+        with resilience.deadline():
+            with resilience.stage("retrieval"):
+                docs, _ = pack_context(await aretrieve(question, detected_grant))
+            if not docs:
+                return qa_chain.fallback_response
+
+            context = "\n\n".join(doc.page_content for doc in docs)
+            prompt = qa_chain.get_prompt().format(context=context, question=question)
+            try:
+                with resilience.stage("generation"):
+                    message, _ = await prompt_flight.do(prompt, lambda: resilience.acall_llm(
+                        call_upstream, clients.get_llm().ainvoke, prompt))
+            except Exception as error:
+                # Generation failed or ran out of time: show what retrieval found (not cached)
+                tracing.record_error("generation", error)
+                return qa_chain.degraded_answer(docs, detected_grant)
+        final_answer = message.content.strip()
+
+        if qa_chain.is_fallback_answer(final_answer):
+            return qa_chain.fallback_response
+
+        response = f"{final_answer}{qa_chain.format_answer_suffix(docs, detected_grant)}"
+        qa_chain.answer_cache.put(question, detected_grant, response, time.perf_counter() - start)
+        return response
+
+    # 🛠️ Catch-all error handler
+    except Exception as error:
+        tracing.record_error("answer", error)
+        return qa_chain.fallback_response
+
+async def abatch_final_responses(questions):
+    """
+    Answers many questions concurrently and returns the answers in the same order.
+    """
+    return await asyncio.gather(*(aget_final_response(q) for q in questions))
+
+def batch_final_responses(questions):
+    return asyncio.run(abatch_final_responses(questions))
@@ -0,0 +1,77 @@
+"""
+HTML extraction benchmark.
+
+Measures parse time and peak Python memory (tracemalloc) of every extraction backend,
+and of cached extraction, against the original BeautifulSoup get_text approach over the
+bundled files in data/manual_scrapes. Run with:
+
+    python -m helper_functions.benchmark_extraction
+"""
+import os
+import sys
+import time
+import tempfile
+import argparse
+import tracemalloc
+from bs4 import BeautifulSoup
+
+from helper_functions import html_extractor
+
+manual_scrape_dir = "data/manual_scrapes"
+
+def original_extract(html):
+    # What load_manual_documents did before html_extractor existed
+    return BeautifulSoup(html, "html.parser").get_text(separator="\n", strip=True)
+
+def bundled_files(directory=manual_scrape_dir):
+    return [os.path.join(directory, name) for name in sorted(os.listdir(directory)) if name.endswith(".html")]
+
+def measure(extract, inputs):
+    tracemalloc.start()
+    start = time.perf_counter()
+    chars = sum(len(extract(item)) for item in inputs)
+    seconds = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {"ms": round(seconds * 1000, 1), "peak_kb": peak // 1024, "chars": chars}
+
+def run_benchmark(directory=manual_scrape_dir):
+    files = bundled_files(directory)
+    pages = []
+    for path in files:
+        with open(path, "r", encoding="utf-8") as f:
+            pages.append(f.read())
+
+    results = {"original": measure(original_extract, pages)}
+    for name, extract in html_extractor.backends.items():
+        results[name] = measure(extract, pages)
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        for path in files:
+            html_extractor.extract_file(path, cache_dir=cache_dir)
+        results["cached"] = measure(lambda path: html_extractor.extract_file(path, cache_dir=cache_dir), files)
+
+    results["_input"] = {"files": len(files), "bytes": sum(len(page.encode("utf-8")) for page in pages)}
+    return results
+
+def print_report(results):
+    summary = results["_input"]
+    print(f"📊 {summary['files']} files, {summary['bytes'] / 1e6:.2f} MB of HTML "
+          f"(default backend: {html_extractor.default_backend})")
+    base = results["original"]
+    for name, result in results.items():
+        if name.startswith("_"):
+            continue
+        speedup = base["ms"] / result["ms"] if result["ms"] else float("inf")
+        print(f"  {name:<9} {result['ms']:8.1f}ms  x{speedup:6.1f}  peak {result['peak_kb']:6d}KB  "
+              f"{result['chars']:7d} chars")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--dir", default=manual_scrape_dir, help="directory of .html files")
+    args = parser.parse_args(argv)
+    print_report(run_benchmark(args.dir))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
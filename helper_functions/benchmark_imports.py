@@ -0,0 +1,124 @@
+"""
+Import-time benchmark for the package's entry modules.
+
+Imports each module in a fresh interpreter under `python -X importtime` and reports its
+cumulative import time, the number of modules loaded, the process's peak RSS, and any
+heavy dependency (LangChain, OpenAI, Chroma, the scraper stack) it pulled in. Those are
+meant to load on the first question or index build, never on import, and no client may
+be constructed on import. The limits in `import_budgets` are checked by
+test_benchmark_imports. Run with:
+
+    python -m helper_functions.benchmark_imports [--repeats 5]
+"""
+import os
+import sys
+import json
+import argparse
+import subprocess
+
+# Top-level packages that must only be imported on first use
+heavy_modules = [
+    "langchain", "langchain_openai", "langchain_chroma", "langchain_text_splitters", "langsmith",
+    "openai", "chromadb", "tiktoken", "bs4", "lxml", "requests", "dotenv", "schedule",
+]
+# Max cumulative import time (ms) per entry module: loose enough for a busy CI machine,
+# far below the seconds the eager imports used to take
+import_budgets = {
+    "helper_functions.qa_chain": 1500,
+    "helper_functions.async_qa": 1500,
+    "helper_functions.vectorstore": 1000,
+    "helper_functions.grant_profiles": 800,
+    "helper_functions.grant_detector": 300,
+}
+
+_probe = """
+import sys, json
+import {module}
+from helper_functions import clients
+try:
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / (1e6 if sys.platform == "darwin" else 1e3)
+except ImportError:
+    peak = None
+print(json.dumps({{"modules": sorted(sys.modules), "peak_rss_mb": peak,
+                  "clients_built": clients.llm is not None or clients.embedding is not None}}))
+"""
+
+def parse_importtime(stderr, module):
+    """
+    Cumulative import time of `module` in milliseconds from `-X importtime` output.
+    """
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if name.strip() == module:
+            return int(cumulative) / 1000
+    return None
+
+def measure_import(module, repeats=3):
+    """
+    Imports `module` in `repeats` fresh interpreters and returns the fastest run's
+    import time with the modules it loaded.
+    """
+    env = dict(os.environ)
+    env.setdefault("OPENAI_API_KEY", "import-benchmark")
+    runs = []
+    for _ in range(repeats):
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", _probe.format(module=module)],
+            capture_output=True, text=True, env=env, cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        )
+        if result.returncode != 0:
+            raise RuntimeError(f"Importing {module} failed:\n{result.stderr[-2000:]}")
+        probe = json.loads(result.stdout.strip().splitlines()[-1])
+        probe["import_ms"] = parse_importtime(result.stderr, module)
+        runs.append(probe)
+    fastest = min(runs, key=lambda run: run["import_ms"])
+    top_level = {name.split(".")[0] for name in fastest["modules"]}
+    return {
+        "module": module,
+        "import_ms": round(fastest["import_ms"], 1),
+        "modules_loaded": len(fastest["modules"]),
+        "peak_rss_mb": round(fastest["peak_rss_mb"], 1) if fastest["peak_rss_mb"] else None,
+        "heavy": sorted(top_level & set(heavy_modules)),
+        "clients_built": fastest["clients_built"],
+    }
+
+def check_budgets(results, budgets=None):
+    """
+    Returns one line per budget a measured module exceeds.
+    """
+    budgets = budgets or import_budgets
+    problems = []
+    for result in results:
+        if result["heavy"]:
+            problems.append(f"{result['module']} imports {', '.join(result['heavy'])}")
+        if result["clients_built"]:
+            problems.append(f"{result['module']} constructs an OpenAI client on import")
+        budget = budgets.get(result["module"])
+        if budget is not None and result["import_ms"] > budget:
+            problems.append(f"{result['module']} took {result['import_ms']}ms to import (budget {budget}ms)")
+    return problems
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure import time of the package's entry modules.")
+    parser.add_argument("--repeats", type=int, default=3, help="fresh interpreters per module; the fastest counts")
+    parser.add_argument("modules", nargs="*", help="modules to measure (default: those with a budget)")
+    args = parser.parse_args(argv)
+
+    results = [measure_import(module, args.repeats) for module in args.modules or import_budgets]
+    for result in results:
+        budget = import_budgets.get(result["module"])
+        print(f"  {result['module']:<34} {result['import_ms']:8.1f}ms"
+              f"{f' / {budget}ms' if budget else '':>10}  {result['modules_loaded']:5d} modules  "
+              f"peak RSS {result['peak_rss_mb']}MB  {'heavy: ' + ', '.join(result['heavy']) if result['heavy'] else ''}")
+    problems = check_budgets(results)
+    for problem in problems:
+        print(f"❌ {problem}")
+    if not problems:
+        print("✅ All imports within budget.")
+    return 1 if problems else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
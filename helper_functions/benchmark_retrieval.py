@@ -0,0 +1,323 @@
+"""
+Offline retrieval benchmark and quality harness.
+
+Builds a throwaway index from the bundled pages in data/scraped_pages and
+data/manual_scrapes using deterministic hashing embeddings and a fake LLM, runs the
+golden question set through get_retriever and get_final_response, and compares the
+results with a saved baseline. Run with:
+
+    python -m helper_functions.benchmark_retrieval [--update-baseline]
+"""
+import gc
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import tempfile
+import contextlib
+from typing import Callable
+import numpy as np
+from langchain_chroma import Chroma
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import SimpleChatModel
+
+from helper_functions import clients, qa_chain, retriever, vectorstore
+from helper_functions.answer_cache import AnswerCache
+from helper_functions.bm25_index import build_lexical_index, tokenize
+from helper_functions.context_packer import pack_context
+from helper_functions.grant_profiles import build_grant_profiles, grant_profiles_filename
+from helper_functions.numpy_index import build_vector_codes
+from helper_functions.vector_codes import vector_codes_dirname
+from helper_functions.grant_detector import _detect, detect_grant_from_question, detect_section_from_question
+from helper_functions.indexer import index_documents
+from helper_functions.text_splitter import splitter
+from helper_functions.web_scraper import extract_filename_from_url
+
+golden_path = "data/benchmarks/golden_questions.json"
+baseline_path = "data/benchmarks/retrieval_baseline.json"
+
+# Allowed drift before a run counts as a regression
+quality_tolerance = 0.02
+fallback_tolerance = 0.05
+latency_tolerance = 2.0
+latency_slack_ms = 5.0
+
+stopwords = {
+    "a", "an", "the", "is", "are", "what", "which", "who", "how", "do", "does", "can", "i",
+    "my", "for", "of", "to", "and", "in", "on", "with", "through", "under", "about", "give"
+}
+
+class HashingEmbeddings(Embeddings):
+    """
+    Deterministic offline embeddings: hashed bag of words, L2-normalised.
+    `latency` seconds are slept once per call, like one round trip to the embedding API;
+    `calls` counts the round trips.
+    """
+
+    def __init__(self, dimensions=512, latency=0.0):
+        self.dimensions = dimensions
+        self.model = f"hashing-{dimensions}"
+        self.latency = latency
+        self.calls = 0
+
+    def embed_query(self, text):
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        return self._embed(text)
+
+    def embed_documents(self, texts):
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        return [self._embed(text) for text in texts]
+
+    def _embed(self, text):
+        vector = np.zeros(self.dimensions, dtype=np.float32)
+        for token in tokenize(text):
+            if token not in stopwords:
+                vector[hash_token(token) % self.dimensions] += 1.0
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+def hash_token(token):
+    # Python's hash() is salted per process; use a stable FNV-1a hash instead
+    h = 2166136261
+    for byte in token.encode("utf-8"):
+        h = ((h ^ byte) * 16777619) & 0xFFFFFFFF
+    return h
+
+class FakeGrantLLM(SimpleChatModel):
+    """
+    Offline stand-in for gpt-4o-mini. Expansion prompts get three variants of the question;
+    answer prompts get the first lines of the context, or "Not found in documents." when
+    the context is empty. A share `error_rate` of calls fails with ConnectionError.
+    `latency_distribution` and `failure_distribution`, when set, are called once per call
+    for its latency in seconds and whether it fails, replacing `latency` and `error_rate`.
+    """
+
+    latency: float = 0.0
+    error_rate: float = 0.0
+    latency_distribution: Callable[[], float] | None = None
+    failure_distribution: Callable[[], bool] | None = None
+    calls: int = 0
+
+    @property
+    def _llm_type(self):
+        return "fake-grant-llm"
+
+    def _call(self, messages, stop=None, run_manager=None, **kwargs):
+        self.calls += 1
+        latency = self.latency_distribution() if self.latency_distribution else self.latency
+        if latency:
+            time.sleep(latency)
+        fails = self.failure_distribution() if self.failure_distribution else \
+            bool(self.error_rate) and random.random() < self.error_rate
+        if fails:
+            raise ConnectionError("injected LLM failure")
+        prompt = messages[-1].content
+        if "Original question:" in prompt:
+            question = prompt.rsplit("Original question:", 1)[1].strip()
+            return f"{question}\nDetails of {question}\nEligibility and application for {question}"
+        context = prompt.split("Context:", 1)[-1].split("Question:", 1)[0].strip()
+        if not context:
+            return "Not found in documents."
+        return "Grant Description:\n" + context[:300]
+
+def tail_latency(typical, slow, slow_share, seed=0):
+    """
+    Latency distribution for FakeGrantLLM: `typical` seconds, but `slow` seconds for a
+    share `slow_share` of calls, like an upstream with a heavy tail.
+    """
+    rng = random.Random(seed)
+    return lambda: slow if rng.random() < slow_share else typical
+
+def load_corpus():
+    """
+    Chunks of every bundled scraped page and manual HTML file, labelled like a refresh would.
+    """
+    docs = []
+    for url, grant_title in vectorstore.url_metadata_map.items():
+        path = os.path.join("data/scraped_pages", extract_filename_from_url(url) + ".txt")
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                docs.append(Document(page_content=f.read(), metadata={"grant_title": grant_title, "source": url}))
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull), \
+            tempfile.TemporaryDirectory() as cache_dir:
+        docs.extend(vectorstore.load_manual_documents(vectorstore.manual_scrape_dir, cache_dir=cache_dir))
+
+    return splitter.split_documents(docs)
+
+@contextlib.contextmanager
+def offline_pipeline(llm_latency=0.0, embedding_latency=0.0, llm_error_rate=0.0):
+    """
+    Points the QA pipeline at a temporary index built with fake embeddings and a fake LLM,
+    restoring the real configuration on exit. Latencies apply once the index is built.
+    """
+    directory = tempfile.mkdtemp(prefix="eurus-bench-")
+    embedder = HashingEmbeddings()
+    llm = FakeGrantLLM(latency=llm_latency, error_rate=llm_error_rate)
+    saved = {
+        (vectorstore, "persist_directory"): vectorstore.persist_directory,
+        (clients, "embedding"): clients.embedding,
+        (clients, "llm"): clients.llm,
+        (qa_chain, "answer_cache"): qa_chain.answer_cache,
+    }
+    try:
+        db = Chroma(persist_directory=directory, embedding_function=embedder,
+                    collection_metadata={"hnsw:space": "cosine"})
+        index_documents(db, load_corpus())
+        build_lexical_index(db, os.path.join(directory, vectorstore.lexical_index_filename))
+        build_grant_profiles(db, os.path.join(directory, grant_profiles_filename))
+        build_vector_codes(db, os.path.join(directory, vector_codes_dirname))
+        vectorstore.publish_index_version(directory)
+
+        vectorstore.persist_directory = directory
+        embedder.latency = embedding_latency
+        clients.embedding = embedder
+        clients.llm = llm
+        qa_chain.answer_cache = AnswerCache(max_entries=0)
+        retriever.invalidate_retrievers()
+        retriever.expansion_cache.clear()
+        yield llm
+    finally:
+        for (module, name), value in saved.items():
+            setattr(module, name, value)
+        retriever.invalidate_retrievers()
+        retriever.expansion_cache.clear()
+        shutil.rmtree(directory, ignore_errors=True)
+
+def percentiles(samples):
+    values = np.asarray(samples) * 1000
+    return {f"p{p}": round(float(np.percentile(values, p)), 3) for p in (50, 95, 99)}
+
+def run_benchmark(golden=None, llm_latency=0.0):
+    if golden is None:
+        with open(golden_path, "r", encoding="utf-8") as f:
+            golden = json.load(f)
+
+    k = retriever._build_search_kwargs(None)["k"]
+    timings = {"detection": [], "retriever_construction": [], "retrieval": [], "answer": []}
+    hits, reciprocal_ranks, grant_precision, fallbacks = [], [], [], 0
+    context_tokens, tokens_saved = [], []
+    per_question = []
+
+    with offline_pipeline(llm_latency=llm_latency):
+        # Collect the garbage of building the index now rather than inside a timed stage
+        gc.collect()
+        for case in golden:
+            question = case["question"]
+            expected = set(case["expected_sources"])
+
+            _detect.cache_clear()
+            start = time.perf_counter()
+            grant = detect_grant_from_question(question)
+            timings["detection"].append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            active = retriever.get_retriever(grant_filter=grant, section=detect_section_from_question(question))
+            timings["retriever_construction"].append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            docs = active.invoke(question)
+            timings["retrieval"].append(time.perf_counter() - start)
+
+            _, packing = pack_context(docs)
+            context_tokens.append(packing["context_tokens"])
+            tokens_saved.append(packing["tokens_saved"])
+
+            start = time.perf_counter()
+            answer = qa_chain.get_final_response(question)
+            timings["answer"].append(time.perf_counter() - start)
+
+            docs = docs[:k]
+            ranks = [i for i, doc in enumerate(docs, start=1) if doc.metadata.get("source") in expected]
+            hits.append(bool(ranks))
+            reciprocal_ranks.append(1 / ranks[0] if ranks else 0.0)
+            grant_precision.append(
+                sum(doc.metadata.get("grant_title") == case["expected_grant"] for doc in docs) / len(docs)
+                if docs else 0.0
+            )
+            fallbacks += answer == qa_chain.fallback_response
+            per_question.append({"question": question, "detected_grant": grant,
+                                 "first_relevant_rank": ranks[0] if ranks else None})
+
+    return {
+        "questions": len(golden),
+        "k": k,
+        f"recall@{k}": round(sum(hits) / len(hits), 4),
+        "mrr": round(sum(reciprocal_ranks) / len(reciprocal_ranks), 4),
+        "grant_precision": round(sum(grant_precision) / len(grant_precision), 4),
+        "fallback_rate": round(fallbacks / len(golden), 4),
+        "context_tokens_mean": round(sum(context_tokens) / len(context_tokens), 1),
+        "tokens_saved_mean": round(sum(tokens_saved) / len(tokens_saved), 1),
+        "latency_ms": {stage: percentiles(samples) for stage, samples in timings.items()},
+        "per_question": per_question,
+    }
+
+def compare_with_baseline(results, baseline, check_latency=True):
+    """
+    Returns a list of human-readable regressions of `results` against `baseline`.
+    """
+    regressions = []
+    for metric in [key for key in baseline if key.startswith("recall@")] + ["mrr", "grant_precision"]:
+        if results.get(metric, 0.0) < baseline[metric] - quality_tolerance:
+            regressions.append(f"{metric} dropped from {baseline[metric]} to {results.get(metric)}")
+    if results["fallback_rate"] > baseline["fallback_rate"] + fallback_tolerance:
+        regressions.append(f"fallback_rate rose from {baseline['fallback_rate']} to {results['fallback_rate']}")
+    for stage, base in baseline["latency_ms"].items() if check_latency else ():
+        limit = base["p95"] * latency_tolerance + latency_slack_ms
+        current = results["latency_ms"].get(stage, {}).get("p95")
+        if current is not None and current > limit:
+            regressions.append(f"{stage} p95 latency {current}ms exceeds {limit:.1f}ms")
+    return regressions
+
+def print_report(results):
+    print(f"📊 {results['questions']} golden questions, k={results['k']}")
+    for key in [key for key in results if key.startswith("recall@")] + ["mrr", "grant_precision", "fallback_rate"]:
+        print(f"  {key:<16} {results[key]}")
+    if "context_tokens_mean" in results:
+        print(f"  context tokens   {results['context_tokens_mean']} per question "
+              f"({results['tokens_saved_mean']} saved by packing)")
+    for stage, values in results["latency_ms"].items():
+        print(f"  {stage:<24} p50 {values['p50']:8.3f}ms  p95 {values['p95']:8.3f}ms  p99 {values['p99']:8.3f}ms")
+    misses = [q["question"] for q in results["per_question"] if q["first_relevant_rank"] is None]
+    if misses:
+        print("  ⚠️ No relevant source retrieved for:")
+        for question in misses:
+            print(f"    - {question}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--update-baseline", action="store_true", help="overwrite the saved baseline")
+    parser.add_argument("--llm-latency", type=float, default=0.0, help="seconds per fake LLM call")
+    args = parser.parse_args(argv)
+
+    results = run_benchmark(llm_latency=args.llm_latency)
+    print_report(results)
+
+    if args.update_baseline or not os.path.exists(baseline_path):
+        baseline = {key: value for key, value in results.items() if key != "per_question"}
+        os.makedirs(os.path.dirname(baseline_path), exist_ok=True)
+        with open(baseline_path, "w", encoding="utf-8") as f:
+            json.dump(baseline, f, indent=2)
+            f.write("\n")
+        print(f"💾 Baseline written to {baseline_path}")
+        return 0
+
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        regressions = compare_with_baseline(results, json.load(f))
+    if regressions:
+        print("❌ Regressions against baseline:")
+        for regression in regressions:
+            print(f"  - {regression}")
+        return 1
+    print("✅ No regressions against baseline.")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
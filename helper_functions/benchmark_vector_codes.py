@@ -0,0 +1,132 @@
+"""
+Compact vector codes vs full-precision vectors on the real collection size.
+
+Indexes the bundled pages into a temporary Chroma collection with deterministic hashing
+embeddings of the production dimensionality, saves the vector codes a refresh publishes,
+and runs every golden question and its expanded variants (unfiltered and with each grant
+and section filter) through the full-precision NumPy index and through the int8 and
+binary indexes that search the codes and re-rank a shortlist. Reports the memory each
+keeps resident, the files on disk, search latency, and recall against full precision:
+top-k similarity results, MMR results, and the codes alone without re-ranking. Run with:
+
+    python -m helper_functions.benchmark_vector_codes [--dimensions 1536] [--repeats 5]
+"""
+import os
+import sys
+import json
+import shutil
+import argparse
+import tempfile
+import numpy as np
+from langchain_chroma import Chroma
+
+from helper_functions import vector_codes
+from helper_functions.benchmark_retrieval import HashingEmbeddings, golden_path, load_corpus, percentiles
+from helper_functions.benchmark_vector_index import _search_cases, _timed, _variants, production_dimensions
+from helper_functions.indexer import index_documents
+from helper_functions.numpy_index import NumpyVectorIndex, build_vector_codes, parse_filter
+
+# Lowest mean recall@k against full precision each quantization must keep
+min_recall = {"int8": 0.98, "binary": 0.9}
+
+def _recall(expected, found):
+    return len(set(expected) & set(found)) / len(expected) if expected else 1.0
+
+def _codes_only(index, vectors, k, where):
+    """
+    Top-k rows by code score alone, to show what re-ranking recovers.
+    """
+    rows = np.arange(len(index))[index.rows(*parse_filter(where))]
+    scores = index.codes.scores(np.asarray(vectors, dtype=np.float32), rows)
+    return [rows[np.argsort(-row_scores, kind="stable")[:k]].tolist() for row_scores in scores]
+
+def run_benchmark(dimensions=production_dimensions, repeats=5, golden=None):
+    if golden is None:
+        with open(golden_path, "r", encoding="utf-8") as f:
+            golden = json.load(f)
+    directory = tempfile.mkdtemp(prefix="eurus-codes-bench-")
+    embedder = HashingEmbeddings(dimensions=dimensions)
+    try:
+        db = Chroma(persist_directory=directory, embedding_function=embedder,
+                    collection_metadata={"hnsw:space": "cosine"})
+        index_documents(db, load_corpus())
+        codes_directory = os.path.join(directory, vector_codes.vector_codes_dirname)
+        full = build_vector_codes(db, codes_directory)
+        indexes = {name: NumpyVectorIndex.from_codes(db, codes_directory, name) for name in vector_codes.quantizations}
+
+        cases = _search_cases(golden)
+        timings = {name: {"single": [], "variants": []} for name in ("float32", *indexes)}
+        recall = {name: {"similarity": [], "mmr": [], "codes_only": []} for name in indexes}
+        for question, search_kwargs in cases:
+            vectors = embedder.embed_documents(_variants(question))
+            k, fetch_k, where = search_kwargs["k"], search_kwargs["fetch_k"], search_kwargs.get("filter")
+
+            expected_top = [[row for row, _ in scored] for scored in full.similarity_search_by_vectors(vectors, k, where)]
+            expected_mmr = full.mmr_search_by_vectors(vectors, k, fetch_k, filter=where)
+            for name, index in (("float32", full), *indexes.items()):
+                _, single = _timed(lambda: index.mmr_search_by_vectors(vectors[:1], k, fetch_k, filter=where), repeats)
+                _, batch = _timed(lambda: index.mmr_search_by_vectors(vectors, k, fetch_k, filter=where), repeats)
+                timings[name]["single"] += single
+                timings[name]["variants"] += batch
+                if name == "float32":
+                    continue
+                top = [[row for row, _ in scored] for scored in index.similarity_search_by_vectors(vectors, k, where)]
+                mmr = index.mmr_search_by_vectors(vectors, k, fetch_k, filter=where)
+                recall[name]["similarity"] += [_recall(e, f) for e, f in zip(expected_top, top)]
+                recall[name]["mmr"] += [_recall(e, f) for e, f in zip(expected_mmr, mmr)]
+                recall[name]["codes_only"] += [_recall(e, f) for e, f in zip(expected_top, _codes_only(index, vectors, k, where))]
+
+        latency = {name: {stage: percentiles(values) for stage, values in stages.items()} for name, stages in timings.items()}
+        disk = vector_codes.disk_bytes(codes_directory)
+        return {
+            "chunks": len(full),
+            "dimensions": dimensions,
+            "searches": len(cases),
+            "rerank_factors": dict(vector_codes.rerank_factors),
+            # Bytes held in memory: the float32 matrix, or only the codes (exact rows are paged in)
+            "resident_mb": {"float32": round(full.matrix.nbytes / 1e6, 3),
+                            **{name: round(index.codes.nbytes / 1e6, 3) for name, index in indexes.items()}},
+            "memory_saved": {name: round(1 - index.codes.nbytes / full.matrix.nbytes, 4) for name, index in indexes.items()},
+            "disk_mb": {name: round(size / 1e6, 3) for name, size in disk.items()},
+            "chroma_mb": round(sum(os.path.getsize(os.path.join(root, name))
+                                   for root, _, names in os.walk(directory) for name in names
+                                   if not root.startswith(codes_directory)) / 1e6, 2),
+            "recall@k": {name: {kind: round(float(np.mean(values)), 4) for kind, values in kinds.items()}
+                         for name, kinds in recall.items()},
+            "latency_ms": latency,
+            "speedup_p50": {name: {stage: round(latency["float32"][stage]["p50"] / max(latency[name][stage]["p50"], 1e-6), 2)
+                                   for stage in ("single", "variants")} for name in indexes},
+        }
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+def print_report(results):
+    shortlists = ", ".join(f"{name} {factor}x" for name, factor in results["rerank_factors"].items())
+    print(f"\n🗜️ {results['chunks']} chunks x {results['dimensions']} dims, {results['searches']} searches, "
+          f"shortlists re-ranked exactly: {shortlists}")
+    print(f"  resident           " + "  ".join(f"{name} {mb:.3f}MB" for name, mb in results["resident_mb"].items()))
+    print(f"  memory saved       " + "  ".join(f"{name} {share:.1%}" for name, share in results["memory_saved"].items()))
+    print(f"  on disk            " + "  ".join(f"{name} {mb:.3f}MB" for name, mb in results["disk_mb"].items())
+          + f"  (Chroma collection {results['chroma_mb']}MB)")
+    for name, values in results["recall@k"].items():
+        print(f"  {name:<7} recall@k   similarity {values['similarity']:.1%}  mmr {values['mmr']:.1%}  "
+              f"codes only {values['codes_only']:.1%}")
+    for name, stages in results["latency_ms"].items():
+        print(f"  {name:<7} latency  single p50 {stages['single']['p50']:7.3f}ms  "
+              f"variants p50 {stages['variants']['p50']:7.3f}ms  p99 {stages['variants']['p99']:7.3f}ms")
+    for name, speedup in results["speedup_p50"].items():
+        print(f"  {name:<7} speedup  {speedup['single']}x single search, {speedup['variants']}x for a question's variants")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare compact vector codes with full-precision vectors.")
+    parser.add_argument("--dimensions", type=int, default=production_dimensions, help="embedding size")
+    parser.add_argument("--repeats", type=int, default=5, help="timed runs per search")
+    args = parser.parse_args(argv)
+
+    results = run_benchmark(args.dimensions, args.repeats)
+    print_report(results)
+    ok = all(results["recall@k"][name]["similarity"] >= floor for name, floor in min_recall.items())
+    return 0 if ok else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
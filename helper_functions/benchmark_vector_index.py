@@ -0,0 +1,150 @@
+"""
+NumPy vector index vs Chroma on the real collection size.
+
+Indexes the bundled pages (the same chunks a refresh produces) into a temporary Chroma
+collection with deterministic hashing embeddings of the production dimensionality, loads
+the NumPy index from it, and runs every golden question and its expanded variants through
+both backends, unfiltered and with each grant and section filter. Reports how often the
+two return the same chunks in the same order and the latency of single MMR searches and
+of searching a question's variants as one batch. Hashed bag-of-words vectors of unrelated
+chunks tie at zero similarity and the two backends break such ties differently, so when
+ties reach into the MMR candidate pool a result can differ by a chunk or two. Run with:
+
+    python -m helper_functions.benchmark_vector_index [--dimensions 1536] [--repeats 5]
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import numpy as np
+from langchain_chroma import Chroma
+
+from helper_functions.benchmark_retrieval import HashingEmbeddings, golden_path, load_corpus, percentiles
+from helper_functions.indexer import index_documents
+from helper_functions.numpy_index import NumpyVectorIndex
+from helper_functions.retriever import _build_search_kwargs
+
+# text-embedding-ada-002 / text-embedding-3-small vector size
+production_dimensions = 1536
+# Mean share of chunks both backends must agree on
+min_overlap = 0.95
+
+def _variants(question):
+    # The shape of the multi-query expansion: the question and two rewrites
+    return [question, f"Details of {question}", f"Eligibility and application for {question}"]
+
+def _search_cases(golden):
+    """
+    (question, search kwargs) pairs: each golden question unfiltered, filtered to its
+    grant, and filtered to its grant's eligibility section.
+    """
+    cases = []
+    for case in golden:
+        key = (case["expected_grant"],)
+        for search_kwargs in (_build_search_kwargs(None), _build_search_kwargs(key),
+                              _build_search_kwargs(key, "eligibility")):
+            cases.append((case["question"], search_kwargs))
+    return cases
+
+def _timed(fn, repeats):
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = fn()
+        timings.append(time.perf_counter() - start)
+    return result, timings
+
+def run_benchmark(dimensions=production_dimensions, repeats=5, golden=None):
+    if golden is None:
+        with open(golden_path, "r", encoding="utf-8") as f:
+            golden = json.load(f)
+    directory = tempfile.mkdtemp(prefix="eurus-vector-bench-")
+    embedder = HashingEmbeddings(dimensions=dimensions)
+    try:
+        db = Chroma(persist_directory=directory, embedding_function=embedder,
+                    collection_metadata={"hnsw:space": "cosine"})
+        index_documents(db, load_corpus())
+        start = time.perf_counter()
+        index = NumpyVectorIndex.from_chroma(db)
+        load_seconds = time.perf_counter() - start
+
+        identical, overlaps, scores_match = 0, [], 0
+        timings = {"chroma_mmr": [], "numpy_mmr": [], "chroma_variants": [], "numpy_variants": []}
+        cases = _search_cases(golden)
+        for question, search_kwargs in cases:
+            variants = _variants(question)
+            vectors = embedder.embed_documents(variants)
+            k, fetch_k, where = search_kwargs["k"], search_kwargs["fetch_k"], search_kwargs.get("filter")
+
+            chroma_docs, chroma_times = _timed(lambda: db.max_marginal_relevance_search_by_vector(
+                vectors[0], k=k, fetch_k=fetch_k, filter=where), repeats)
+            numpy_rows, numpy_times = _timed(lambda: index.mmr_search_by_vectors(
+                vectors[:1], k=k, fetch_k=fetch_k, filter=where)[0], repeats)
+            timings["chroma_mmr"] += chroma_times
+            timings["numpy_mmr"] += numpy_times
+
+            chroma_ids = [doc.id for doc in chroma_docs]
+            numpy_ids = [index.documents[row].id for row in numpy_rows]
+            identical += chroma_ids == numpy_ids
+            shared = len(set(chroma_ids) & set(numpy_ids))
+            overlaps.append(shared / max(len(chroma_ids), len(numpy_ids)) if chroma_ids or numpy_ids else 1.0)
+
+            chroma_scored = db.similarity_search_with_relevance_scores(question, k=1, filter=where)
+            numpy_scored = index.similarity_search_with_relevance_scores(question, k=1, filter=where)
+            scores_match += (not chroma_scored and not numpy_scored) or (
+                bool(chroma_scored) and bool(numpy_scored)
+                and abs(chroma_scored[0][1] - numpy_scored[0][1]) < 1e-4)
+
+            # All expansion variants: one Chroma query each vs one batched matmul
+            _, chroma_times = _timed(lambda: [db.max_marginal_relevance_search_by_vector(
+                vector, k=k, fetch_k=fetch_k, filter=where) for vector in vectors], repeats)
+            _, numpy_times = _timed(lambda: index.mmr_search_by_vectors(
+                vectors, k=k, fetch_k=fetch_k, filter=where), repeats)
+            timings["chroma_variants"] += chroma_times
+            timings["numpy_variants"] += numpy_times
+
+        latency = {stage: percentiles(values) for stage, values in timings.items()}
+        return {
+            "chunks": len(index),
+            "dimensions": dimensions,
+            "grants": len(index.partitions),
+            "matrix_mb": round(index.matrix.nbytes / 1e6, 2),
+            "load_ms": round(load_seconds * 1000, 1),
+            "searches": len(cases),
+            "identical_rate": round(identical / len(cases), 4),
+            "overlap@k": round(float(np.mean(overlaps)), 4),
+            "relevance_score_match_rate": round(scores_match / len(cases), 4),
+            "latency_ms": latency,
+            "speedup_p50": {
+                "single": round(latency["chroma_mmr"]["p50"] / max(latency["numpy_mmr"]["p50"], 1e-6), 1),
+                "variants": round(latency["chroma_variants"]["p50"] / max(latency["numpy_variants"]["p50"], 1e-6), 1),
+            },
+        }
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+def print_report(results):
+    print(f"\n🧮 {results['chunks']} chunks x {results['dimensions']} dims across {results['grants']} grants: "
+          f"{results['matrix_mb']}MB matrix, loaded in {results['load_ms']}ms")
+    print(f"  same results as Chroma   {results['identical_rate']:.1%} of {results['searches']} searches "
+          f"(overlap@k {results['overlap@k']:.1%}, relevance scores {results['relevance_score_match_rate']:.1%})")
+    for stage, values in results["latency_ms"].items():
+        print(f"  {stage:<18} p50 {values['p50']:8.3f}ms  p95 {values['p95']:8.3f}ms  p99 {values['p99']:8.3f}ms")
+    print(f"  speedup (p50)      {results['speedup_p50']['single']}x single search, "
+          f"{results['speedup_p50']['variants']}x for a question's variants")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare the NumPy vector index with Chroma.")
+    parser.add_argument("--dimensions", type=int, default=production_dimensions, help="embedding size")
+    parser.add_argument("--repeats", type=int, default=5, help="timed runs per search")
+    args = parser.parse_args(argv)
+
+    results = run_benchmark(args.dimensions, args.repeats)
+    print_report(results)
+    return 0 if results["overlap@k"] >= min_overlap else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
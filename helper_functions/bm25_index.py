@@ -0,0 +1,150 @@
+import os
+import re
+import json
+import math
+import heapq
+from collections import Counter, defaultdict
+from langchain_core.documents import Document
+
+_token_pattern = re.compile(r"[a-z0-9]+(?:-[a-z0-9]+)*")
+
+def tokenize(text):
+    """
+    Lowercased word tokens. Hyphenated codes such as "psg-jr" are kept whole and also
+    split into their parts, so both "PSG-JR" and "PSG JR" find them.
+    """
+    tokens = []
+    for token in _token_pattern.findall(text.lower()):
+        tokens.append(token)
+        if "-" in token:
+            tokens.extend(token.split("-"))
+    return tokens
+
+class BM25Index:
+    """
+    In-memory Okapi BM25 inverted index over the same chunks stored in Chroma.
+    """
+
+    def __init__(self, k1=1.5, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self.docs = []
+        self.doc_lengths = []
+        self.postings = {}
+        self.idf = {}
+        self.avg_length = 0.0
+        self._norms = []
+        self._grants = []
+        self._sections = []
+
+    @classmethod
+    def from_documents(cls, documents, **kwargs):
+        index = cls(**kwargs)
+        postings = defaultdict(list)
+        for i, doc in enumerate(documents):
+            counts = Counter(tokenize(doc.page_content))
+            index.docs.append(doc)
+            index.doc_lengths.append(sum(counts.values()))
+            for term, tf in counts.items():
+                postings[term].append((i, tf))
+        index.postings = dict(postings)
+        index._finalize()
+        return index
+
+    def _finalize(self):
+        n = len(self.docs)
+        self.avg_length = sum(self.doc_lengths) / n if n else 0.0
+        self.idf = {
+            term: math.log(1 + (n - len(plist) + 0.5) / (len(plist) + 0.5))
+            for term, plist in self.postings.items()
+        }
+        # Per-chunk length normalisation and grant title, precomputed for search
+        self._norms = [
+            self.k1 * (1 - self.b + self.b * length / self.avg_length) for length in self.doc_lengths
+        ]
+        self._grants = [doc.metadata.get("grant_title") for doc in self.docs]
+        self._sections = [doc.metadata.get("section") for doc in self.docs]
+
+    def search(self, query, k=7, grant_titles=None, sections=None):
+        """
+        Returns up to k (Document, score) pairs, best first. `grant_titles` and `sections`
+        restrict results to chunks whose grant_title / section is in the given collection.
+        """
+        allowed = set(grant_titles) if grant_titles else None
+        allowed_sections = set(sections) if sections else None
+        scores = defaultdict(float)
+        for term in set(tokenize(query)):
+            idf = self.idf.get(term)
+            if idf is None:
+                continue
+            for i, tf in self.postings[term]:
+                if allowed is not None and self._grants[i] not in allowed:
+                    continue
+                if allowed_sections is not None and self._sections[i] not in allowed_sections:
+                    continue
+                scores[i] += idf * tf * (self.k1 + 1) / (tf + self._norms[i])
+        best = heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+        return [(self.docs[i], score) for i, score in best]
+
+    def save(self, path):
+        data = {
+            "k1": self.k1,
+            "b": self.b,
+            "docs": [{"text": d.page_content, "metadata": d.metadata} for d in self.docs],
+            "doc_lengths": self.doc_lengths,
+            "postings": self.postings,
+        }
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        """
+        Loads a saved index, or returns None when none has been built yet.
+        """
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return None
+        index = cls(k1=data["k1"], b=data["b"])
+        index.docs = [Document(page_content=d["text"], metadata=d["metadata"]) for d in data["docs"]]
+        index.doc_lengths = data["doc_lengths"]
+        index.postings = {term: [tuple(p) for p in plist] for term, plist in data["postings"].items()}
+        index._finalize()
+        return index
+
+    def __len__(self):
+        return len(self.docs)
+
+def build_lexical_index(db, path):
+    """
+    Builds the BM25 index from everything currently stored in the Chroma collection
+    and saves it next to the index.
+    """
+    stored = db.get(include=["documents", "metadatas"])
+    documents = [
+        Document(page_content=text, metadata=meta or {})
+        for text, meta in zip(stored["documents"], stored["metadatas"])
+    ]
+    index = BM25Index.from_documents(documents)
+    index.save(path)
+    return index
+
+def reciprocal_rank_fusion(result_lists, k=7, rrf_k=60):
+    """
+    Fuses ranked Document lists; a chunk scores sum(1 / (rrf_k + rank)) over the lists
+    it appears in. Chunks are identified by source and content.
+    """
+    scores = defaultdict(float)
+    first_seen = {}
+    for results in result_lists:
+        for rank, doc in enumerate(results, start=1):
+            key = (doc.metadata.get("source"), doc.page_content)
+            scores[key] += 1 / (rrf_k + rank)
+            first_seen.setdefault(key, doc)
+    best = sorted(scores, key=scores.get, reverse=True)[:k]
+    return [first_seen[key] for key in best]
@@ -1,8 +1,13 @@
 from langchain_chroma import Chroma
-from helper_functions.vectorstore import embedding, persist_directory
+from helper_functions.clients import get_embedding
+from helper_functions.vectorstore import get_index_directory, get_index_version, read_manifest
 
-# Load the vectorstore
-db = Chroma(persist_directory=persist_directory, embedding_function=embedding)
+# Load the published index version
+version = get_index_version()
+db = Chroma(persist_directory=get_index_directory(version), embedding_function=get_embedding())
+manifest = read_manifest(version) if version else None
+if manifest:
+    print(f"\n🏷️ Index version {version}, built {manifest['built_at']} with {manifest['embedding_model']}")
 
 # Access raw documents
 collection = db.get()
@@ -18,4 +23,4 @@ for i, meta in enumerate(collection["metadatas"]):
     print(f"Preview       : {collection['documents'][i][:300]}...\n")
 
     if i >= 9:  # Only show first 10 docs
-        break
\ No newline at end of file
+        break
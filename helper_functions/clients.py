@@ -0,0 +1,63 @@
+"""
+Shared OpenAI clients, created on first use.
+
+Importing the package builds nothing: .env is loaded and the chat model and embedding
+client are constructed the first time a question is answered or an index is built, and
+every module uses the same two instances. Tests and benchmarks swap in fakes by
+assigning `clients.llm` and `clients.embedding`.
+"""
+import os
+import threading
+
+chat_model_name = "gpt-4o-mini"
+embedding_cache_dir = "data/embedding_cache"
+
+llm = None
+embedding = None
+_lock = threading.Lock()
+_env_loaded = False
+
+def load_env():
+    """
+    Loads .env into the environment once.
+    """
+    global _env_loaded
+    if not _env_loaded:
+        from dotenv import load_dotenv
+        load_dotenv()
+        _env_loaded = True
+
+def get_llm():
+    """
+    The chat model shared by query expansion and answering.
+    """
+    global llm
+    if llm is None:
+        with _lock:
+            if llm is None:
+                load_env()
+                from langchain_openai import ChatOpenAI
+                from helper_functions import resilience
+                # No request may outlive the answer's deadline, and resilience.call_llm
+                # does the retrying, so the client's own retries are off
+                llm = ChatOpenAI(model=chat_model_name, temperature=0,
+                                 timeout=resilience.request_deadline_seconds, max_retries=0)
+    return llm
+
+def get_embedding():
+    """
+    The embedding client, with vectors cached on disk so unchanged chunks and repeated
+    queries skip the API.
+    """
+    global embedding
+    if embedding is None:
+        with _lock:
+            if embedding is None:
+                load_env()
+                from langchain_openai import OpenAIEmbeddings
+                from helper_functions.embedding_cache import CachedEmbeddings
+                embedding = CachedEmbeddings(
+                    OpenAIEmbeddings(openai_api_key=os.getenv("OPENAI_API_KEY")),
+                    cache_dir=embedding_cache_dir
+                )
+    return embedding
@@ -0,0 +1,176 @@
+"""
+Context assembly between retrieval and the LLM call.
+
+Multi-query retrieval returns the union of several searches, and the scraped page and the
+manual HTML copy of a grant are near-identical, so the raw result list repeats a lot of
+text. pack_context drops exact and near-duplicate chunks (word-shingle containment),
+merges neighbouring chunks of the same page, and keeps the best-ranked chunks that fit
+in the context token budget.
+"""
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+from helper_functions import tracing
+from helper_functions.tokens import count_tokens
+
+# Max tokens of retrieved text pasted into the prompt
+context_token_budget = 2000
+# A chunk sharing at least this share of its word shingles with a better-ranked chunk is a duplicate
+near_duplicate_threshold = 0.8
+# Words per shingle
+shingle_size = 5
+# Chunks of the same page whose end and start overlap by at least this many characters are merged
+min_merge_overlap = 40
+# Separator placed between chunks by the "stuff" chain
+chunk_separator = "\n\n"
+
+def shingles(text, size=None):
+    """
+    Hashed word n-grams of the lowercased text; short texts yield one shingle.
+    """
+    size = size or shingle_size
+    words = text.lower().split()
+    if len(words) <= size:
+        return {hash(" ".join(words))} if words else set()
+    return {hash(" ".join(words[i:i + size])) for i in range(len(words) - size + 1)}
+
+def containment(a, b):
+    """
+    Share of the smaller shingle set found in the other one.
+    """
+    if not a or not b:
+        return 0.0
+    return len(a & b) / min(len(a), len(b))
+
+def _text_overlap(first, second):
+    # Length of the longest suffix of `first` that starts `second`, if long enough
+    probe = first[-min_merge_overlap:]
+    start = second.find(probe)
+    while start != -1:
+        if first.endswith(second[:start + len(probe)]):
+            return start + len(probe)
+        start = second.find(probe, start + 1)
+    return 0
+
+def _merge(first, second):
+    """
+    Returns `second` appended to `first` when they are neighbours on the same page, else None.
+    """
+    if first.metadata.get("source") != second.metadata.get("source"):
+        return None
+    a, b = first.page_content, second.page_content
+    position = first.metadata.get("position")
+    if position is not None and second.metadata.get("position") == position + 1:
+        # Chunks of one section repeat its heading on their first line
+        if first.metadata.get("heading_path") == second.metadata.get("heading_path") and "\n" in b:
+            heading, rest = b.split("\n", 1)
+            if a.startswith(heading + "\n"):
+                b = rest
+        return Document(page_content=f"{a}\n{b}", metadata=dict(first.metadata))
+    overlap = _text_overlap(a, b) if len(a) >= min_merge_overlap else 0
+    if overlap:
+        return Document(page_content=a + b[overlap:], metadata=dict(first.metadata))
+    return None
+
+def deduplicate(docs, threshold=None):
+    """
+    Drops exact and near-duplicate chunks, keeping the better-ranked one (or the longer
+    one at the better rank when it contains the other). Returns (docs, duplicates dropped).
+    """
+    threshold = near_duplicate_threshold if threshold is None else threshold
+    kept, kept_shingles, seen = [], [], set()
+    for doc in docs:
+        normalized = " ".join(doc.page_content.split())
+        if normalized in seen:
+            continue
+        seen.add(normalized)
+        current = shingles(doc.page_content)
+        for i, other in enumerate(kept_shingles):
+            if containment(current, other) >= threshold:
+                if len(current) > len(other):
+                    kept[i], kept_shingles[i] = doc, current
+                break
+        else:
+            kept.append(doc)
+            kept_shingles.append(current)
+    return kept, len(docs) - len(kept)
+
+def merge_neighbours(docs):
+    """
+    Merges chunks that follow each other on the same page; the merged chunk takes the
+    better rank. Returns (docs, merges made).
+    """
+    docs = list(docs)
+    merges = 0
+    merged = True
+    while merged:
+        merged = False
+        for i in range(len(docs)):
+            for j in range(len(docs)):
+                if i == j:
+                    continue
+                combined = _merge(docs[i], docs[j])
+                if combined is not None:
+                    docs[min(i, j)] = combined
+                    del docs[max(i, j)]
+                    merges += 1
+                    merged = True
+                    break
+            if merged:
+                break
+    return docs, merges
+
+def pack_context(docs, max_tokens=None):
+    """
+    Deduplicates, merges and budget-packs ranked chunks for the prompt.
+    Returns (packed docs in rank order, stats including tokens_saved).
+    """
+    budget = max_tokens or context_token_budget
+    separator_tokens = count_tokens(chunk_separator)
+    with tracing.span("context_packing", budget=budget) as packing:
+        tokens_in = count_tokens(chunk_separator.join(doc.page_content for doc in docs)) if docs else 0
+        unique, duplicates = deduplicate(docs)
+        merged, merges = merge_neighbours(unique)
+
+        packed, used, over_budget = [], 0, 0
+        for doc in merged:
+            tokens = count_tokens(doc.page_content) + (separator_tokens if packed else 0)
+            if used + tokens > budget:
+                over_budget += 1
+                continue
+            packed.append(doc)
+            used += tokens
+        if not packed and merged:
+            # Even the best chunk is over budget: keep as many of its lines as fit
+            lines = []
+            for line in merged[0].page_content.split("\n"):
+                if count_tokens("\n".join(lines + [line])) > budget:
+                    break
+                lines.append(line)
+            packed = [Document(page_content="\n".join(lines), metadata=dict(merged[0].metadata))]
+        used = count_tokens(chunk_separator.join(doc.page_content for doc in packed)) if packed else 0
+
+        stats = {
+            "chunks_in": len(docs),
+            "chunks_out": len(packed),
+            "duplicates": duplicates,
+            "merged": merges,
+            "over_budget": over_budget,
+            "context_tokens": used,
+            "tokens_saved": tokens_in - used,
+        }
+        packing.set(**stats)
+    return packed, stats
+
+class PackedContextRetriever(BaseRetriever):
+    """
+    Returns another retriever's results run through pack_context, so the "stuff" chain
+    pastes only the packed chunks into the prompt.
+    """
+
+    retriever: BaseRetriever
+    max_tokens: int | None = None
+
+    def _get_relevant_documents(self, query, *, run_manager):
+        docs = self.retriever.invoke(query, config={"callbacks": run_manager.get_child()})
+        return pack_context(docs, self.max_tokens)[0]
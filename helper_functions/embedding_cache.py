@@ -0,0 +1,233 @@
+import os
+import re
+import json
+import time
+import uuid
+import hashlib
+import threading
+import contextlib
+from collections import OrderedDict
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from helper_functions import tracing
+from helper_functions.single_flight import SingleFlight
+
+try:
+    import fcntl
+except ImportError:  # Windows: processes sharing a cache directory are not serialised
+    fcntl = None
+
+_meta_filename = "meta.json"
+_vectors_filename = "vectors.f32"
+_keys_filename = "keys.u8"
+_used_filename = "used.i64"
+_lock_filename = "lock"
+
+class CachedEmbeddings(Embeddings):
+    """
+    Wraps an embedder with a persistent on-disk cache that several processes can share.
+
+    Every slot has a row in three memory-mapped arrays: the float32 vector, the key of its
+    text and when it was last used. Keys are the SHA-256 of the model name and the text,
+    so switching models never returns stale vectors. Lookups take no file lock: they check
+    the slot's key before and after copying the vector, so a row another process reused
+    reads as a miss. Writes hold an exclusive file lock, re-read which slots are filled,
+    then take a free slot or the least recently used one. Misses already being embedded
+    by another thread wait for that call instead of repeating it.
+    """
+
+    def __init__(self, embedder, cache_dir="data/embedding_cache", max_entries=20000, model_name=None):
+        self.embedder = embedder
+        self.model_name = model_name or getattr(embedder, "model", None) or type(embedder).__name__
+        # Only used to create the cache; an existing cache keeps its size
+        self.max_entries = max_entries
+        self.directory = os.path.join(cache_dir, re.sub(r"[^A-Za-z0-9_.-]", "_", self.model_name))
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._slots = {}
+        self._flight = SingleFlight("embedding")
+        self._vectors = None
+        self._keys = None
+        self._used = None
+        self._dim = None
+        self._id = None
+        self._open()
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    @contextlib.contextmanager
+    def _file_lock(self):
+        os.makedirs(self.directory, exist_ok=True)
+        with open(self._path(_lock_filename), "a", encoding="utf-8") as f:
+            if fcntl:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            yield
+
+    def _open(self):
+        """
+        Maps the arrays meta.json describes, unless they are already mapped. Returns False
+        when there is no cache for this model yet.
+        """
+        try:
+            with open(self._path(_meta_filename), "r", encoding="utf-8") as f:
+                meta = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return False
+        if meta.get("model") != self.model_name:
+            return False
+        if meta["id"] == self._id:
+            return True
+        rows, dim = meta["max_entries"], meta["dim"]
+        try:
+            self._vectors = np.memmap(self._path(_vectors_filename), dtype=np.float32, mode="r+", shape=(rows, dim))
+            self._keys = np.memmap(self._path(_keys_filename), dtype=np.uint8, mode="r+", shape=(rows, 32))
+            self._used = np.memmap(self._path(_used_filename), dtype=np.int64, mode="r+", shape=(rows,))
+        except (FileNotFoundError, ValueError):
+            return False
+        self._dim, self._id = dim, meta["id"]
+        self._sync()
+        return True
+
+    def _sync(self):
+        # Re-reads which key every filled slot holds, including slots other processes wrote
+        filled = np.flatnonzero(self._keys.any(axis=1))
+        self._slots = {self._keys[slot].tobytes(): int(slot) for slot in filled}
+
+    def _create(self, dim):
+        """
+        Creates empty arrays, under the file lock. They are renamed into place, so a process
+        still mapping the previous files reads those until its next write reopens the cache.
+        """
+        cache_id = uuid.uuid4().hex
+        for name, dtype, shape in ((_vectors_filename, np.float32, (self.max_entries, dim)),
+                                   (_keys_filename, np.uint8, (self.max_entries, 32)),
+                                   (_used_filename, np.int64, (self.max_entries,))):
+            tmp_path = self._path(f"{name}.{cache_id}.tmp")
+            np.memmap(tmp_path, dtype=dtype, mode="w+", shape=shape).flush()
+            os.replace(tmp_path, self._path(name))
+        # Written last: the arrays it describes are complete
+        meta_path = self._path(_meta_filename)
+        with open(f"{meta_path}.{cache_id}.tmp", "w", encoding="utf-8") as f:
+            json.dump({"model": self.model_name, "dim": dim, "max_entries": self.max_entries, "id": cache_id}, f)
+        os.replace(f"{meta_path}.{cache_id}.tmp", meta_path)
+        self._open()
+
+    def _key(self, text):
+        return hashlib.sha256(f"{self.model_name}\0{text}".encode("utf-8")).digest()
+
+    def _lookup(self, key):
+        if self._vectors is None and not self._open():
+            return None
+        slot = self._slots.get(key)
+        if slot is None:
+            return None
+        if self._keys[slot].tobytes() == key:
+            vector = np.array(self._vectors[slot])
+            # Checked again: another process may have reused the slot while it was copied
+            if self._keys[slot].tobytes() == key:
+                self._used[slot] = time.time_ns()
+                return vector.tolist()
+        del self._slots[key]
+        return None
+
+    def _store(self, items):
+        if not items:
+            return
+        dim = len(items[0][1])
+        with self._file_lock():
+            if not self._open() or dim != self._dim:
+                self._create(dim)
+            self._sync()
+            free = np.flatnonzero(~self._keys.any(axis=1))[::-1].tolist()
+            now = time.time_ns()
+            for key, vector in items:
+                slot = self._slots.get(key)
+                if slot is None:
+                    slot = free.pop() if free else int(np.argmin(self._used))
+                    self._slots.pop(self._keys[slot].tobytes(), None)
+                # The key is cleared while the row is rewritten, so readers never pair it with a half-written vector
+                self._keys[slot] = 0
+                self._vectors[slot] = vector
+                self._used[slot] = now
+                self._keys[slot] = np.frombuffer(key, dtype=np.uint8)
+                self._slots[key] = slot
+            self._vectors.flush()
+            self._keys.flush()
+
+    def embed_documents(self, texts):
+        keys = [self._key(text) for text in texts]
+        results = [None] * len(texts)
+        missing = OrderedDict()
+
+        with self._lock:
+            for i, key in enumerate(keys):
+                vector = self._lookup(key)
+                if vector is None:
+                    missing.setdefault(key, (texts[i], []))[1].append(i)
+                else:
+                    results[i] = vector
+            self.hits += len(texts) - sum(len(positions) for _, positions in missing.values())
+            self.misses += sum(len(positions) for _, positions in missing.values())
+
+        if missing:
+            batch = [text for text, _ in missing.values()]
+
+            def embed_batch():
+                with tracing.span("embed_batch", texts=len(batch), characters=sum(map(len, batch))):
+                    vectors = self.embedder.embed_documents(batch)
+                with self._lock:
+                    self._store([(key, vector) for key, vector in zip(missing, vectors)])
+                return vectors
+
+            vectors, _ = self._flight.do(tuple(missing), embed_batch)
+            for (_, positions), vector in zip(missing.values(), vectors):
+                for i in positions:
+                    results[i] = list(vector)
+
+        return results
+
+    def embed_query(self, text):
+        key = self._key(text)
+        with self._lock:
+            vector = self._lookup(key)
+            if vector is not None:
+                self.hits += 1
+                return vector
+            self.misses += 1
+
+        def embed():
+            with tracing.span("embed_query"):
+                vector = self.embedder.embed_query(text)
+            with self._lock:
+                self._store([(key, vector)])
+            return vector
+
+        vector, _ = self._flight.do(key, embed)
+        return list(vector)
+
+    def __len__(self):
+        return len(self._slots)
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "model": self.model_name,
+            "entries": len(self._slots),
+            "max_entries": len(self._keys) if self._keys is not None else self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "coalesced": self._flight.followers,
+        }
+
+    def clear(self):
+        with self._lock, self._file_lock():
+            if self._open():
+                self._keys[:] = 0
+                self._used[:] = 0
+                self._keys.flush()
+            self._slots = {}
+            self.hits = 0
+            self.misses = 0
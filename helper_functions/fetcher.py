@@ -0,0 +1,201 @@
+import os
+import json
+import time
+import threading
+from dataclasses import dataclass, field
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+import requests
+from requests.adapters import HTTPAdapter
+
+from helper_functions.web_scraper import request_headers
+from helper_functions import tracing
+
+# Status codes worth retrying with backoff
+retry_statuses = {429, 500, 502, 503, 504}
+
+@dataclass
+class FetchResult:
+    url: str
+    status: int | None = None
+    text: str | None = None
+    elapsed: float = 0.0
+    attempts: int = 0
+    error: str | None = None
+    validators: dict = field(default_factory=dict)
+
+    @property
+    def ok(self):
+        return self.status == 200 and self.text is not None
+
+    @property
+    def not_modified(self):
+        return self.status == 304
+
+class ConcurrentFetcher:
+    """
+    Fetches many pages concurrently on a thread pool.
+
+    Each host gets its own keep-alive Session and a semaphore capping how many requests
+    are in flight to it at once. Transient failures are retried with exponential backoff,
+    or after the server's Retry-After up to max_retry_delay seconds. Any other request
+    error is recorded on that URL's FetchResult without stopping the other fetches.
+    ETag / Last-Modified validators from earlier runs are sent as conditional headers;
+    they are only persisted once the caller calls save_validators(), so a run that fails
+    after fetching never causes pages to be skipped next time. With conditional=False
+    every page is fetched in full, and the validators of this run are still recorded.
+    """
+
+    def __init__(self, validators_path=None, max_workers=8, per_host_limit=2,
+                 retries=3, backoff=0.5, timeout=10, conditional=True, max_retry_delay=30):
+        self.validators_path = validators_path
+        self.conditional = conditional
+        self.max_workers = max_workers
+        self.per_host_limit = per_host_limit
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.max_retry_delay = max_retry_delay
+        self._lock = threading.Lock()
+        self._sessions = {}
+        self._host_slots = {}
+        self._validators = self._load_validators()
+        self._pending = {}
+
+    def _load_validators(self):
+        if not self.validators_path:
+            return {}
+        try:
+            with open(self.validators_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def save_validators(self):
+        """
+        Persists validators of pages fetched in this run so the next run can send
+        conditional requests for them.
+        """
+        if not self.validators_path or not self._pending:
+            return
+        self._validators.update(self._pending)
+        self._pending = {}
+        os.makedirs(os.path.dirname(self.validators_path) or ".", exist_ok=True)
+        tmp_path = f"{self.validators_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self._validators, f, indent=2)
+        os.replace(tmp_path, self.validators_path)
+
+    def _host(self, url):
+        parts = urlsplit(url)
+        return f"{parts.scheme}://{parts.netloc}"
+
+    def _session_for(self, host):
+        with self._lock:
+            if host not in self._sessions:
+                session = requests.Session()
+                session.headers.update(request_headers)
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.per_host_limit)
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                self._sessions[host] = session
+                self._host_slots[host] = threading.BoundedSemaphore(self.per_host_limit)
+            return self._sessions[host], self._host_slots[host]
+
+    def _conditional_headers(self, url):
+        saved = self._validators.get(url, {}) if self.conditional else {}
+        headers = {}
+        if saved.get("etag"):
+            headers["If-None-Match"] = saved["etag"]
+        if saved.get("last_modified"):
+            headers["If-Modified-Since"] = saved["last_modified"]
+        return headers
+
+    def _retry_delay(self, attempt, response=None):
+        retry_after = response.headers.get("Retry-After") if response is not None else None
+        if retry_after and retry_after.isdigit():
+            return min(float(retry_after), self.max_retry_delay)
+        return min(self.backoff * (2 ** attempt), self.max_retry_delay)
+
+    def fetch(self, url):
+        with tracing.span("scrape", url=url) as scrape:
+            result = self._fetch(url)
+            scrape.set(status=result.status, attempts=result.attempts)
+            if result.error and result.status is None:
+                scrape.record_error(result.error)
+        return result
+
+    def _fetch(self, url):
+        session, slots = self._session_for(self._host(url))
+        result = FetchResult(url=url)
+        start = time.perf_counter()
+
+        for attempt in range(self.retries + 1):
+            result.attempts = attempt + 1
+            response = None
+            try:
+                with slots:
+                    response = session.get(url, headers=self._conditional_headers(url), timeout=self.timeout)
+                if response.status_code not in retry_statuses:
+                    result.status = response.status_code
+                    result.error = None
+                    break
+                result.error = f"HTTP {response.status_code}"
+            except (requests.ConnectionError, requests.Timeout) as e:
+                result.error = type(e).__name__
+            except requests.RequestException as e:
+                # Not transient (bad URL, redirect loop...): retrying would fail the same way
+                result.error = type(e).__name__
+                break
+            if attempt < self.retries:
+                time.sleep(self._retry_delay(attempt, response))
+
+        if result.status == 200:
+            result.text = response.text
+            result.validators = {
+                key: value for key, value in (
+                    ("etag", response.headers.get("ETag")),
+                    ("last_modified", response.headers.get("Last-Modified")),
+                ) if value
+            }
+            if result.validators:
+                with self._lock:
+                    self._pending[url] = result.validators
+        elif result.status is not None and result.status != 304:
+            result.error = f"HTTP {result.status}"
+
+        result.elapsed = time.perf_counter() - start
+        return result
+
+    def fetch_all(self, urls):
+        """
+        Fetches all URLs concurrently and returns FetchResults in the same order.
+        """
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            return list(pool.map(self.fetch, urls))
+
+    def close(self):
+        with self._lock:
+            for session in self._sessions.values():
+                session.close()
+            self._sessions.clear()
+
+def print_fetch_report(results, wall_time=None):
+    for result in sorted(results, key=lambda r: r.elapsed, reverse=True):
+        if result.ok:
+            icon = "✅"
+        elif result.not_modified:
+            icon = "⏭️"
+        else:
+            icon = "❌"
+        detail = f" ({result.error})" if result.error else ""
+        print(f"  {icon} {result.elapsed * 1000:7.0f}ms  {result.status or '---'}  "
+              f"x{result.attempts}  {result.url}{detail}")
+    summary = (
+        f"🌐 Fetched {sum(r.ok for r in results)} pages, "
+        f"{sum(r.not_modified for r in results)} not modified, "
+        f"{sum(not r.ok and not r.not_modified for r in results)} failed"
+    )
+    if wall_time is not None:
+        summary += f" in {wall_time:.2f}s (sum of page latencies {sum(r.elapsed for r in results):.2f}s)"
+    print(summary + ".")
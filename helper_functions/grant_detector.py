@@ -0,0 +1,143 @@
+import re
+from difflib import SequenceMatcher
+from functools import lru_cache
+
+grant_to_keywords = {
+    "SkillsFuture Enterprise Credit": ["sfec", "skillsfuture enterprise credit", "skills future enterprise credit"],
+    "SkillsFuture Queen Bee by AETOS": ["sfqb", "skillsfuture queen bee", "skills future queen bee"],
+    "Productivity Solutions Grant": ["psg", "productivity solutions grant"],
+    # Longer than "psg" and "productivity solutions grant", so they win at the same position
+    "Job Redesign under Productivity Solutions Grant": [
+        "psg jr", "psgjr", "psg job redesign", "job redesign under psg",
+        "job redesign under productivity solutions grant", "job redesign under the productivity solutions grant"
+    ],
+    "Enterprise Development Grant": ["edg", "enterprise development grant"],
+    "Advanced Digital Solutions Grant": [
+        "ads", "advanced digital solution", "advanced digital solution grant", "advanced digital solutions grant"
+    ],
+    "Career Conversion Programme for Security Officers": [
+        "ccp so", "ccp sos", "ccp for so", "ccp for sos",
+        "ccp for security officers", "career conversion programme for security officers"
+    ],
+    "Career Conversion Programme for Human Capital Professionals": [
+        "ccp hc", "ccp for hc", "ccp hcp", "ccp for hcp",
+        "career conversion programme for human capital",
+        "career conversion programme for human capital professionals"
+    ],
+    "Company Training Committee Grant": [
+        "ctc", "ctc grant", "company training committee", "company training committee grant"
+    ]
+}
+
+# Intent phrases that point at a grant without naming it, checked in this order
+grant_intents = [
+    ("Career Conversion Programme for Human Capital Professionals", [
+        "reskill hr", "reskill my hr", "upskill my hr", "upskill hr", "train hr", "train my hr",
+        "hr transformation", "upskill my staff", "train human resource"
+    ]),
+    ("Career Conversion Programme for Security Officers", [
+        "reskill my security officer", "reskill my security officers", "upskill my security officer",
+        "upskill my security officers", "security upskill", "train my security officer",
+        "train my security officers", "security training"
+    ]),
+]
+
+# Question phrasing that asks about one section of a grant page (see text_splitter.label_section),
+# checked in this order so "who can apply" counts as eligibility
+section_intents = [
+    ("eligibility", [
+        "eligible", "eligibility", "who can apply", "qualify", "qualifies", "criteria", "requirements"
+    ]),
+    ("application", [
+        "how to apply", "how do i apply", "how can i apply", "how do we apply", "how can we apply",
+        "how should i apply", "application process", "application procedure", "steps to apply",
+        "submit an application", "where to apply", "where do i apply"
+    ]),
+]
+
+# Fuzzy matching compares question n-grams against aliases with the same number of words
+fuzzy_cutoff = 0.8
+# Aliases shorter than this are too ambiguous to fuzzy-match ("ads" vs "add")
+fuzzy_min_alias_length = 6
+# Alias words this short (abbreviations such as "ccp", "hc", "so") must match a question word
+# exactly; only longer words may be misspelt, so "ccp so" never matches "ccp to" or "cop so"
+fuzzy_exact_word_length = 3
+# Only the first words of a question are scanned fuzzily, bounding the work per question
+fuzzy_max_tokens = 40
+
+def normalize_question(question):
+    """
+    Lowercases, turns punctuation into spaces and collapses whitespace,
+    so "CCP-HC?" and "ccp hc" normalize the same way.
+    """
+    return " ".join(re.sub(r"[^a-z0-9]+", " ", question.lower()).split())
+
+def _compile(phrases):
+    # Longest first so the alternation prefers "ctc grant" over "ctc" at the same position
+    ordered = sorted(set(phrases), key=len, reverse=True)
+    return re.compile(r"\b(?:" + "|".join(re.escape(p) for p in ordered) + r")\b")
+
+alias_to_grant = {
+    alias: grant for grant, aliases in grant_to_keywords.items() for alias in aliases
+}
+_alias_pattern = _compile(alias_to_grant)
+_intent_patterns = [(grant, _compile(phrases)) for grant, phrases in grant_intents]
+_section_patterns = [(section, _compile(phrases)) for section, phrases in section_intents]
+
+# Per word count: each fuzzy-matchable alias with the (position, word) pairs that must match exactly
+_fuzzy_aliases = {}
+for _alias in alias_to_grant:
+    _words = _alias.split()
+    _exact = [(i, word) for i, word in enumerate(_words) if len(word) <= fuzzy_exact_word_length]
+    # Aliases made only of short words would need an exact match, which step 1 already covers
+    if len(_alias) >= fuzzy_min_alias_length and len(_exact) < len(_words):
+        _fuzzy_aliases.setdefault(len(_words), []).append((_alias, _exact))
+
+def _fuzzy_match(normalized):
+    tokens = normalized.split()[:fuzzy_max_tokens]
+    best_score, best_alias = 0.0, None
+    for size, aliases in _fuzzy_aliases.items():
+        for start in range(len(tokens) - size + 1):
+            matcher = SequenceMatcher(None, b=" ".join(tokens[start:start + size]))
+            for alias, exact in aliases:
+                if any(tokens[start + i] != word for i, word in exact):
+                    continue
+                matcher.set_seq1(alias)
+                if matcher.real_quick_ratio() < fuzzy_cutoff or matcher.quick_ratio() < fuzzy_cutoff:
+                    continue
+                score = matcher.ratio()
+                if score >= fuzzy_cutoff and score > best_score:
+                    best_score, best_alias = score, alias
+    return alias_to_grant[best_alias] if best_alias else None
+
+@lru_cache(maxsize=2048)
+def _detect(normalized):
+    # 🔍 Step 1: Direct match on whole words
+    match = _alias_pattern.search(normalized)
+    if match:
+        return alias_to_grant[match.group(0)]
+
+    # 🔍 Step 2: Fuzzy match on word n-grams
+    grant = _fuzzy_match(normalized)
+    if grant:
+        return grant
+
+    # 🧠 Step 3: Intent-based detection
+    for grant, pattern in _intent_patterns:
+        if pattern.search(normalized):
+            return grant
+
+    return None
+
+def detect_grant_from_question(question: str) -> str | None:
+    return _detect(normalize_question(question))
+
+def detect_section_from_question(question: str) -> str | None:
+    """
+    Returns the page section ("eligibility" or "application") the question asks about, if any.
+    """
+    normalized = normalize_question(question)
+    for section, pattern in _section_patterns:
+        if pattern.search(normalized):
+            return section
+    return None
@@ -0,0 +1,335 @@
+"""
+Compiled grant profiles.
+
+One record per grant with its aliases, category, objective and target, a summary,
+eligibility and application snippets, complementary grants and source URLs. The static
+facts live in grant_catalogue; the snippets are compiled from the indexed chunks at
+index time and saved next to the index, so overview questions ("What is EDG?"),
+complementary-grant suggestions and the security-agency list are dictionary reads.
+"""
+import os
+import re
+import json
+import threading
+from collections import defaultdict
+
+from helper_functions.grant_detector import grant_to_keywords, normalize_question
+
+grant_profiles_filename = "grant_profiles.json"
+# Max characters of the compiled summary and of each section snippet
+summary_max_chars = 500
+snippet_max_chars = 900
+# A sentence naming the grant must be at least this long to open its summary
+summary_min_chars = 60
+
+# Static facts per grant; "blurb" is the one-line pitch in the security-agency list
+grant_catalogue = {
+    "Enterprise Development Grant": {
+        "display_name": "Enterprise Development Grant (EDG)",
+        "category": "Enterprise Development",
+        "objective": "Support upgrading capabilities, innovation, and international expansion",
+        "target": "Singapore-registered businesses with at least 30% local equity",
+        "complements": ["SkillsFuture Enterprise Credit"],
+        "blurb": "Funds projects in innovation, productivity improvement, and business expansion.",
+    },
+    "Productivity Solutions Grant": {
+        "display_name": "Productivity Solutions Grant (PSG)",
+        "category": "digitalisation and technology adoption",
+        "objective": "Help SMEs adopt digital tools and subsidize adoption of pre-approved IT solutions and equipment",
+        "target": "Singapore-registered SMEs with at least 30% local shareholding",
+        "complements": ["Career Conversion Programme for Security Officers"],
+        "blurb": "Funds security-related tech like surveillance, smart dashboards, etc.",
+    },
+    "SkillsFuture Enterprise Credit": {
+        "display_name": "SkillsFuture Enterprise Credit (SFEC)",
+        "category": "training",
+        "objective": "Subsidize transformation and workforce upgrading",
+        "target": "Eligible local employers",
+        "complements": ["Productivity Solutions Grant"],
+        "blurb": "Offsets enterprise and workforce transformation costs with up to $10,000 in credits.",
+    },
+    "Career Conversion Programme for Security Officers": {
+        "display_name": "Career Conversion Programme (CCP) for Security Officers",
+        "category": "workforce transformation",
+        "objective": "Support security employers in reskilling security officers to meet evolving business "
+                     "requirements, such as technology adoption and Outcome-Based Contracts",
+        "target": "Singapore-registered security employers and their security officers",
+        "complements": ["Company Training Committee Grant"],
+        "blurb": "Reskills security officers for tech-driven roles.",
+    },
+    "Career Conversion Programme for Human Capital Professionals": {
+        "display_name": "Career Conversion Programme (CCP) for Human Capital Professionals",
+        "category": "workforce transformation",
+        "objective": "Support employers in equipping and converting local mid-career PMETs into Human Resource roles",
+        "target": "Singapore-registered companies and their potential new hires",
+        "complements": ["SkillsFuture Enterprise Credit"],
+        "blurb": "Equips mid-career professionals to take on HR roles within sectors like security.",
+    },
+    "Job Redesign under Productivity Solutions Grant": {
+        "display_name": "Job Redesign under Productivity Solutions Grant (PSG-JR)",
+        "category": "process improvement",
+        "objective": "Encourage redesign of work processes to enhance productivity",
+        "target": "Singapore-registered enterprises",
+        "complements": [],
+        "blurb": None,
+    },
+    "Advanced Digital Solutions Grant": {
+        "display_name": "Advanced Digital Solutions (ADS) Grant",
+        "category": "digital transformation",
+        "objective": "Support SMEs in adopting advanced and integrated digital solutions to deepen digital "
+                     "capabilities and build resilience",
+        "target": "Singapore-registered SMEs",
+        "complements": ["Career Conversion Programme for Security Officers"],
+        "blurb": "Supports adoption of integrated digital solutions for enhanced operations.",
+    },
+    "Company Training Committee Grant": {
+        "display_name": "Company Training Committee (CTC) Grant",
+        "category": "workforce transformation",
+        "objective": "Support companies implementing transformation plans to raise productivity, redesign jobs, "
+                     "and upskill workers",
+        "target": "Singapore-registered entities with established CTCs",
+        "complements": ["Career Conversion Programme for Security Officers"],
+        "blurb": "Supports structured job redesign and training initiatives.",
+    },
+    "SkillsFuture Queen Bee by AETOS": {
+        "display_name": "SkillsFuture Queen Bee (SFQB) by AETOS",
+        "category": "skills development",
+        "objective": "Leverage industry leaders like AETOS to provide skills training and development for SMEs "
+                     "in security sector",
+        "target": "Singapore-registered SMEs in security industry",
+        "complements": ["Career Conversion Programme for Security Officers"],
+        "blurb": "Provides industry-led support to upskill security SMEs and drive digital adoption.",
+    },
+}
+
+# Order of the grants in the security-agency list
+security_agency_grants = [
+    "Career Conversion Programme for Security Officers",
+    "Productivity Solutions Grant",
+    "Company Training Committee Grant",
+    "SkillsFuture Enterprise Credit",
+    "SkillsFuture Queen Bee by AETOS",
+    "Enterprise Development Grant",
+    "Advanced Digital Solutions Grant",
+    "Career Conversion Programme for Human Capital Professionals",
+]
+
+# Every alias and full title, lowercased, mapped to the canonical grant title
+alias_to_grant = {normalize_question(grant): grant for grant in grant_catalogue}
+alias_to_grant.update({alias: grant for grant, aliases in grant_to_keywords.items() for alias in aliases})
+
+# Questions asking what a grant is, with nothing more specific than the grant's name
+overview_prefixes = [
+    "what is", "what s", "whats", "what are", "tell me about", "tell me more about", "give me an overview of",
+    "overview of", "explain", "describe", "information on", "information about", "details of", "details on",
+]
+overview_fillers = {"the", "a", "an", "grant", "grants", "scheme", "programme", "program", "please", "me"}
+_overview_prefix = re.compile(r"^(?:" + "|".join(sorted(overview_prefixes, key=len, reverse=True)) + r")\b")
+_grant_names = re.compile(r"\b(?:" + "|".join(
+    re.escape(alias) for alias in sorted(alias_to_grant, key=len, reverse=True)
+) + r")\b")
+
+# Footer and legal lines scraped along with the page
+_boilerplate = re.compile(r"copyright|©|all rights reserved|personal data|pdpa|privacy|terms of use|cookies", re.I)
+# A line ending in one of these words was wrapped mid-sentence
+_dangling = re.compile(r"\b(?:the|a|an|of|for|to|and|or|with|by|in|on|under|at|from)$", re.I)
+
+def canonical_grant(name):
+    """
+    Maps an alias or differently-cased title to the canonical grant title.
+    """
+    return alias_to_grant.get(normalize_question(name), name) if name else name
+
+def is_overview_question(question):
+    normalized = _overview_prefix.sub("", normalize_question(question), count=1)
+    if not _grant_names.search(normalized):
+        return False
+    rest = _grant_names.sub(" ", normalized).split()
+    return all(word in overview_fillers for word in rest)
+
+def static_profile(grant):
+    facts = grant_catalogue.get(grant, {})
+    return {
+        "grant": grant,
+        "display_name": facts.get("display_name", grant),
+        "aliases": sorted(alias for alias, title in alias_to_grant.items() if title == grant),
+        "category": facts.get("category", "general"),
+        "objective": facts.get("objective", "Not specified"),
+        "target": facts.get("target", "Not specified"),
+        "complements": list(facts.get("complements", [])),
+        "summary": "",
+        "eligibility": "",
+        "application": "",
+        "sources": [],
+    }
+
+def _is_boilerplate(line):
+    # Page furniture: footers, and short lines that are neither sentences nor list items,
+    # such as buttons, links and bare lead-ins ("Apply now", "Note:")
+    if _boilerplate.search(line) or _grant_names.sub("", normalize_question(line)).strip() == "":
+        return True
+    return len(line.split()) <= 3 and not line.endswith((".", "%")) and not line.startswith(("•", "-", "✔"))
+
+def _body_lines(doc):
+    """
+    Content lines of a chunk without its repeated heading and page furniture. Lines that
+    the page wrapped mid-sentence are joined back together.
+    """
+    from helper_functions.text_splitter import is_heading
+
+    lines = [line.strip() for line in doc.page_content.split("\n") if line.strip()]
+    heading = doc.metadata.get("heading_path", "").split(" > ")[-1]
+    if lines and (lines[0] == heading or len(lines) > 1 and is_heading(lines[0], lines[1])):
+        lines = lines[1:]
+    body = []
+    for line in lines:
+        if body and (line[0].islower() or line[0] in ".,;:)" or _dangling.search(body[-1])):
+            body[-1] = f"{body[-1]}{'' if line[0] in '.,;:)' else ' '}{line}"
+        else:
+            body.append(line)
+    return [line for line in body if not _is_boilerplate(line)]
+
+def _snippet(docs, max_chars):
+    lines, size, seen = [], 0, set()
+    for doc in docs:
+        for line in _body_lines(doc):
+            if line in seen:
+                continue
+            if size + len(line) > max_chars:
+                return "\n".join(lines)
+            seen.add(line)
+            lines.append(line)
+            size += len(line) + 1
+    return "\n".join(lines)
+
+def _summary(grant, docs, max_chars):
+    """
+    The first sentence naming the grant, with the sentences that follow it on the page.
+    Description chunks are searched first.
+    """
+    ordered = sorted(docs, key=lambda d: d.metadata.get("section") != "description")
+    for doc in ordered:
+        lines = _body_lines(doc)
+        for i, line in enumerate(lines):
+            names = {alias_to_grant.get(name) for name in _grant_names.findall(normalize_question(line))}
+            if grant not in names or not line.endswith(".") or len(line) < summary_min_chars:
+                continue
+            summary = line
+            for following in lines[i + 1:]:
+                if not following.endswith(".") or len(summary) + len(following) + 1 > max_chars:
+                    break
+                summary = f"{summary} {following}"
+            return summary[:max_chars]
+    return ""
+
+def compile_profiles(documents):
+    """
+    Builds {grant: profile} from indexed chunks. Chunks of live pages come before manual
+    copies, and each page's chunks are read in page order.
+    """
+    by_grant = defaultdict(list)
+    for doc in documents:
+        grant = canonical_grant(doc.metadata.get("grant_title"))
+        if grant and grant != "Unknown":
+            by_grant[grant].append(doc)
+
+    profiles = {grant: static_profile(grant) for grant in grant_catalogue}
+    for grant, docs in by_grant.items():
+        docs.sort(key=lambda d: (not d.metadata.get("source", "").startswith("http"),
+                                 d.metadata.get("source", ""), d.metadata.get("position", 0)))
+        profile = profiles.setdefault(grant, static_profile(grant))
+        sections = defaultdict(list)
+        for doc in docs:
+            sections[doc.metadata.get("section", "general")].append(doc)
+        profile["summary"] = _summary(grant, docs, summary_max_chars) or profile["objective"]
+        profile["eligibility"] = _snippet(sections["eligibility"], snippet_max_chars)
+        profile["application"] = _snippet(sections["application"], snippet_max_chars)
+        profile["sources"] = sorted({d.metadata["source"] for d in docs if d.metadata.get("source", "").startswith("http")})
+    return profiles
+
+def save_profiles(profiles, path):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+        json.dump(profiles, f, indent=2)
+    os.replace(f"{path}.tmp", path)
+
+def build_grant_profiles(db, path):
+    """
+    Compiles profiles from everything stored in the Chroma collection and saves them
+    next to the index.
+    """
+    from langchain_core.documents import Document
+
+    stored = db.get(include=["documents", "metadatas"])
+    profiles = compile_profiles(
+        Document(page_content=text, metadata=meta or {})
+        for text, meta in zip(stored["documents"], stored["metadatas"])
+    )
+    save_profiles(profiles, path)
+    return profiles
+
+def load_profiles(path):
+    """
+    Loads saved profiles, or the static catalogue when the index has none.
+    """
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {grant: static_profile(grant) for grant in grant_catalogue}
+
+class GrantProfileStore:
+    """
+    Thread-safe view of the profiles published with the current index version, reloaded
+    when a refresh publishes a new version.
+    """
+
+    def __init__(self, directory_fn, version_fn):
+        self.directory_fn = directory_fn
+        self.version_fn = version_fn
+        self._lock = threading.Lock()
+        self._version = None
+        self._profiles = None
+
+    def profiles(self):
+        version = self.version_fn()
+        with self._lock:
+            if self._profiles is None or version != self._version:
+                self._profiles = load_profiles(os.path.join(self.directory_fn(version), grant_profiles_filename))
+                self._version = version
+            return self._profiles
+
+    def get(self, grant):
+        return self.profiles().get(canonical_grant(grant)) if grant else None
+
+    def complement(self, grant):
+        profile = self.get(grant)
+        return profile["complements"][0] if profile and profile["complements"] else None
+
+def format_security_agency_list():
+    lines = [
+        f"- **{grant_catalogue[grant]['display_name']}** - {grant_catalogue[grant]['blurb']}"
+        for grant in security_agency_grants
+    ]
+    return (
+        "Based on your interest in grants for security agencies, here are some relevant options:\n\n"
+        + "\n".join(lines)
+        + "\n\nYou can ask about any of these grants specifically to get full details including eligibility "
+          "and how to apply."
+    )
+
+def _bullets(snippet):
+    return "\n".join(f"- {line.lstrip('•-✔ ').strip()}" for line in snippet.split("\n") if line.strip())
+
+def format_overview(profile):
+    """
+    Renders a profile in the answer format of the QA prompt, or returns None when the
+    profile lacks the eligibility or application text to answer from.
+    """
+    if not profile or not profile["summary"] or not (profile["eligibility"] or profile["application"]):
+        return None
+    return (
+        f"Grant Description:\n{profile['summary']}\n\n"
+        f"Eligibility Criteria:\n{_bullets(profile['eligibility']) or 'Not found in documents.'}\n\n"
+        f"Application Steps:\n{_bullets(profile['application']) or 'Not found in documents.'}"
+    )
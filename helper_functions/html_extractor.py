@@ -0,0 +1,218 @@
+"""
+HTML-to-text extraction for scraped and manual grant pages.
+
+Backends:
+- "lxml": libxml2's C parser, used by default when lxml is installed
+- "stream": the standard library's HTMLParser; text is emitted while parsing and no
+  tree is ever built, so memory stays flat on large pages
+- "bs4": BeautifulSoup with html.parser as before; slowest, kept for comparison
+
+All backends drop scripts and styles, drop page chrome (navigation, headers, footers,
+menus and cookie banners) and put block-level elements on their own lines. Malformed pages
+can nest the real content inside a chrome element, so the tree backends only drop chrome
+that is mostly links or very short; the stream backend cannot look ahead and drops it
+outright, except for <form>, which ASP.NET pages wrap around everything.
+"""
+import os
+import re
+import json
+import hashlib
+from html.parser import HTMLParser
+from bs4 import BeautifulSoup
+
+try:
+    from lxml import etree, html as lxml_html
+except ImportError:
+    lxml_html = None
+
+extraction_cache_dir = "data/extraction_cache"
+# Part of every cache key: bump it whenever a change to the extraction rules changes
+# the text of existing pages, so cached text from the old rules is not served
+EXTRACTOR_VERSION = 1
+
+# Elements whose whole subtree is never page text
+non_text_tags = {"script", "style", "noscript", "template", "svg", "iframe", "select", "textarea"}
+# Elements that usually hold page chrome rather than content
+chrome_tags = {"header", "footer", "nav", "aside", "form"}
+# ARIA roles of navigation chrome
+boilerplate_roles = {"navigation", "banner", "contentinfo", "menu", "menubar"}
+# Whole class names / ids of menus, breadcrumbs and cookie banners
+boilerplate_pattern = re.compile(
+    r"(?:cookies?|consent|gdpr)(?:[-_][\w-]*)?|[\w-]*[-_](?:cookies?|consent)(?:[-_][\w-]*)?"
+    r"|(?:main|mega|mobile|site|top|primary)?[-_]?menu|navbar(?:[-_][\w-]*)?|breadcrumbs?|skip[-_]?links?",
+    re.IGNORECASE,
+)
+# Page containers never treated as chrome, whatever their classes say
+content_tags = {"html", "body", "main", "article"}
+# Elements that start a new line of text
+block_tags = {
+    "address", "article", "blockquote", "br", "dd", "details", "dialog", "div", "dl", "dt",
+    "fieldset", "figcaption", "figure", "h1", "h2", "h3", "h4", "h5", "h6", "hr", "li",
+    "main", "ol", "p", "pre", "section", "summary", "table", "td", "th", "tr", "ul",
+}
+void_tags = {
+    "area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "source",
+    "track", "wbr",
+}
+# Chrome candidates are dropped by the tree backends when at least this share of their
+# text is link text, or when they hold at most chrome_max_chars non-space characters
+chrome_link_density = 0.5
+chrome_max_chars = 80
+
+def is_chrome(tag, attrs):
+    if tag in content_tags:
+        return False
+    if tag in chrome_tags or attrs.get("role") in boilerplate_roles:
+        return True
+    names = f"{attrs.get('id') or ''} {attrs.get('class') or ''}".split()
+    return any(boilerplate_pattern.fullmatch(name) for name in names)
+
+def _is_mostly_links(text, link_text):
+    chars = len("".join(text.split()))
+    return chars <= chrome_max_chars or len("".join(link_text.split())) >= chrome_link_density * chars
+
+def normalize_lines(text):
+    """
+    Collapses whitespace within lines and drops empty lines.
+    """
+    lines = (" ".join(line.split()) for line in text.splitlines())
+    return "\n".join(line for line in lines if line)
+
+class _StreamExtractor(HTMLParser):
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.parts = []
+        self.stack = []  # (tag, skipping) of open elements
+        self.skipping = False
+
+    def handle_starttag(self, tag, attrs):
+        if tag in void_tags:
+            if tag in block_tags and not self.skipping:
+                self.parts.append("\n")
+            return
+        skipping = self.skipping or tag in non_text_tags or (tag != "form" and is_chrome(tag, dict(attrs)))
+        self.stack.append((tag, self.skipping))
+        self.skipping = skipping
+        if tag in block_tags and not skipping:
+            self.parts.append("\n")
+
+    def handle_startendtag(self, tag, attrs):
+        if tag in block_tags and not self.skipping:
+            self.parts.append("\n")
+
+    def handle_endtag(self, tag):
+        # Close the nearest matching element; stray end tags are ignored
+        for i in range(len(self.stack) - 1, -1, -1):
+            if self.stack[i][0] == tag:
+                self.skipping = self.stack[i][1]
+                del self.stack[i:]
+                if tag in block_tags and not self.skipping:
+                    self.parts.append("\n")
+                return
+
+    def handle_data(self, data):
+        if not self.skipping:
+            self.parts.append(data)
+
+def extract_text_stream(html):
+    parser = _StreamExtractor()
+    parser.feed(html)
+    parser.close()
+    return normalize_lines("".join(parser.parts))
+
+def extract_text_lxml(html):
+    if not html.strip():
+        return ""
+    root = lxml_html.document_fromstring(html.encode("utf-8") if isinstance(html, str) else html)
+    parts = []
+    skipped = set()
+    context = etree.iterwalk(root, events=("start", "end"))
+    for event, element in context:
+        if not isinstance(element.tag, str):
+            # Comments and processing instructions: only their tail is page text
+            if event == "end" and element.tail:
+                parts.append(element.tail)
+            continue
+        tag = element.tag.lower()
+        if event == "start":
+            if tag in non_text_tags or (is_chrome(tag, element.attrib) and _is_mostly_links(
+                element.text_content(), "".join(a.text_content() for a in element.iter("a"))
+            )):
+                skipped.add(element)
+                context.skip_subtree()
+                continue
+            if tag in block_tags:
+                parts.append("\n")
+            if element.text:
+                parts.append(element.text)
+        else:
+            if element in skipped:
+                skipped.discard(element)
+            elif tag in block_tags:
+                parts.append("\n")
+            if element.tail:
+                parts.append(element.tail)
+    return normalize_lines("".join(parts))
+
+def extract_text_bs4(html):
+    soup = BeautifulSoup(html, "html.parser")
+    for tag in soup.find_all(non_text_tags):
+        tag.decompose()
+    for tag in soup.find_all(True):
+        if tag.decomposed:
+            continue
+        attrs = {k: " ".join(v) if isinstance(v, list) else v for k, v in tag.attrs.items()}
+        if is_chrome(tag.name, attrs) and _is_mostly_links(
+            tag.get_text(), "".join(a.get_text() for a in tag.find_all("a"))
+        ):
+            tag.decompose()
+    for tag in soup.find_all(block_tags):
+        tag.insert_before("\n")
+        tag.insert_after("\n")
+    return normalize_lines(soup.get_text())
+
+backends = {"stream": extract_text_stream, "bs4": extract_text_bs4}
+if lxml_html is not None:
+    backends["lxml"] = extract_text_lxml
+default_backend = "lxml" if lxml_html is not None else "stream"
+
+def extract_text(html, backend=None):
+    """
+    Returns the readable text of an HTML page, one block per line, without boilerplate.
+    """
+    return backends[backend or default_backend](html)
+
+def _cache_path(path, backend, cache_dir):
+    key = hashlib.sha256(f"{os.path.abspath(path)}|{backend}|{EXTRACTOR_VERSION}".encode("utf-8")).hexdigest()[:32]
+    return os.path.join(cache_dir, f"{key}.json")
+
+def extract_file(path, backend=None, cache_dir=None):
+    """
+    Extracts the text of an HTML file, reusing the cached result while the file is unchanged.
+    A matching mtime is trusted without reading the file; when the mtime moved, the
+    content hash decides whether the file really changed.
+    """
+    backend = backend or default_backend
+    cache_path = _cache_path(path, backend, cache_dir or extraction_cache_dir)
+    mtime = os.stat(path).st_mtime_ns
+    try:
+        with open(cache_path, "r", encoding="utf-8") as f:
+            cached = json.load(f)
+    except (FileNotFoundError, ValueError):
+        cached = None
+    if cached and cached["mtime_ns"] == mtime:
+        return cached["text"]
+
+    with open(path, "rb") as f:
+        raw = f.read()
+    digest = hashlib.sha256(raw).hexdigest()
+    if cached and cached["sha256"] == digest:
+        text = cached["text"]
+    else:
+        text = extract_text(raw.decode("utf-8", errors="replace"), backend)
+
+    os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+    with open(f"{cache_path}.tmp", "w", encoding="utf-8") as f:
+        json.dump({"mtime_ns": mtime, "sha256": digest, "text": text}, f)
+    os.replace(f"{cache_path}.tmp", cache_path)
+    return text
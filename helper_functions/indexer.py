@@ -0,0 +1,109 @@
+import hashlib
+from collections import defaultdict
+from langchain_core.documents import Document
+from helper_functions.ingestion import ingest_chunks, print_ingest_report
+
+def content_hash(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+def content_fingerprint(text):
+    """
+    Hash of a page's extracted text with whitespace and case normalized, so re-rendered
+    markup that leaves the wording alone does not count as a change.
+    """
+    return content_hash(" ".join(text.lower().split()))
+
+def source_key(source):
+    return hashlib.sha256(source.encode("utf-8")).hexdigest()[:16]
+
+def assign_chunk_ids(chunks):
+    """
+    Gives each chunk a stable ID built from its source and the hash of its content.
+    Identical chunks within the same source get an occurrence suffix so IDs stay unique.
+    Returns a list of (chunk_id, Document) pairs in the original order.
+    """
+    seen = defaultdict(int)
+    assigned = []
+    for chunk in chunks:
+        source = chunk.metadata.get("source", "")
+        digest = content_hash(chunk.page_content)
+        occurrence = seen[(source, digest)]
+        seen[(source, digest)] += 1
+
+        chunk_id = f"{source_key(source)}-{digest[:32]}-{occurrence}"
+        metadata = dict(chunk.metadata)
+        metadata["content_hash"] = digest
+        assigned.append((chunk_id, Document(page_content=chunk.page_content, metadata=metadata)))
+    return assigned
+
+def _existing_ids_by_source(db):
+    existing = db.get(include=["metadatas"])
+    by_source = defaultdict(set)
+    for chunk_id, meta in zip(existing["ids"], existing["metadatas"]):
+        by_source[(meta or {}).get("source", "")].add(chunk_id)
+    return by_source
+
+def index_documents(db, chunks, keep_sources=(), checkpoint_path=None):
+    """
+    Brings the collection in line with `chunks` without re-embedding what is already stored.
+
+    Only chunks whose ID is not in the collection are embedded and upserted. Stored chunks
+    that no longer appear for their source are deleted, as are all chunks of sources that
+    have disappeared, except sources listed in `keep_sources`.
+
+    New chunks are embedded and written batch by batch by ingestion.ingest_chunks; a run
+    that crashed midway resumes from `checkpoint_path` and from what was already written.
+
+    A new chunk that replaces a removed chunk of the same source is counted as "updated".
+    Returns {source: {"added", "updated", "deleted", "unchanged"}}.
+    """
+    wanted_by_source = defaultdict(dict)
+    for chunk_id, doc in assign_chunk_ids(chunks):
+        wanted_by_source[doc.metadata.get("source", "")][chunk_id] = doc
+
+    existing_by_source = _existing_ids_by_source(db)
+    keep_sources = set(keep_sources)
+
+    report = {}
+    to_add, to_delete = [], []
+    for source in sorted(set(wanted_by_source) | set(existing_by_source)):
+        if source not in wanted_by_source and source in keep_sources:
+            continue
+
+        wanted = wanted_by_source.get(source, {})
+        existing = existing_by_source.get(source, set())
+
+        new_ids = [chunk_id for chunk_id in wanted if chunk_id not in existing]
+        stale_ids = sorted(existing - set(wanted))
+        updated = min(len(new_ids), len(stale_ids))
+
+        report[source] = {
+            "added": len(new_ids) - updated,
+            "updated": updated,
+            "deleted": len(stale_ids) - updated,
+            "unchanged": len(wanted) - len(new_ids),
+        }
+
+        to_add.extend((chunk_id, wanted[chunk_id]) for chunk_id in new_ids)
+        to_delete.extend(stale_ids)
+
+    if to_delete:
+        db.delete(ids=to_delete)
+    if to_add:
+        print_ingest_report(ingest_chunks(db, to_add, checkpoint_path=checkpoint_path))
+
+    return report
+
+def print_index_report(report):
+    totals = defaultdict(int)
+    for source, counts in report.items():
+        for name, value in counts.items():
+            totals[name] += value
+        print(
+            f"  {source or '(no source)'}: +{counts['added']} ~{counts['updated']} "
+            f"-{counts['deleted']} ={counts['unchanged']}"
+        )
+    print(
+        f"📊 Index changes: {totals['added']} added, {totals['updated']} updated, "
+        f"{totals['deleted']} deleted, {totals['unchanged']} unchanged."
+    )
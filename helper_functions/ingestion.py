@@ -0,0 +1,129 @@
+import os
+import json
+import time
+import random
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from helper_functions import tracing
+from helper_functions.tokens import count_tokens
+
+# Max tokens and texts per embedding request
+batch_token_limit = 8000
+batch_size_limit = 256
+# Max embedding requests in flight at once
+ingest_concurrency = 4
+# Retries per batch after a rate-limit error, with exponential backoff plus jitter
+rate_limit_retries = 6
+rate_limit_backoff = 1.0
+
+def is_rate_limit_error(error):
+    return type(error).__name__ == "RateLimitError" or getattr(error, "status_code", None) == 429
+
+def token_batches(items, max_tokens=None, max_size=None):
+    """
+    Groups (chunk_id, Document) pairs into consecutive batches of at most `max_tokens`
+    tokens and `max_size` chunks. A single chunk larger than the limit gets its own batch.
+    Returns a list of (items, token_count) pairs.
+    """
+    max_tokens = max_tokens or batch_token_limit
+    max_size = max_size or batch_size_limit
+    batches, current, current_tokens = [], [], 0
+    for item in items:
+        tokens = count_tokens(item[1].page_content)
+        if current and (current_tokens + tokens > max_tokens or len(current) >= max_size):
+            batches.append((current, current_tokens))
+            current, current_tokens = [], 0
+        current.append(item)
+        current_tokens += tokens
+    if current:
+        batches.append((current, current_tokens))
+    return batches
+
+def _load_checkpoint(path):
+    if not path:
+        return set()
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return set(json.load(f)["done"])
+    except (FileNotFoundError, ValueError, KeyError):
+        return set()
+
+def _save_checkpoint(path, done):
+    tmp_path = f"{path}.tmp"
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"done": sorted(done)}, f)
+    os.replace(tmp_path, path)
+
+def _embed_batch(embedder, texts, tokens):
+    """
+    Returns (vectors, retries), retrying with backoff while the API reports rate limiting.
+    """
+    for attempt in range(rate_limit_retries + 1):
+        try:
+            with tracing.span("ingest_batch", texts=len(texts), tokens=tokens, attempt=attempt):
+                return embedder.embed_documents(texts), attempt
+        except Exception as e:
+            if not is_rate_limit_error(e) or attempt == rate_limit_retries:
+                raise
+            time.sleep(rate_limit_backoff * (2 ** attempt) * (1 + random.random()))
+
+def ingest_chunks(db, items, embedder=None, checkpoint_path=None, concurrency=None,
+                  max_tokens=None, max_size=None):
+    """
+    Embeds (chunk_id, Document) pairs in token-sized batches, several batches at a time,
+    and upserts each batch into the Chroma collection as soon as it is embedded.
+
+    IDs written so far are recorded in `checkpoint_path`, so a crashed run resumes with
+    the remaining chunks; the checkpoint is removed once everything is written.
+    Returns {"chunks", "batches", "tokens", "skipped", "rate_limit_retries", "seconds",
+    "chunks_per_second"}.
+    """
+    embedder = embedder or db.embeddings
+    done = _load_checkpoint(checkpoint_path)
+    pending = [item for item in items if item[0] not in done]
+    batches = token_batches(pending, max_tokens=max_tokens, max_size=max_size)
+    stats = {"chunks": 0, "batches": len(batches), "tokens": sum(t for _, t in batches),
+             "skipped": len(items) - len(pending), "rate_limit_retries": 0}
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency or ingest_concurrency) as pool:
+        futures = {
+            pool.submit(_embed_batch, embedder, [doc.page_content for _, doc in batch], tokens): batch
+            for batch, tokens in batches
+        }
+        try:
+            for future in as_completed(futures):
+                batch = futures[future]
+                vectors, retries = future.result()
+                stats["rate_limit_retries"] += retries
+                with tracing.span("write_batch", texts=len(batch)):
+                    db._collection.upsert(
+                        ids=[chunk_id for chunk_id, _ in batch],
+                        embeddings=[list(vector) for vector in vectors],
+                        documents=[doc.page_content for _, doc in batch],
+                        metadatas=[doc.metadata for _, doc in batch],
+                    )
+                stats["chunks"] += len(batch)
+                if checkpoint_path:
+                    done.update(chunk_id for chunk_id, _ in batch)
+                    _save_checkpoint(checkpoint_path, done)
+        except BaseException:
+            for future in futures:
+                future.cancel()
+            raise
+
+    stats["seconds"] = time.perf_counter() - start
+    stats["chunks_per_second"] = stats["chunks"] / stats["seconds"] if stats["seconds"] else 0.0
+    if checkpoint_path and os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+    return stats
+
+def print_ingest_report(stats):
+    if not stats["chunks"] and not stats["skipped"]:
+        return
+    resumed = f", {stats['skipped']} already written before a restart" if stats["skipped"] else ""
+    print(
+        f"⚡ Embedded {stats['chunks']} chunks ({stats['tokens']} tokens) in {stats['batches']} batches: "
+        f"{stats['chunks_per_second']:.1f} chunks/s, {stats['rate_limit_retries']} rate-limit retries{resumed}."
+    )
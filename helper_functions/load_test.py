@@ -0,0 +1,327 @@
+"""
+Load-test driver for the QA pipeline.
+
+Replays a question mix (keyword, intent, "security agency" and off-topic questions)
+through get_final_response from many threads at once, the way concurrent Streamlit
+sessions call it, against the offline index of benchmark_retrieval with a fake LLM and
+fake embeddings of configurable latency. Reports throughput, tail latency, error and
+fallback rates, and memory growth sampled over the run. With --duplicates, many sessions
+ask one question at the same moment instead, and the report counts the upstream LLM and
+embedding calls per number of sessions, with and without coalescing. Run with:
+
+    python -m helper_functions.load_test --concurrency 50 --rate 20 --requests 500
+    python -m helper_functions.load_test --duplicates 1,5,10,25,50
+"""
+import gc
+import os
+import sys
+import time
+import random
+import argparse
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+from helper_functions import clients, qa_chain, retriever, tracing
+from helper_functions.answer_cache import AnswerCache
+from helper_functions.benchmark_retrieval import offline_pipeline, percentiles
+
+# Questions per kind; the driver samples kinds by `default_mix` weight
+question_mix = {
+    "keyword": [
+        "What is the Productivity Solutions Grant?",
+        "Who is eligible for the Enterprise Development Grant?",
+        "How do I apply for the CTC grant?",
+        "What does SFQB offer?",
+        "Tell me about CCP for security officers",
+        "What is the SkillsFuture Enterprise Credit?",
+        "What solutions does the ADS grant support?",
+        "What is PSG-JR job redesign consultancy support?",
+    ],
+    "intent": [
+        "How can I reskill my security officers?",
+        "I want to upskill my HR team, what support is there?",
+        "Is there funding for security training?",
+    ],
+    "security_agency": [
+        "What grants are available for security agencies?",
+        "Give me a list of grants for my security company",
+    ],
+    "generic": [
+        "What funding can a small business get to go digital?",
+        "Are there grants for expanding overseas?",
+        "What is the weather like today?",
+    ],
+}
+default_mix = {"keyword": 0.5, "intent": 0.2, "security_agency": 0.15, "generic": 0.15}
+# Seconds between memory samples
+memory_sample_interval = 0.5
+# Share of samples at the start of the run ignored when fitting memory growth
+memory_warmup_share = 0.2
+
+def rss_mb():
+    """
+    Current resident set size in MB (peak RSS where /proc is unavailable).
+    """
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1e6
+    except (OSError, ValueError, IndexError):
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 1e6 if sys.platform == "darwin" else peak / 1e3
+
+def parse_mix(text):
+    """
+    Parses "keyword=0.5,intent=0.2,..." into a weight dict.
+    """
+    mix = {}
+    for part in text.split(","):
+        kind, _, weight = part.partition("=")
+        if kind.strip() not in question_mix:
+            raise ValueError(f"Unknown question kind {kind.strip()!r}; expected one of {sorted(question_mix)}")
+        mix[kind.strip()] = float(weight)
+    return mix
+
+def build_schedule(requests, mix=None, arrival_rate=None, seed=0):
+    """
+    Returns (arrival offset in seconds, kind, question) per request. Arrivals follow a
+    Poisson process at `arrival_rate` per second; without a rate every request arrives at 0
+    and the worker pool alone limits concurrency (closed loop).
+    """
+    rng = random.Random(seed)
+    mix = mix or default_mix
+    kinds, weights = zip(*mix.items())
+    schedule, offset = [], 0.0
+    for _ in range(requests):
+        if arrival_rate:
+            offset += rng.expovariate(arrival_rate)
+        kind = rng.choices(kinds, weights)[0]
+        schedule.append((offset, kind, rng.choice(question_mix[kind])))
+    return schedule
+
+class MemorySampler:
+    """
+    Samples RSS and the number of live Python objects from a daemon thread.
+    """
+
+    def __init__(self, progress, interval=None):
+        self.progress = progress
+        self.interval = interval or memory_sample_interval
+        self.samples = []
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def sample(self):
+        self.samples.append({"elapsed": time.perf_counter() - self._start, "completed": self.progress(),
+                             "rss_mb": round(rss_mb(), 2), "objects": len(gc.get_objects())})
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.sample()
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        self.sample()
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.sample()
+        return False
+
+def memory_growth(samples):
+    """
+    Fits RSS and live objects against completed requests after the warm-up share of samples.
+    Steady growth per 1000 requests points at a leak; a plateau does not.
+    """
+    steady = samples[int(len(samples) * memory_warmup_share):]
+    growth = {"rss_start_mb": samples[0]["rss_mb"], "rss_end_mb": samples[-1]["rss_mb"],
+              "rss_peak_mb": max(s["rss_mb"] for s in samples),
+              "objects_start": samples[0]["objects"], "objects_end": samples[-1]["objects"]}
+    completed = np.array([s["completed"] for s in steady], dtype=float)
+    if len(steady) >= 3 and np.ptp(completed) > 0:
+        growth["rss_mb_per_1000"] = round(float(np.polyfit(completed, [s["rss_mb"] for s in steady], 1)[0]) * 1000, 3)
+        growth["objects_per_1000"] = round(float(np.polyfit(completed, [s["objects"] for s in steady], 1)[0]) * 1000, 1)
+    return growth
+
+def run_load_test(requests=200, concurrency=50, arrival_rate=None, mix=None, llm_latency=0.2,
+                  embedding_latency=0.02, llm_error_rate=0.0, answer_cache=False, seed=0):
+    """
+    Answers `requests` questions from `concurrency` worker threads and returns the report.
+    Latency runs from a request's scheduled arrival to its answer, so queueing counts.
+    """
+    schedule = build_schedule(requests, mix, arrival_rate, seed)
+    random.seed(seed)
+    results = []
+    results_lock = threading.Lock()
+
+    def ask(start, offset, kind, question):
+        delay = start + offset - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        try:
+            answer = qa_chain.get_final_response(question)
+            if answer == qa_chain.fallback_response:
+                outcome = "fallback"
+            elif answer.startswith(qa_chain.degraded_notice):
+                outcome = "degraded"
+            else:
+                outcome = "answered"
+        except Exception:
+            outcome = "exception"
+        with results_lock:
+            results.append((kind, outcome, time.perf_counter() - (start + offset)))
+
+    was_enabled = tracing.enabled
+    with offline_pipeline(llm_latency=0.0) as llm:
+        if answer_cache:
+            qa_chain.answer_cache = AnswerCache(embedder=clients.embedding)
+        # Warm up once without latency so imports, the store and BM25 load outside the run
+        qa_chain.get_final_response(question_mix["keyword"][0])
+        qa_chain.answer_cache.clear()
+        llm.latency, llm.error_rate = llm_latency, llm_error_rate
+        clients.embedding.latency = embedding_latency
+
+        tracing.reset()
+        tracing.enable()
+        gc.collect()
+        try:
+            with MemorySampler(lambda: len(results)) as sampler, \
+                    ThreadPoolExecutor(max_workers=concurrency) as pool:
+                start = time.perf_counter()
+                futures = [pool.submit(ask, start, *item) for item in schedule]
+                for future in futures:
+                    future.result()
+                elapsed = time.perf_counter() - start
+            failures = tracing.error_counts()
+            errors = sum(count for (stage, _), count in failures.items() if stage == "answer")
+            # Failed LLM attempts, including those a retry or hedge recovered from
+            attempt_errors = sum(count for (stage, _), count in failures.items() if stage == "llm_attempt")
+        finally:
+            if not was_enabled:
+                tracing.disable()
+            tracing.reset()
+
+    by_kind = defaultdict(list)
+    for kind, _, latency in results:
+        by_kind[kind].append(latency)
+    fallbacks = sum(outcome == "fallback" for _, outcome, _ in results)
+    return {
+        "requests": len(results),
+        "concurrency": concurrency,
+        "arrival_rate": arrival_rate,
+        "seconds": round(elapsed, 3),
+        "throughput_rps": round(len(results) / elapsed, 2) if elapsed else 0.0,
+        "latency_ms": percentiles([latency for _, _, latency in results]),
+        "latency_ms_by_kind": {kind: percentiles(samples) for kind, samples in sorted(by_kind.items())},
+        "error_rate": round((errors + sum(o == "exception" for _, o, _ in results)) / len(results), 4),
+        # Fallback answers not caused by an error
+        "fallback_rate": round(max(fallbacks - errors, 0) / len(results), 4),
+        # Snippet answers served because the LLM failed or ran out of time
+        "degraded_rate": round(sum(o == "degraded" for _, o, _ in results) / len(results), 4),
+        "llm_attempt_errors": attempt_errors,
+        "memory": memory_growth(sampler.samples),
+        "memory_samples": sampler.samples,
+    }
+
+def run_duplicate_test(levels=(1, 5, 10, 25, 50), question=None, llm_latency=0.2,
+                       embedding_latency=0.02, coalesce=True):
+    """
+    For each number of sessions in `levels`, asks the same question from that many threads
+    at once (answer and expansion caches cleared) and counts the upstream calls it caused.
+    """
+    question = question or question_mix["generic"][0]
+    rows = []
+    saved = qa_chain.coalesce_questions
+    with offline_pipeline(llm_latency=0.0) as llm:
+        qa_chain.coalesce_questions = coalesce
+        try:
+            qa_chain.get_final_response(question_mix["keyword"][0])
+            llm.latency = llm_latency
+            clients.embedding.latency = embedding_latency
+            for sessions in levels:
+                qa_chain.answer_cache.clear()
+                retriever.expansion_cache.clear()
+                llm.calls = clients.embedding.calls = 0
+                barrier = threading.Barrier(sessions)
+
+                def ask(_):
+                    barrier.wait()
+                    start = time.perf_counter()
+                    answer = qa_chain.get_final_response(question)
+                    return answer, time.perf_counter() - start
+
+                with ThreadPoolExecutor(max_workers=sessions) as pool:
+                    answers, latencies = zip(*pool.map(ask, range(sessions)))
+                rows.append({
+                    "sessions": sessions,
+                    "llm_calls": llm.calls,
+                    "embedding_calls": clients.embedding.calls,
+                    "distinct_answers": len(set(answers)),
+                    "latency_ms": percentiles(latencies),
+                })
+        finally:
+            qa_chain.coalesce_questions = saved
+    return {"question": question, "coalesce": coalesce, "levels": rows}
+
+def print_duplicate_report(report):
+    print(f"👯 Identical concurrent questions, coalescing {'on' if report['coalesce'] else 'off'}: {report['question']!r}")
+    for row in report["levels"]:
+        print(f"  {row['sessions']:4d} sessions  {row['llm_calls']:4d} LLM calls  {row['embedding_calls']:4d} embedding calls  "
+              f"p50 {row['latency_ms']['p50']:8.1f}ms  p99 {row['latency_ms']['p99']:8.1f}ms  "
+              f"{row['distinct_answers']} distinct answer(s)")
+
+def print_report(report):
+    rate = f"{report['arrival_rate']}/s arrivals" if report["arrival_rate"] else "closed loop"
+    print(f"🚦 {report['requests']} requests, {report['concurrency']} workers, {rate}: "
+          f"{report['throughput_rps']} req/s over {report['seconds']}s")
+    latency = report["latency_ms"]
+    print(f"  latency                p50 {latency['p50']:9.1f}ms  p95 {latency['p95']:9.1f}ms  p99 {latency['p99']:9.1f}ms")
+    for kind, values in report["latency_ms_by_kind"].items():
+        print(f"    {kind:<20} p50 {values['p50']:9.1f}ms  p95 {values['p95']:9.1f}ms  p99 {values['p99']:9.1f}ms")
+    print(f"  error rate {report['error_rate']:.2%}, fallback rate {report['fallback_rate']:.2%}, "
+          f"degraded rate {report['degraded_rate']:.2%} ({report['llm_attempt_errors']} failed LLM attempts)")
+    memory = report["memory"]
+    print(f"  🧠 RSS {memory['rss_start_mb']:.1f} -> {memory['rss_end_mb']:.1f}MB (peak {memory['rss_peak_mb']:.1f}MB), "
+          f"objects {memory['objects_start']} -> {memory['objects_end']}")
+    if "rss_mb_per_1000" in memory:
+        print(f"     steady growth: {memory['rss_mb_per_1000']}MB and {memory['objects_per_1000']} objects "
+              f"per 1000 requests")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=200, help="questions to ask in total")
+    parser.add_argument("--concurrency", type=int, default=50, help="worker threads (simulated sessions)")
+    parser.add_argument("--rate", type=float, default=None, help="Poisson arrivals per second (default: closed loop)")
+    parser.add_argument("--mix", type=parse_mix, default=None,
+                        help="question kind weights, e.g. keyword=0.5,intent=0.2,security_agency=0.15,generic=0.15")
+    parser.add_argument("--llm-latency", type=float, default=0.2, help="seconds per fake LLM call")
+    parser.add_argument("--embedding-latency", type=float, default=0.02, help="seconds per fake embedding call")
+    parser.add_argument("--llm-error-rate", type=float, default=0.0, help="share of fake LLM calls that fail")
+    parser.add_argument("--answer-cache", action="store_true", help="serve repeated questions from the answer cache")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--duplicates", type=lambda text: [int(n) for n in text.split(",")], default=None,
+                        help="session counts for the identical-question test, e.g. 1,5,10,25,50")
+    args = parser.parse_args(argv)
+
+    if args.duplicates:
+        for coalesce in (False, True):
+            print_duplicate_report(run_duplicate_test(
+                args.duplicates, llm_latency=args.llm_latency, embedding_latency=args.embedding_latency,
+                coalesce=coalesce,
+            ))
+        return 0
+
+    print_report(run_load_test(
+        requests=args.requests, concurrency=args.concurrency, arrival_rate=args.rate, mix=args.mix,
+        llm_latency=args.llm_latency, embedding_latency=args.embedding_latency,
+        llm_error_rate=args.llm_error_rate, answer_cache=args.answer_cache, seed=args.seed,
+    ))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,273 @@
+"""
+In-memory NumPy vector index over the published Chroma collection.
+
+The corpus is a few hundred chunks, so every chunk vector fits in one contiguous float32
+matrix. Rows are grouped by grant title when the index is loaded: a grant filter selects
+a slice of the matrix (or the rows of several slices) and a section filter a boolean
+mask, so filtered queries only score their own rows. Cosine top-k and MMR re-ranking are
+matrix products, and a batch of queries (the multi-query variants) is scored in a single
+matmul. Results are the same Documents (content, metadata and id) Chroma returns, in the
+same order, and relevance scores use the collection's distance function. Ranking is by
+cosine similarity, which orders results like Chroma's "l2" and "ip" spaces for unit-length
+embeddings such as OpenAI's.
+
+An index loaded with from_codes memory-maps the vectors saved by build_vector_codes and
+searches their int8 or binary codes first, re-ranking a shortlist with the exact vectors
+(see vector_codes).
+"""
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+from helper_functions import vector_codes
+
+# Chroma distance of a unit-vector pair with cosine similarity `sim`, per distance space
+_distances = {
+    "cosine": lambda sim: 1.0 - sim,
+    "l2": lambda sim: 2.0 - 2.0 * sim,
+    "ip": lambda sim: 1.0 - sim,
+}
+
+def parse_filter(filter):
+    """
+    Reads the Chroma `where` filters built by retriever._build_search_kwargs into
+    (grant titles, section). Either is None when not filtered on.
+    """
+    if not filter:
+        return None, None
+    if "$and" in filter:
+        grants, section = None, None
+        for clause in filter["$and"]:
+            clause_grants, clause_section = parse_filter(clause)
+            grants = clause_grants or grants
+            section = clause_section or section
+        return grants, section
+    if "$or" in filter:
+        grants = []
+        for clause in filter["$or"]:
+            clause_grants, clause_section = parse_filter(clause)
+            if clause_section or not clause_grants:
+                raise ValueError(f"Unsupported filter for the NumPy index: {filter}")
+            grants.extend(clause_grants)
+        return tuple(grants), None
+    if set(filter) == {"grant_title"}:
+        return (filter["grant_title"],), None
+    if set(filter) == {"section"}:
+        return None, filter["section"]
+    raise ValueError(f"Unsupported filter for the NumPy index: {filter}")
+
+def _normalize(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+class NumpyVectorIndex:
+    """
+    Unit-normalised chunk vectors in one float32 matrix, grouped by grant title.
+    Implements the search methods the retrievers call on a Chroma store.
+    """
+
+    def __init__(self, vectors, documents, embeddings=None, space="l2", relevance_score_fn=None,
+                 codes=None, presorted=False):
+        grants = [doc.metadata.get("grant_title") or "" for doc in documents]
+        if not documents:
+            # An empty or freshly created collection: every search returns nothing
+            order = []
+            self.matrix = np.zeros((0, 0), dtype=np.float32)
+        elif presorted:
+            # Unit-length rows already grouped by grant, e.g. memory-mapped from build_vector_codes
+            order = list(range(len(documents)))
+            self.matrix = vectors
+        else:
+            order = sorted(range(len(documents)), key=lambda i: grants[i])
+            self.matrix = np.ascontiguousarray(_normalize(np.reshape(vectors, (len(documents), -1)))[order])
+        self.documents = [documents[i] for i in order]
+        self.codes = codes
+        self.embeddings = embeddings
+        self.space = space
+        self.relevance_score_fn = relevance_score_fn or (lambda distance: 1.0 - distance / np.sqrt(2))
+
+        # Per-grant row partitions and per-section row masks
+        self.partitions = {}
+        for row, i in enumerate(order):
+            start = self.partitions.get(grants[i], slice(row, row)).start
+            self.partitions[grants[i]] = slice(start, row + 1)
+        self.section_masks = {}
+        for row, doc in enumerate(self.documents):
+            section = doc.metadata.get("section")
+            if section:
+                self.section_masks.setdefault(section, np.zeros(len(self.documents), dtype=bool))[row] = True
+        self._rows = {}
+
+    @classmethod
+    def from_chroma(cls, db):
+        """
+        Loads every vector, text and metadata record of a Chroma store.
+        """
+        data = db.get(include=["embeddings", "documents", "metadatas"])
+        documents = [
+            Document(page_content=text, metadata=meta or {}, id=chunk_id)
+            for chunk_id, text, meta in zip(data["ids"], data["documents"], data["metadatas"])
+        ]
+        space = ((db._collection.configuration or {}).get("hnsw") or {}).get("space") or "l2"
+        return cls(data["embeddings"], documents, db.embeddings, space, db._select_relevance_score_fn())
+
+    @classmethod
+    def from_codes(cls, db, directory, quantization="int8"):
+        """
+        Memory-maps the vectors and codes build_vector_codes saved in `directory`, reading
+        only texts and metadata from the Chroma store. Returns None when there are no
+        codes for the store's current chunks.
+        """
+        stored = vector_codes.read_codes(directory, quantization)
+        if stored is None:
+            return None
+        ids, space, matrix, codes = stored
+        data = db.get(ids=ids, include=["documents", "metadatas"])
+        by_id = {
+            chunk_id: Document(page_content=text, metadata=meta or {}, id=chunk_id)
+            for chunk_id, text, meta in zip(data["ids"], data["documents"], data["metadatas"])
+        }
+        if len(by_id) != len(ids) or db._collection.count() != len(ids):
+            return None
+        return cls(matrix, [by_id[chunk_id] for chunk_id in ids], db.embeddings, space,
+                   db._select_relevance_score_fn(), codes=codes, presorted=True)
+
+    def __len__(self):
+        return len(self.documents)
+
+    def rows(self, grant_titles=None, section=None):
+        """
+        The matrix rows a filter selects: a slice for a single grant (no copy), otherwise
+        an array of row numbers. Computed once per filter.
+        """
+        key = (tuple(grant_titles) if grant_titles else None, section)
+        rows = self._rows.get(key)
+        if rows is None:
+            if key[0] is None:
+                rows = slice(0, len(self.documents))
+            else:
+                parts = [self.partitions[title] for title in dict.fromkeys(key[0]) if title in self.partitions]
+                rows = parts[0] if len(parts) == 1 else \
+                    np.concatenate([np.arange(part.start, part.stop) for part in parts] or [np.arange(0)])
+            if section:
+                mask = self.section_masks.get(section, np.zeros(len(self.documents), dtype=bool))
+                rows = np.arange(len(self.documents))[rows][mask[rows]]
+            self._rows[key] = rows
+        return rows
+
+    def _candidates(self, query_vectors, filter, n):
+        """
+        The `n` filtered rows most similar to each query, most similar first, and their
+        exact cosine similarities, one matmul for the batch. With codes the filtered rows
+        are scored on the codes and only a shortlist is re-scored with the exact vectors.
+        """
+        rows = self.rows(*parse_filter(filter))
+        row_numbers = np.arange(len(self.documents))[rows]
+        if not len(self.documents):
+            queries = _normalize(query_vectors).reshape(len(query_vectors), -1)
+            return queries, np.zeros((len(queries), 0), dtype=int), np.zeros((len(queries), 0), dtype=np.float32)
+        queries = _normalize(query_vectors).reshape(-1, self.matrix.shape[1])
+        shortlist = n * vector_codes.rerank_factors.get(getattr(self.codes, "name", None), 0)
+        if 0 < shortlist < len(row_numbers):
+            approximate = self.codes.scores(queries, row_numbers)
+            # Kept in row order so ties break as in the full-precision search
+            picked = np.sort(np.argpartition(-approximate, shortlist - 1, axis=1)[:, :shortlist], axis=1)
+            candidates = row_numbers[picked]
+            sims = np.einsum("qd,qcd->qc", queries, self.matrix[candidates])
+        else:
+            candidates = np.broadcast_to(row_numbers, (len(queries), len(row_numbers)))
+            sims = queries @ self.matrix[rows].T
+        order = np.argsort(-sims, axis=1, kind="stable")[:, :n]
+        return queries, np.take_along_axis(candidates, order, axis=1), np.take_along_axis(sims, order, axis=1)
+
+    def _embed(self, queries):
+        if len(queries) == 1:
+            return [self.embeddings.embed_query(queries[0])]
+        return self.embeddings.embed_documents(list(queries))
+
+    def similarity_search_by_vectors(self, query_vectors, k=4, filter=None):
+        """
+        Top-k (row, similarity) pairs per query vector, most similar first.
+        """
+        _, candidates, sims = self._candidates(query_vectors, filter, k)
+        return [list(zip(c.tolist(), s.tolist())) for c, s in zip(candidates, sims)]
+
+    def mmr_search_by_vectors(self, query_vectors, k=4, fetch_k=20, lambda_mult=0.5, filter=None):
+        """
+        Maximal marginal relevance per query vector, all queries re-ranked together.
+        Like Chroma, the `fetch_k` nearest chunks are the candidates and the selected ones
+        are returned in candidate (similarity) order.
+        """
+        queries, candidates, query_sims = self._candidates(query_vectors, filter, fetch_k)
+        k = min(k, candidates.shape[1])
+        if k == 0:
+            return [[] for _ in range(len(queries))]
+        vectors = self.matrix[candidates]
+        pairwise = vectors @ vectors.transpose(0, 2, 1)
+
+        batch = np.arange(len(queries))
+        selected = np.zeros(candidates.shape, dtype=bool)
+        pick = query_sims.argmax(axis=1)
+        selected[batch, pick] = True
+        redundancy = pairwise[batch, pick]
+        for _ in range(1, k):
+            scores = lambda_mult * query_sims - (1 - lambda_mult) * redundancy
+            scores[selected] = -np.inf
+            pick = scores.argmax(axis=1)
+            selected[batch, pick] = True
+            redundancy = np.maximum(redundancy, pairwise[batch, pick])
+        return [c[s].tolist() for c, s in zip(candidates, selected)]
+
+    def search_batch(self, queries, search_type="similarity", k=4, fetch_k=20, lambda_mult=0.5, filter=None):
+        """
+        Documents for each query, embedding the whole batch in one call.
+        """
+        if not len(self.documents):
+            return [[] for _ in queries]
+        vectors = self._embed(queries)
+        if search_type == "mmr":
+            hits = self.mmr_search_by_vectors(vectors, k, fetch_k, lambda_mult, filter)
+        else:
+            hits = [[row for row, _ in scored] for scored in self.similarity_search_by_vectors(vectors, k, filter)]
+        return [[self.documents[row] for row in rows] for rows in hits]
+
+    def similarity_search(self, query, k=4, filter=None, **kwargs):
+        return self.search_batch([query], "similarity", k=k, filter=filter)[0]
+
+    def max_marginal_relevance_search(self, query, k=4, fetch_k=20, lambda_mult=0.5, filter=None, **kwargs):
+        return self.search_batch([query], "mmr", k, fetch_k, lambda_mult, filter)[0]
+
+    def similarity_search_with_relevance_scores(self, query, k=4, filter=None, **kwargs):
+        if not len(self.documents):
+            return []
+        scored = self.similarity_search_by_vectors(self._embed([query]), k, filter)[0]
+        distance = _distances.get(self.space, _distances["cosine"])
+        return [(self.documents[row], self.relevance_score_fn(distance(sim))) for row, sim in scored]
+
+def build_vector_codes(db, directory):
+    """
+    Saves the store's vectors in index row order, with their int8 and binary codes, to
+    `directory` for NumpyVectorIndex.from_codes.
+    """
+    index = NumpyVectorIndex.from_chroma(db)
+    if not len(index):
+        # Nothing to encode; from_codes finds no codes and readers fall back to from_chroma
+        return index
+    vector_codes.write_codes(directory, index.matrix, [doc.id for doc in index.documents], index.space)
+    return index
+
+class NumpyRetriever(BaseRetriever):
+    """
+    Retriever over a NumpyVectorIndex, configured like Chroma's as_retriever().
+    """
+
+    vectorstore: NumpyVectorIndex
+    search_type: str = "mmr"
+    search_kwargs: dict = {}
+
+    def batch_search(self, queries):
+        return self.vectorstore.search_batch(queries, self.search_type, **self.search_kwargs)
+
+    def _get_relevant_documents(self, query, *, run_manager):
+        return self.batch_search([query])[0]
@@ -1,102 +1,30 @@
-from langchain.chains import RetrievalQA
-from langchain.prompts import PromptTemplate
-from helper_functions.retriever import get_retriever
-from langchain_openai import ChatOpenAI
-from difflib import get_close_matches
-
-# Load the LLM
-llm = ChatOpenAI(model="gpt-4o-mini", temperature=0)
-
-# Step 1: Detect grant type from user input
-def detect_grant_from_question(question: str) -> str | None:
-    normalized = " ".join(question.lower().split())
-    keywords = {
-        "sfec": "SkillsFuture Enterprise Credit",
-        "skillsfuture enterprise credit": "SkillsFuture Enterprise Credit",
-        "skills future enterprise credit": "SkillsFuture Enterprise Credit",
-
-        "sfqb": "SkillsFuture Queen Bee by AETOS",
-        "skillsfuture queen bee": "SkillsFuture Queen Bee by AETOS",
-        "skills future queen bee": "SkillsFuture Queen Bee by AETOS",
-
-        "psg": "Productivity Solutions Grant",
-        "productivity solutions grant": "Productivity Solutions Grant",
-
-        "edg": "Enterprise Development Grant",
-        "enterprise development grant": "Enterprise Development Grant",
-
-        "ads": "Advanced Digital Solutions Grant",
-        "advanced digital solution": "Advanced Digital Solutions Grant",
-        "advanced digital solution grant": "Advanced Digital Solutions Grant",
-        "advanced digital solutions grant": "Advanced Digital Solutions Grant",
-
-        "ccp so": "Career Conversion Programme for Security Officers",
-        "ccp sos": "Career Conversion Programme for Security Officers",
-        "ccp for so": "Career Conversion Programme for Security Officers",
-        "ccp for sos": "Career Conversion Programme for Security Officers",
-        "ccp for security officers": "Career Conversion Programme for Security Officers",
-        "career conversion programme for security officers": "Career Conversion Programme for Security Officers",
-
-        "ccp hc": "Career Conversion Programme for Human Capital Professionals",
-        "ccp for hc": "Career Conversion Programme for Human Capital Professionals",
-        "ccp hcp": "Career Conversion Programme for Human Capital Professionals",
-        "ccp for hcp": "Career Conversion Programme for Human Capital Professionals",
-        "career conversion programme for human capital": "Career Conversion Programme for Human Capital Professionals",
-        "career conversion programme for human capital professionals": "Career Conversion Programme for Human Capital Professionals",
-
-        "ctc": "Company Training Committee Grant",
-        "ctc grant": "Company Training Committee Grant",
-        "company training committee": "Company Training Committee Grant",
-        "company training committee grant": "Company Training Committee Grant"
-    }
-
-    # 🔍 Step 1: Direct match
-    for key, grant in keywords.items():
-        if key in normalized:
-            return grant
-
-    # 🔍 Step 2: Fuzzy match
-    possible_keys = list(keywords.keys())
-    close_matches = get_close_matches(normalized, possible_keys, n=1, cutoff=0.8)
-    if close_matches:
-        return keywords[close_matches[0]]
-
-    # 🧠 Step 3: Intent-based detection
-    if any(term in normalized for term in [
-        "reskill hr", "reskill my hr", "upskill my hr", "upskill hr", "train hr", "train my hr", "hr transformation", "upskill my staff", "train human resource"
-    ]):
-        return "Career Conversion Programme for Human Capital Professionals"
-    
-    if any(term in normalized for term in [
-        "reskill my security officer", "reskill my security officers", "upskill my security officer", "upskill my security officers", "security upskill", "train my security officer", "train my security officers", "security training"
-    ]):
-        return "Career Conversion Programme for Security Officers"
-
-    return None
-
-grant_to_keywords = {
-    "SkillsFuture Enterprise Credit": ["sfec", "skillsfuture enterprise credit", "skills future enterprise credit"],
-    "SkillsFuture Queen Bee by AETOS": ["sfqb", "skillsfuture queen bee", "skills future queen bee"],
-    "Productivity Solutions Grant": ["psg", "productivity solutions grant"],
-    "Enterprise Development Grant": ["edg", "enterprise development grant"],
-    "Advanced Digital Solutions Grant": [
-        "ads", "advanced digital solution", "advanced digital solution grant", "advanced digital solutions grant"
-    ],
-    "Career Conversion Programme for Security Officers": [
-        "ccp so", "ccp sos", "ccp for so", "ccp for sos",
-        "ccp for security officers", "career conversion programme for security officers"
-    ],
-    "Career Conversion Programme for Human Capital Professionals": [
-        "ccp hc", "ccp for hc", "ccp hcp", "ccp for hcp",
-        "career conversion programme for human capital",
-        "career conversion programme for human capital professionals"
-    ],
-    "Company Training Committee Grant": [
-        "ctc", "ctc grant", "company training committee", "company training committee grant"
-    ]
-}
-
-# Step 2: Define the prompt
+import time
+from functools import lru_cache
+from helper_functions.vectorstore import get_index_directory, get_index_version
+from helper_functions import clients, resilience, tracing
+from helper_functions.answer_cache import AnswerCache
+from helper_functions.single_flight import SingleFlight
+from helper_functions.grant_detector import detect_grant_from_question, detect_section_from_question, normalize_question
+from helper_functions.grant_profiles import (
+    GrantProfileStore, canonical_grant, format_overview, format_security_agency_list, is_overview_question
+)
+
+# The LLM, the retrievers and the LangChain chains are created on the first question that
+# needs them (clients.get_llm, get_retriever, build_qa_chain); importing this module and
+# answering canned or profile questions loads none of them.
+
+# Final answers for repeated questions, dropped whenever a new index is published
+answer_cache = AnswerCache(embedder_fn=clients.get_embedding)
+
+# Grant profiles compiled with the published index
+profile_store = GrantProfileStore(directory_fn=get_index_directory, version_fn=get_index_version)
+
+# Identical questions (normalized text and detected grant) asked while one is being
+# answered wait for that answer instead of running the chain again
+coalesce_questions = True
+answer_flight = SingleFlight("answer")
+
+# Step 1: Define the prompt
 prompt_template = """You are a knowledgeable grant advisor.
 
 Answer based ONLY on the context below. Use ONLY the provided documents to answer the question.
@@ -123,151 +51,312 @@ Question:
 
 Answer:"""
 
-prompt = PromptTemplate(
-    template=prompt_template,
-    input_variables=["context", "question"]
-)
+@lru_cache(maxsize=None)
+def get_prompt():
+    from langchain_core.prompts import PromptTemplate
+    return PromptTemplate(
+        template=prompt_template,
+        input_variables=["context", "question"]
+    )
 
-abbr_to_full = {
-    "ads": "Advanced Digital Solutions Grant",
-    "advanced digital solution": "Advanced Digital Solutions Grant",
-    "advanced digital solutions grant": "Advanced Digital Solutions Grant",
-    
-    "ctc": "Company Training Committee Grant",
-    "company training committee grant": "Company Training Committee Grant",
-    
-    "psg": "Productivity Solutions Grant",
-    "productivity solutions grant": "Productivity Solutions Grant",
-    
-    "edg": "Enterprise Development Grant",
-    "enterprise development grant": "Enterprise Development Grant",
-    
-    "sfqb": "SkillsFuture Queen Bee by AETOS",
-    "skillsfuture queen bee": "SkillsFuture Queen Bee by AETOS",
-    "skills future queen bee": "SkillsFuture Queen Bee by AETOS",
-    
-    "sfec": "SkillsFuture Enterprise Credit",
-    "skillsfuture enterprise credit": "SkillsFuture Enterprise Credit",
-    "skills future enterprise credit": "SkillsFuture Enterprise Credit",
-}
-
-def normalize_and_map(grant_name):
-    normalized = " ".join(grant_name.lower().split())
-    return abbr_to_full.get(normalized, grant_name)
-
-def find_complementary_grant(docs, detected_grant):
-    detected_grant_full = normalize_and_map(detected_grant)
-
-    complements = {
-        "Advanced Digital Solutions Grant": "Career Conversion Programme for Security Officers",
-        "Company Training Committee Grant": "Career Conversion Programme for Security Officers",
-        "Productivity Solutions Grant": "Career Conversion Programme for Security Officers",
-        "Enterprise Development Grant": "SkillsFuture Enterprise Credit",
-        "SkillsFuture Queen Bee by AETOS": "Career Conversion Programme for Security Officers",
-        "Career Conversion Programme for Security Officers": "Company Training Committee Grant",
-        "SkillsFuture Enterprise Credit": "Productivity Solutions Grant",
-        "Career Conversion Programme for Human Capital Professionals": "SkillsFuture Enterprise Credit"
-    }
-
-    if detected_grant_full in complements:
-        paired = complements[detected_grant_full]
-        reason = f"This grant complements the objectives of the {detected_grant_full}."
-        return f"\n\n### 🔄 Complementary Grant Suggestion:\n- **{paired}**: {reason}"
-
-    # 🔄 Fallback to category/objective matching
-    detected_metadata = next((doc.metadata for doc in docs if doc.metadata.get("title", "").lower() == detected_grant_full.lower()), {})
-    for doc in docs:
-        title = doc.metadata.get("title", "")
-        if title.lower() == detected_grant_full.lower():
-            continue
-
-        category = doc.metadata.get("category", "").lower()
-        objective = doc.metadata.get("objective", "").lower()
-
-        if (detected_metadata.get("category", "").lower() in category) or \
-           (detected_metadata.get("objective", "").lower() in objective):
-
-            reason = f"Complementary grant related to {category or objective}."
-            return f"\n\n### 💡 Complementary Grant Suggestion:\n- **{title}**: {reason}"
-
-    return complements.get(detected_grant_full, "")  # Returns "" if no complement found
-
-# Step 3: Build QA chain with metadata filter
+def get_retriever(grant_filter=None, section=None):
+    """
+    Pooled retriever for the published index; see retriever.get_retriever.
+    """
+    from helper_functions import retriever
+    return retriever.get_retriever(grant_filter=grant_filter, section=section)
+
+def find_complementary_grant(detected_grant):
+    detected_grant_full = canonical_grant(detected_grant)
+    paired = profile_store.complement(detected_grant_full)
+    if not paired:
+        return ""
+    reason = f"This grant complements the objectives of the {detected_grant_full}."
+    return f"\n\n### 🔄 Complementary Grant Suggestion:\n- **{paired}**: {reason}"
+
+class GrantQAChain:
+    """
+    Retrieval, context packing and the answer prompt, called like RetrievalQA with
+    return_source_documents. The retrieval and generation stages share the request
+    deadline and the LLM call is hedged (see resilience); when generation fails or runs
+    out of time after documents were found, the result is marked "degraded" and carries
+    the documents instead of raising.
+    """
+
+    def __init__(self, retriever, llm):
+        self.retriever = retriever
+        self.llm = llm
+
+    def __call__(self, inputs, callbacks=None):
+        question = inputs["query"]
+        with resilience.stage("retrieval"):
+            docs = self.retriever.invoke(question, config={"callbacks": callbacks})
+        if not docs:
+            return {"result": "", "source_documents": []}
+
+        prompt = get_prompt().format(context="\n\n".join(doc.page_content for doc in docs), question=question)
+        try:
+            with resilience.stage("generation"):
+                message = resilience.call_llm(self.llm.invoke, prompt, config={"callbacks": callbacks})
+        except Exception as error:
+            tracing.record_error("generation", error)
+            return {"result": "", "source_documents": docs, "degraded": True}
+        return {"result": message.content, "source_documents": docs}
+
+# Step 2: Build QA chain with metadata filter
 def build_qa_chain(question: str):
-    grant_title = detect_grant_from_question(question)
-    retriever = get_retriever(grant_filter=grant_title if grant_title else None)
-    
-    return RetrievalQA.from_chain_type(
-        llm=llm,
-        retriever=retriever,
-        return_source_documents=True,
-        chain_type_kwargs={"prompt": prompt}
+    from helper_functions.context_packer import PackedContextRetriever
+
+    with tracing.span("detection"):
+        grant_title = detect_grant_from_question(question)
+        section = detect_section_from_question(question)
+    retriever = PackedContextRetriever(
+        retriever=get_retriever(grant_filter=grant_title if grant_title else None, section=section)
     )
 
-# Step 4: Query and format response
-def get_final_response(question: str) -> str:
-    detected_grant = detect_grant_from_question(question)
-    normalized = question.lower()
+    return GrantQAChain(retriever=retriever, llm=clients.get_llm())
+
+fallback_response = (
+    "❗ Sorry, I couldn't find a suitable answer to your question.\n\n"
+    "If you're looking for training or workforce upgrading support, "
+    "you might consider grants such as:\n\n"
+    "- **Career Conversion Programme (CCP) for Security Officers**\n"
+    "- **Company Training Committee Grant (CTC)**\n"
+    "- **Productivity Solutions Grant (PSG)**\n\n"
+    "📬 For more help, you can contact **WSG_Biz_Services@wsg.gov.sg** or "
+    "[fill out this form](https://go.gov.sg/contact-form)."
+)
+
+security_agency_response = format_security_agency_list()
+
+fallback_phrases = [
+    "i don't know", "not found in documents", "no relevant",
+    "sorry", "cannot answer", "unable to find"
+]
 
-    if not detected_grant and any(word in normalized for word in [
+def is_security_agency_question(question, detected_grant):
+    normalized = question.lower()
+    return not detected_grant and any(word in normalized for word in [
         "security agency", "security agencies", "security firm", "security company",
         "security officer", "security offiers", "security", "list of grants"
-    ]):
-        return (
-            "Based on your interest in grants for security agencies, here are some relevant options:\n\n"
-            "- **Career Conversion Programme (CCP) for Security Officers** - Reskills security officers for tech-driven roles.\n"
-            "- **Productivity Solutions Grant (PSG)** - Funds security-related tech like surveillance, smart dashboards, etc.\n"
-            "- **Company Training Committee (CTC) Grant** - Supports structured job redesign and training initiatives.\n\n"
-            "- **SkillsFuture Enterprise Credit (SFEC)** - Offsets enterprise and workforce transformation costs with up to $10,000 in credits.\n"
-            "- **SkillsFuture Queen Bee (SFQB) by AETOS** - Provides industry-led support to upskill security SMEs and drive digital adoption.\n"
-            "- **Enterprise Development Grant (EDG)** - Funds projects in innovation, productivity improvement, and business expansion.\n"
-            "- **Advanced Digital Solutions (ADS) Grant)** - Supports adoption of integrated digital solutions for enhanced operations.\n"
-            "- **Career Conversion Programme (CCP) for Human Capital Professionals** - Equips mid-career professionals to take on HR roles within sectors like security.\n\n"
-            "You can ask about any of these grants specifically to get full details including eligibility and how to apply."
-        )
-
-    try:
+    ])
+
+def is_fallback_answer(answer):
+    return not answer or any(phrase in answer.lower() for phrase in fallback_phrases)
+
+# Passages shown, and characters per passage, when the answer cannot be generated in time
+degraded_snippets = 3
+degraded_snippet_chars = 500
+degraded_notice = ("⏳ The full answer is taking longer than usual, so here are the most relevant "
+                   "passages from the grant documents:")
+
+def degraded_answer(docs, detected_grant):
+    """
+    The best retrieved passages and their sources, for when the LLM is down or too slow.
+    """
+    snippets = []
+    for doc in docs[:degraded_snippets]:
+        text = " ".join(doc.page_content.split())
+        if len(text) > degraded_snippet_chars:
+            text = text[:degraded_snippet_chars].rsplit(" ", 1)[0] + " …"
+        title = doc.metadata.get("grant_title")
+        snippets.append(f"> {f'**{title}**: ' if title else ''}{text}")
+    return degraded_notice + "\n\n" + "\n\n".join(snippets) + format_answer_suffix(docs, detected_grant)
+
+def _format_suffix(sources, detected_grant):
+    sources_str = "\n".join(f"- {src}" for src in sources)
+
+    suggestion = ""
+    if detected_grant:
+        with tracing.span("complementary_grant", grant=detected_grant):
+            suggestion = find_complementary_grant(detected_grant)
+
+    return f"{suggestion}\n\n### 🔗 Sources:\n{sources_str or 'No sources found.'}"
+
+def format_answer_suffix(docs, detected_grant):
+    """
+    Complementary-grant suggestion and source list appended after the LLM answer.
+    """
+    sources = sorted({
+        src for doc in docs if (src := doc.metadata.get("source", "")).startswith("http")
+    })
+    return _format_suffix(sources, detected_grant)
+
+def answer_from_profile(question, detected_grant):
+    """
+    Answers overview questions ("What is EDG?") from the compiled grant profile, without
+    retrieval or an LLM call. Returns None for any other question.
+    """
+    if not detected_grant or not is_overview_question(question):
+        return None
+    profile = profile_store.get(detected_grant)
+    overview = format_overview(profile)
+    if overview is None:
+        return None
+    return f"{overview}{_format_suffix(profile['sources'], detected_grant)}"
+
+def _generate_answer(question, detected_grant):
+    """
+    Answers from the cache or the QA chain. Returns (response, outcome); errors are raised.
+    """
+    cached = answer_cache.get(question, detected_grant)
+    if cached is not None:
+        return cached, "cached"
+
+    start = time.perf_counter()
+    with resilience.deadline():
         qa_chain = build_qa_chain(question)
-        result = qa_chain({"query": question})
-        final_answer = result.get("result", "").strip()
-        docs = result.get("source_documents", [])
-
-        fallback_phrases = [
-            "i don't know", "not found in documents", "no relevant",
-            "sorry", "cannot answer", "unable to find"
-        ]
-
-        # 🔧 NEW: Trigger fallback if poor result
-        if not final_answer or any(phrase in final_answer.lower() for phrase in fallback_phrases) or not docs:
-            return (
-                "❗ Sorry, I couldn't find a suitable answer to your question.\n\n"
-                "If you're looking for training or workforce upgrading support, "
-                "you might consider grants such as:\n\n"
-                "- **Career Conversion Programme (CCP) for Security Officers**\n"
-                "- **Company Training Committee Grant (CTC)**\n"
-                "- **Productivity Solutions Grant (PSG)**\n\n"
-                "📬 For more help, you can contact **WSG_Biz_Services@wsg.gov.sg** or "
-                "[fill out this form](https://go.gov.sg/contact-form)."
-            )
-
-        sources = sorted({
-            src for doc in docs if (src := doc.metadata.get("source", "")).startswith("http")
-        })
-        sources_str = "\n".join(f"- {src}" for src in sources)
-
-        suggestion = find_complementary_grant(docs, detected_grant) if detected_grant else ""
-
-        return f"{final_answer}{suggestion}\n\n### 🔗 Sources:\n{sources_str or 'No sources found.'}"
-
-    # 🛠️ Catch-all error handler
-    except Exception:
-        return (
-            "❗ Sorry, I couldn't find a suitable answer to your question.\n\n"
-            "If you're looking for training or workforce upgrading support, "
-            "you might consider grants such as:\n\n"
-            "- **Career Conversion Programme (CCP) for Security Officers**\n"
-            "- **Company Training Committee Grant (CTC)**\n"
-            "- **Productivity Solutions Grant (PSG)**\n\n"
-            "📬 For more help, you can contact **WSG_Biz_Services@wsg.gov.sg** or "
-            "[fill out this form](https://go.gov.sg/contact-form)."
-        )
\ No newline at end of file
+        callbacks = tracing.callbacks()
+        result = qa_chain({"query": question}, callbacks=callbacks)
+    final_answer = result.get("result", "").strip()
+    docs = result.get("source_documents", [])
+
+    # Generation failed or ran out of time: show what retrieval found (not cached)
+    if result.get("degraded") and docs:
+        return degraded_answer(docs, detected_grant), "degraded"
+
+    # 🔧 NEW: Trigger fallback if poor result
+    if is_fallback_answer(final_answer) or not docs:
+        return fallback_response, "fallback"
+
+    response = f"{final_answer}{format_answer_suffix(docs, detected_grant)}"
+    answer_cache.put(question, detected_grant, response, time.perf_counter() - start)
+    return response, "answered"
+
+# Step 3: Query and format response
+def get_final_response(question: str, timeout=None) -> str:
+    """
+    Answers `question`, waiting at most `timeout` seconds (no limit by default) when it
+    joins an identical question already being answered.
+    """
+    with tracing.span("answer") as root:
+        with tracing.span("detection"):
+            detected_grant = detect_grant_from_question(question)
+        root.set(grant=detected_grant)
+
+        if is_security_agency_question(question, detected_grant):
+            root.set(outcome="canned")
+            return security_agency_response
+
+        overview = answer_from_profile(question, detected_grant)
+        if overview is not None:
+            root.set(outcome="profile")
+            return overview
+
+        try:
+            if coalesce_questions:
+                (response, outcome), shared = answer_flight.do(
+                    (normalize_question(question), detected_grant),
+                    lambda: _generate_answer(question, detected_grant),
+                    timeout=timeout
+                )
+                root.set(coalesced=shared)
+            else:
+                response, outcome = _generate_answer(question, detected_grant)
+            root.set(outcome=outcome)
+            return response
+
+        except TimeoutError as error:
+            root.record_error(error)
+            root.set(outcome="timeout")
+            return fallback_response
+
+        # 🛠️ Catch-all error handler: keep the user-facing fallback, but record what failed
+        except Exception as error:
+            root.record_error(error)
+            root.set(outcome="error")
+            return fallback_response
+
+# Step 4: Streaming variant for the chat UI
+def stream_final_response(question: str):
+    """
+    Yields the answer to `question` as a sequence of events:
+
+    - {"type": "status", "text": ...} while retrieval is running
+    - {"type": "token", "text": ...} for each piece of answer text, followed by the
+      complementary-grant suggestion and sources
+    - {"type": "replace", "text": ...} when the streamed text turned out to be a fallback
+      answer; the UI should replace everything shown so far with this text
+    - {"type": "done", "time_to_first_token": seconds or None, "total_time": seconds}
+    """
+    start = time.perf_counter()
+    first_token_at = None
+
+    def done():
+        return {
+            "type": "done",
+            "time_to_first_token": first_token_at - start if first_token_at else None,
+            "total_time": time.perf_counter() - start,
+        }
+
+    with tracing.span("detection"):
+        detected_grant = detect_grant_from_question(question)
+    canned = security_agency_response if is_security_agency_question(question, detected_grant) \
+        else answer_from_profile(question, detected_grant)
+    if canned is None:
+        canned = answer_cache.get(question, detected_grant)
+    if canned is not None:
+        first_token_at = time.perf_counter()
+        yield {"type": "token", "text": canned}
+        yield done()
+        return
+
+    yield {"type": "status", "text": "🔎 Searching grant documents..."}
+    from helper_functions.context_packer import pack_context
+    docs = []
+    try:
+        with resilience.deadline():
+            retriever = get_retriever(grant_filter=detected_grant if detected_grant else None,
+                                      section=detect_section_from_question(question))
+            callbacks = tracing.callbacks()
+            with resilience.stage("retrieval"):
+                docs, _ = pack_context(retriever.invoke(question, config={"callbacks": callbacks}))
+        if not docs:
+            yield {"type": "replace", "text": fallback_response}
+            yield done()
+            return
+        yield {"type": "status", "text": f"📚 Found {len(docs)} relevant passages. Writing the answer..."}
+
+        context = "\n\n".join(doc.page_content for doc in docs)
+        answer = ""
+        llm = clients.get_llm()
+        resilience.llm_breaker.before_call()
+        try:
+            # Past the time-to-first-token or whole-stream limit, the passages are shown instead
+            for chunk in resilience.stream_llm(llm.stream, get_prompt().format(context=context, question=question),
+                                               config={"callbacks": callbacks}):
+                if not chunk.content:
+                    continue
+                if first_token_at is None:
+                    first_token_at = time.perf_counter()
+                answer += chunk.content
+                yield {"type": "token", "text": chunk.content}
+
+                # Stop generating as soon as the answer turns into a fallback
+                if is_fallback_answer(answer):
+                    break
+        except GeneratorExit:
+            # The reader went away mid-answer; the upstream was answering
+            resilience.llm_breaker.record_success()
+            raise
+        except Exception as error:
+            if resilience.is_retryable(error):
+                resilience.llm_breaker.record_failure()
+            else:
+                resilience.llm_breaker.record_client_error()
+            raise
+        resilience.llm_breaker.record_success()
+
+        if is_fallback_answer(answer.strip()):
+            yield {"type": "replace", "text": fallback_response}
+        else:
+            suffix = format_answer_suffix(docs, detected_grant)
+            yield {"type": "token", "text": suffix}
+            answer_cache.put(question, detected_grant, f"{answer.strip()}{suffix}", time.perf_counter() - start)
+
+    # 🛠️ Catch-all error handler: passages already found are shown instead of the fallback
+    except Exception as error:
+        tracing.record_error("stream_answer", error)
+        yield {"type": "replace", "text": degraded_answer(docs, detected_grant) if docs else fallback_response}
+
+    yield done()
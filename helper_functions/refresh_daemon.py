@@ -0,0 +1,323 @@
+"""
+Scheduled background refresh of the grant index.
+
+Runs refresh_vectorstore on a cadence with random jitter (so several deployments do not
+hit the grant sites at the same moment), keeps a per-URL history of fetch time, status
+and content fingerprint, and records the outcome of the last run for the status command.
+A lock file stops two runs from overlapping, whether they come from the daemon, a second
+daemon or a manual refresh (`python -m helper_functions.vectorstore`). Each scheduled run happens in a child process by default,
+so a daemon started inside the serving process never competes with it for the GIL;
+readers pick up a published version through the version tag. Run with:
+
+    python -m helper_functions.refresh_daemon run      # refresh now, then on schedule
+    python -m helper_functions.refresh_daemon once     # a single locked refresh
+    python -m helper_functions.refresh_daemon status   # last run, next run, per-URL history
+"""
+import os
+import sys
+import json
+import time
+import uuid
+import socket
+import argparse
+import threading
+import contextlib
+import subprocess
+import schedule
+
+try:
+    import fcntl
+except ImportError:  # Windows: stale locks are taken over without the guard
+    fcntl = None
+
+from helper_functions import vectorstore
+
+# Minutes between refreshes, and the most a run may start early or late
+refresh_interval_minutes = 24 * 60
+refresh_jitter_minutes = 30
+# A lock older than this is left over from a crashed run and may be taken over
+refresh_lock_stale_after = 6 * 3600
+# Fetch records kept per URL
+url_history_length = 30
+# Longest the daemon sleeps between checks of its schedule
+scheduler_poll_seconds = 30
+refresh_state_filename = "refresh_state.json"
+refresh_lock_filename = "refresh.lock"
+# Run outcomes that `once` and the manual refresh report with a nonzero exit code
+failed_outcomes = ("error", "skipped", "invalid", "aborted")
+
+def _now():
+    return time.strftime("%Y-%m-%dT%H:%M:%S%z")
+
+def _state_path():
+    return os.path.join(vectorstore.persist_directory, refresh_state_filename)
+
+def load_state():
+    try:
+        with open(_state_path(), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {"last_run": None, "next_run_at": None, "urls": {}}
+
+def _save_state(state):
+    path = _state_path()
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+        json.dump(state, f, indent=2)
+    os.replace(f"{path}.tmp", path)
+
+def record_run(run, url_records):
+    """
+    Saves the outcome of a run and appends each fetched URL's record to its history.
+    """
+    state = load_state()
+    state["last_run"] = run
+    for record in url_records:
+        history = state["urls"].setdefault(record["url"], [])
+        history.append({key: value for key, value in record.items() if key != "url"})
+        del history[:-url_history_length]
+    _save_state(state)
+    return state
+
+def record_next_run(next_run):
+    state = load_state()
+    state["next_run_at"] = next_run.strftime("%Y-%m-%dT%H:%M:%S") if next_run else None
+    _save_state(state)
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except (PermissionError, OSError):
+        return True
+    return True
+
+class RefreshLock:
+    """
+    Exclusive lock file next to the index. The holder's pid, host and start time are
+    written into it; a lock whose process is gone, or older than
+    `refresh_lock_stale_after`, is considered abandoned and taken over. Takeovers are
+    serialised on a guard file and replace the lock in one rename, so two processes
+    that both find it stale cannot both take it.
+    """
+
+    def __init__(self, path=None, stale_after=None):
+        self.path = path or os.path.join(vectorstore.persist_directory, refresh_lock_filename)
+        self.stale_after = stale_after or refresh_lock_stale_after
+        self.acquired = False
+        self.token = None
+
+    def holder(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def _is_stale(self, holder):
+        if holder is None:
+            # Unreadable: a holder that crashed mid-write, unless it is still being written
+            try:
+                return time.time() - os.path.getmtime(self.path) > 5
+            except FileNotFoundError:
+                return True
+        if time.time() - holder.get("started", 0) > self.stale_after:
+            return True
+        return holder.get("host") == socket.gethostname() and not _pid_alive(holder.get("pid", 0))
+
+    def _record(self):
+        self.token = uuid.uuid4().hex
+        return json.dumps({"pid": os.getpid(), "host": socket.gethostname(), "token": self.token,
+                           "started": time.time(), "started_at": _now()})
+
+    @contextlib.contextmanager
+    def _guard(self):
+        # Serialises takeovers and releases; creating a free lock only needs O_EXCL
+        with open(f"{self.path}.guard", "a", encoding="utf-8") as guard:
+            if fcntl:
+                fcntl.flock(guard, fcntl.LOCK_EX)
+            yield
+
+    def _take_over(self):
+        with self._guard():
+            # Checked again under the guard: another process may have just taken it over
+            stale = self.holder()
+            if not os.path.exists(self.path) or not self._is_stale(stale):
+                return False
+            print(f"🔓 Taking over a stale refresh lock: {stale}")
+            tmp_path = f"{self.path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write(self._record())
+            # The lock file never disappears, so no O_EXCL create can slip in between
+            os.replace(tmp_path, self.path)
+            return True
+
+    def acquire(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        for _ in range(2):
+            try:
+                fd = os.open(self.path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            except FileExistsError:
+                if not self._is_stale(self.holder()):
+                    return False
+                if self._take_over():
+                    self.acquired = True
+                    return True
+                # Released while we looked: try to create it again
+                continue
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(self._record())
+            self.acquired = True
+            return True
+        return False
+
+    def release(self):
+        if self.acquired:
+            self.acquired = False
+            with self._guard():
+                # Leave the lock alone if it was taken over from this holder in the meantime
+                if (self.holder() or {}).get("token") != self.token:
+                    return
+                try:
+                    os.remove(self.path)
+                except FileNotFoundError:
+                    pass
+
+def run_refresh(urls=None):
+    """
+    Runs one refresh under the lock and records it. Returns the run record; its outcome
+    is "skipped" when another refresh holds the lock, "error" when the refresh raised.
+    """
+    lock = RefreshLock()
+    if not lock.acquire():
+        holder = lock.holder() or {}
+        print(f"⏳ A refresh is already running (pid {holder.get('pid')} since {holder.get('started_at')}); skipping.")
+        return {"outcome": "skipped", "started_at": _now()}
+
+    started_at, start = _now(), time.perf_counter()
+    status = {}
+    error = None
+    try:
+        vectorstore.refresh_vectorstore(vectorstore.urls_to_scrape if urls is None else urls, status=status)
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+        print(f"❌ Refresh failed: {error}")
+    finally:
+        url_records = status.get("urls", [])
+        run = {
+            "started_at": started_at,
+            "finished_at": _now(),
+            "seconds": round(time.perf_counter() - start, 2),
+            "outcome": "error" if error else status.get("outcome", "aborted"),
+            "error": error,
+            "version": status.get("version"),
+            "changed_sources": status.get("changed_sources", []),
+            "urls_fetched": sum(record["status"] in (200, 304) for record in url_records),
+            "urls_failed": sum(record["status"] not in (200, 304) for record in url_records),
+        }
+        try:
+            record_run(run, url_records)
+        finally:
+            lock.release()
+    return run
+
+def refresh_in_subprocess(urls=None):
+    """
+    Runs `refresh_daemon once` in a child process and waits for it. Returns the exit code.
+    """
+    command = [sys.executable, "-m", "helper_functions.refresh_daemon", "once"]
+    if urls is not None:
+        command += ["--urls", *urls]
+    return subprocess.run(command).returncode
+
+def build_scheduler(job, interval_minutes=None, jitter_minutes=None):
+    """
+    Returns a schedule.Scheduler running `job` every interval ± jitter minutes, the
+    exact gap drawn at random after each run.
+    """
+    interval = interval_minutes or refresh_interval_minutes
+    jitter = refresh_jitter_minutes if jitter_minutes is None else jitter_minutes
+    earliest = max(int(interval - jitter), 1)
+    scheduler = schedule.Scheduler()
+    scheduler.every(earliest).to(max(int(interval + jitter), earliest)).minutes.do(job)
+    return scheduler
+
+def run_daemon(interval_minutes=None, jitter_minutes=None, run_now=True, stop=None, job=None):
+    """
+    Refreshes on schedule until `stop` is set (or forever).
+    """
+    stop = stop or threading.Event()
+    job = job or run_refresh
+    scheduler = build_scheduler(job, interval_minutes, jitter_minutes)
+    print(f"🗓️ Refresh daemon started: every {interval_minutes or refresh_interval_minutes} ± "
+          f"{refresh_jitter_minutes if jitter_minutes is None else jitter_minutes} minutes.")
+    if run_now:
+        job()
+    next_run = None
+    while True:
+        scheduler.run_pending()
+        if scheduler.next_run != next_run:
+            next_run = scheduler.next_run
+            record_next_run(next_run)
+            print(f"⏭️ Next refresh at {next_run:%Y-%m-%d %H:%M:%S}.")
+        idle = scheduler.idle_seconds
+        if stop.wait(min(scheduler_poll_seconds, max(idle if idle is not None else 0, 0.1))):
+            break
+
+def start_background_refresh(interval_minutes=None, jitter_minutes=None, in_process=False):
+    """
+    Starts the daemon on a background thread of the calling (e.g. serving) process and
+    returns the Event that stops it. Runs go to a child process unless `in_process`.
+    """
+    stop = threading.Event()
+    job = run_refresh if in_process else refresh_in_subprocess
+    threading.Thread(
+        target=run_daemon, name="refresh-daemon", daemon=True,
+        kwargs={"interval_minutes": interval_minutes, "jitter_minutes": jitter_minutes,
+                "run_now": False, "stop": stop, "job": job},
+    ).start()
+    return stop
+
+def print_status():
+    state = load_state()
+    run = state["last_run"]
+    if run:
+        icon = {"published": "✅", "unchanged": "⏭️", "up_to_date": "⏭️"}.get(run["outcome"], "❌")
+        print(f"{icon} Last refresh {run['started_at']}: {run['outcome']} in {run['seconds']}s, "
+              f"index version {run['version']}, {run['urls_fetched']} URLs fetched, {run['urls_failed']} failed, "
+              f"{len(run['changed_sources'])} sources changed.")
+        if run["error"]:
+            print(f"   {run['error']}")
+    else:
+        print("ℹ️ No refresh has been recorded yet.")
+    if state["next_run_at"]:
+        print(f"⏭️ Next refresh at {state['next_run_at']}.")
+    holder = RefreshLock().holder()
+    if holder:
+        print(f"🔒 Refresh running: pid {holder.get('pid')} on {holder.get('host')} since {holder.get('started_at')}.")
+    for url, history in sorted(state["urls"].items()):
+        last = history[-1]
+        icon = "✅" if last["status"] == 200 else "⏭️" if last["status"] == 304 else "❌"
+        changes = len({record["fingerprint"] for record in history if record["fingerprint"]})
+        print(f"  {icon} {last['status'] or '---'}  {last['fetched_at']}  {(last['fingerprint'] or '-')[:12]:<12}  "
+              f"{changes} versions in {len(history)} fetches  {url}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Refresh the grant index on a schedule.")
+    parser.add_argument("command", choices=["run", "once", "status"])
+    parser.add_argument("--interval", type=float, default=None, help="minutes between refreshes")
+    parser.add_argument("--jitter", type=float, default=None, help="max minutes a run starts early or late")
+    parser.add_argument("--urls", nargs="*", default=None, help="URLs to refresh (default: all grant pages)")
+    args = parser.parse_args(argv)
+
+    if args.command == "status":
+        print_status()
+    elif args.command == "once":
+        return 1 if run_refresh(args.urls)["outcome"] in failed_outcomes else 0
+    else:
+        run_daemon(args.interval, args.jitter, job=lambda: run_refresh(args.urls))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,409 @@
+"""
+Tail-latency control for upstream LLM calls.
+
+Every answer gets a deadline (`request_deadline_seconds`), spread over its stages by
+`stage_shares`: a stage may use its share of what is left, and time an earlier stage did
+not use rolls over to the later ones. Within that budget an LLM call is hedged: when the
+first attempt has not answered after the `hedge_percentile` of recent latencies for that
+kind of call, an identical second attempt is started and whichever answers first wins;
+at most `max_hedges_in_flight` hedges run at once, so a slow upstream is not sent twice
+the load. Attempts that time out, lose their connection or get a 5xx are retried, after a
+jittered exponential backoff, while attempts and time remain; other errors (bad requests,
+auth) are raised at once. A circuit
+breaker stops calling an upstream that keeps failing for `breaker_cooldown_seconds`, then
+lets one trial call through. Streamed answers get limits on the time to the first token
+and on the whole stream. Callers turn DeadlineExceeded and CircuitOpenError into degraded
+answers instead of waiting.
+"""
+import time
+import queue
+import random
+import asyncio
+import threading
+import contextlib
+import contextvars
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from helper_functions import tracing
+
+# Seconds one answer may take, and the share of the remaining time each stage may use
+request_deadline_seconds = 20.0
+stage_shares = {"retrieval": 0.35, "generation": 1.0}
+
+# Hedge an LLM call after this percentile of its recent latencies (never sooner than
+# hedge_min_delay), or after hedge_default_delay until hedge_min_samples were seen
+hedge_percentile = 95
+hedge_min_delay = 0.25
+hedge_default_delay = 8.0
+hedge_min_samples = 20
+latency_window = 200
+# Attempts per LLM call, hedges and retries included
+max_attempts = 3
+# Hedges running at once across all calls; past it a slow call waits for its attempt
+max_hedges_in_flight = 8
+# Seconds before the first retry of a failed call, doubled for each further failure and
+# jittered by +/-50% so callers failing together do not retry together
+retry_backoff_seconds = 0.2
+
+# Seconds a streamed answer may take to its first token, and in total
+stream_first_token_seconds = 10.0
+stream_total_seconds = 60.0
+
+# Consecutive failed attempts that open the breaker, and seconds it stays open
+breaker_failure_threshold = 5
+breaker_cooldown_seconds = 30.0
+
+# Time source of deadlines and the breaker cooldown; tests replace it
+clock = time.monotonic
+
+# Transport errors of the OpenAI, httpx and requests clients, matched by class name so
+# none of them has to be imported here
+transient_error_names = {"APIConnectionError", "APITimeoutError", "TimeoutException", "NetworkError",
+                         "RemoteProtocolError", "ConnectionError", "Timeout"}
+
+class DeadlineExceeded(TimeoutError):
+    pass
+
+class CircuitOpenError(RuntimeError):
+    pass
+
+def is_retryable(error):
+    """
+    Whether a failed attempt is worth retrying and counts against the upstream's health:
+    timeouts, connection errors and 5xx responses. 4xx responses (bad request, auth, rate
+    limit) and other errors would fail the same way again.
+    """
+    if isinstance(error, (TimeoutError, ConnectionError)):
+        return True
+    status = getattr(error, "status_code", None) or getattr(getattr(error, "response", None), "status_code", None)
+    if isinstance(status, int):
+        return status >= 500
+    return any(cls.__name__ in transient_error_names for cls in type(error).__mro__)
+
+class Deadline:
+    def __init__(self, seconds):
+        self.seconds = seconds
+        self.expires_at = clock() + seconds
+
+    def remaining(self):
+        return max(self.expires_at - clock(), 0.0)
+
+    def expired(self):
+        return self.remaining() <= 0
+
+_deadline = contextvars.ContextVar("deadline", default=None)
+
+def current_deadline():
+    return _deadline.get()
+
+@contextlib.contextmanager
+def deadline(seconds=None):
+    """
+    Runs the block under a fresh request deadline (request_deadline_seconds by default).
+    """
+    token = _deadline.set(Deadline(request_deadline_seconds if seconds is None else seconds))
+    try:
+        yield _deadline.get()
+    finally:
+        _deadline.reset(token)
+
+@contextlib.contextmanager
+def stage(name):
+    """
+    Narrows the current deadline to the stage's share of the remaining time.
+    """
+    parent = _deadline.get() or Deadline(request_deadline_seconds)
+    token = _deadline.set(Deadline(parent.remaining() * min(stage_shares.get(name, 1.0), 1.0)))
+    try:
+        yield _deadline.get()
+    finally:
+        _deadline.reset(token)
+
+class LatencyTracker:
+    """
+    Recent successful latencies of one kind of call, for the hedge delay.
+    """
+
+    def __init__(self, window=None):
+        self._samples = deque(maxlen=window or latency_window)
+        self._lock = threading.Lock()
+
+    def add(self, seconds):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, p):
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples:
+            return None
+        return samples[min(int(len(samples) * p / 100), len(samples) - 1)]
+
+    def hedge_delay(self):
+        with self._lock:
+            count = len(self._samples)
+        if count < hedge_min_samples:
+            return hedge_default_delay
+        return max(self.percentile(hedge_percentile), hedge_min_delay)
+
+class CircuitBreaker:
+    """
+    Closed until `failure_threshold` consecutive failures, then open (calls fail fast)
+    for `cooldown` seconds, then half open: one trial call decides whether it closes again.
+    """
+
+    def __init__(self, failure_threshold=None, cooldown=None):
+        self.failure_threshold = failure_threshold or breaker_failure_threshold
+        self.cooldown = breaker_cooldown_seconds if cooldown is None else cooldown
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = None
+        self.rejected = 0
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        with self._lock:
+            if self.state == "open" and clock() - self.opened_at >= self.cooldown:
+                self.state = "half_open"
+            if self.state == "open" or (self.state == "half_open" and self._trial_running):
+                self.rejected += 1
+                raise CircuitOpenError(f"LLM circuit open after {self.failures} consecutive failures")
+            if self.state == "half_open":
+                self._trial_running = True
+
+    def record_success(self):
+        with self._lock:
+            self.state = "closed"
+            self.failures = 0
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial_running = False
+            if self.state == "half_open" or self.failures >= self.failure_threshold:
+                if self.state != "open":
+                    print(f"🔌 LLM circuit opened after {self.failures} consecutive failures.")
+                self.state = "open"
+                self.opened_at = clock()
+
+    def record_client_error(self):
+        """
+        Ends a call the upstream answered but refused (see is_retryable): neither a
+        failure nor a sign of recovery, but a half-open trial is over.
+        """
+        with self._lock:
+            self._trial_running = False
+
+    def reset(self):
+        with self._lock:
+            self.state = "closed"
+            self.failures = 0
+            self.opened_at = None
+            self.rejected = 0
+            self._trial_running = False
+
+llm_breaker = CircuitBreaker()
+latency_trackers = {}
+_trackers_lock = threading.Lock()
+# Attempts run here so a hedge can start while the first attempt is still waiting
+_executor = ThreadPoolExecutor(max_workers=32, thread_name_prefix="llm-attempt")
+_hedges_lock = threading.Lock()
+_hedges_in_flight = 0
+
+def tracker(name):
+    with _trackers_lock:
+        return latency_trackers.setdefault(name, LatencyTracker())
+
+def _start_hedge():
+    # Takes a hedge slot, or returns False when all max_hedges_in_flight are taken
+    global _hedges_in_flight
+    with _hedges_lock:
+        if _hedges_in_flight >= max_hedges_in_flight:
+            return False
+        _hedges_in_flight += 1
+        return True
+
+def _end_hedge():
+    global _hedges_in_flight
+    with _hedges_lock:
+        _hedges_in_flight -= 1
+
+def _timed(fn, args, kwargs, hedge=False):
+    start = time.perf_counter()
+    try:
+        result = fn(*args, **kwargs)
+    finally:
+        # A losing hedge keeps its slot until its thread is actually done
+        if hedge:
+            _end_hedge()
+    return result, time.perf_counter() - start
+
+def _backoff(failures, budget):
+    # Seconds to wait before retrying after `failures` failed attempts, within the budget
+    delay = retry_backoff_seconds * 2 ** (failures - 1) * random.uniform(0.5, 1.5)
+    return max(0.0, min(delay, budget.remaining()))
+
+def _attempt_failed(breaker, error, name):
+    # Records a failed attempt; returns whether to go on with the remaining attempts
+    tracing.record_error("llm_attempt", error, call=name)
+    if is_retryable(error):
+        breaker.record_failure()
+        return True
+    breaker.record_client_error()
+    return False
+
+def call_llm(fn, *args, name="generation", breaker=None, **kwargs):
+    """
+    Calls `fn(*args, **kwargs)` within the current deadline, hedging and retrying as
+    configured. Raises CircuitOpenError without calling when the breaker is open,
+    DeadlineExceeded when no attempt answered in time, or the last attempt's error.
+    """
+    breaker = breaker or llm_breaker
+    latencies = tracker(name)
+    budget = current_deadline() or Deadline(request_deadline_seconds)
+    if budget.expired():
+        raise DeadlineExceeded(f"No time left for {name}")
+    breaker.before_call()
+
+    with tracing.span("llm_call", call=name) as call:
+        pending, attempts, failures, last_error = set(), 0, 0, None
+        while True:
+            call.set(attempts=attempts, hedged=attempts > 1)
+            if not pending and attempts >= max_attempts:
+                raise last_error
+            if not pending and failures:
+                # Every attempt so far failed: back off before retrying
+                time.sleep(_backoff(failures, budget))
+            if budget.expired():
+                if pending:
+                    breaker.record_failure()
+                raise DeadlineExceeded(f"{name} did not answer within its {budget.seconds:.1f}s budget")
+            # A second attempt alongside a running one is a hedge and needs a free slot
+            hedge = bool(pending)
+            if attempts < max_attempts and (not hedge or _start_hedge()):
+                context = contextvars.copy_context()
+                pending.add(_executor.submit(context.run, _timed, fn, args, kwargs, hedge))
+                attempts += 1
+            done, pending = wait(pending, timeout=min(latencies.hedge_delay(), budget.remaining()),
+                                 return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    result, seconds = future.result()
+                except Exception as error:
+                    if not _attempt_failed(breaker, error, name):
+                        raise
+                    failures += 1
+                    last_error = error
+                    continue
+                breaker.record_success()
+                latencies.add(seconds)
+                call.set(attempts=attempts, hedged=attempts > 1)
+                return result
+
+async def acall_llm(coroutine_fn, *args, name="generation", breaker=None, **kwargs):
+    """
+    Async counterpart of call_llm for `await coroutine_fn(*args, **kwargs)`.
+    """
+    breaker = breaker or llm_breaker
+    latencies = tracker(name)
+    budget = current_deadline() or Deadline(request_deadline_seconds)
+    if budget.expired():
+        raise DeadlineExceeded(f"No time left for {name}")
+    breaker.before_call()
+
+    async def attempt(hedge):
+        start = time.perf_counter()
+        try:
+            result = await coroutine_fn(*args, **kwargs)
+        finally:
+            if hedge:
+                _end_hedge()
+        return result, time.perf_counter() - start
+
+    pending, attempts, failures, last_error = set(), 0, 0, None
+    try:
+        while True:
+            if not pending and attempts >= max_attempts:
+                raise last_error
+            if not pending and failures:
+                await asyncio.sleep(_backoff(failures, budget))
+            if budget.expired():
+                if pending:
+                    breaker.record_failure()
+                raise DeadlineExceeded(f"{name} did not answer within its {budget.seconds:.1f}s budget")
+            hedge = bool(pending)
+            if attempts < max_attempts and (not hedge or _start_hedge()):
+                pending.add(asyncio.ensure_future(attempt(hedge)))
+                attempts += 1
+            done, pending = await asyncio.wait(pending, timeout=min(latencies.hedge_delay(), budget.remaining()),
+                                               return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                try:
+                    result, seconds = task.result()
+                except Exception as error:
+                    if not _attempt_failed(breaker, error, name):
+                        raise
+                    failures += 1
+                    last_error = error
+                    continue
+                breaker.record_success()
+                latencies.add(seconds)
+                return result
+    finally:
+        # Unlike threads, losing attempts can be cancelled
+        for task in pending:
+            task.cancel()
+
+_stream_end = object()
+
+def stream_llm(fn, *args, first_token_seconds=None, total_seconds=None, **kwargs):
+    """
+    Yields the chunks of the stream `fn(*args, **kwargs)`, read on a background thread.
+    Raises DeadlineExceeded when no chunk with content arrived within first_token_seconds,
+    or the stream is not finished within total_seconds (stream_first_token_seconds and
+    stream_total_seconds by default). The upstream stream is closed once the caller stops
+    reading, at the latest with its next chunk.
+    """
+    first_token_seconds = stream_first_token_seconds if first_token_seconds is None else first_token_seconds
+    total_seconds = stream_total_seconds if total_seconds is None else total_seconds
+    chunks, stopped = queue.Queue(), threading.Event()
+
+    def read():
+        stream = None
+        try:
+            stream = fn(*args, **kwargs)
+            for chunk in stream:
+                if stopped.is_set():
+                    break
+                chunks.put((chunk, None))
+            chunks.put((_stream_end, None))
+        except Exception as error:
+            chunks.put((_stream_end, error))
+        finally:
+            if hasattr(stream, "close"):
+                stream.close()
+
+    context = contextvars.copy_context()
+    threading.Thread(target=context.run, args=(read,), daemon=True, name="llm-stream").start()
+    start, first_token = clock(), True
+    try:
+        while True:
+            elapsed = clock() - start
+            limit = min(first_token_seconds, total_seconds) if first_token else total_seconds
+            try:
+                chunk, error = chunks.get(timeout=max(limit - elapsed, 0.0))
+            except queue.Empty:
+                what = "first token" if first_token else "stream"
+                raise DeadlineExceeded(f"LLM {what} took longer than {limit:.1f}s") from None
+            if chunk is _stream_end:
+                if error is not None:
+                    raise error
+                return
+            if getattr(chunk, "content", chunk):
+                first_token = False
+            yield chunk
+    finally:
+        stopped.set()
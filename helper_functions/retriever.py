@@ -1,21 +1,259 @@
+import os
+import threading
+from collections import OrderedDict
 from langchain_chroma import Chroma
+from langchain_core.retrievers import BaseRetriever
 from langchain.retrievers.multi_query import MultiQueryRetriever
-from langchain_openai import ChatOpenAI
-from helper_functions.vectorstore import embedding, persist_directory
+from helper_functions import clients, resilience, vectorstore, tracing
+from helper_functions.bm25_index import BM25Index, reciprocal_rank_fusion
+from helper_functions.grant_detector import normalize_question
+from helper_functions.numpy_index import NumpyRetriever, NumpyVectorIndex
+from helper_functions.vector_codes import vector_codes_dirname
+from helper_functions.single_flight import SingleFlight
 
-# Load the LLM used for multi-query expansion
-llm = ChatOpenAI(model="gpt-4o-mini", temperature=0)
+# Max number of ready-made retrievers kept per index version (one per grant filter)
+retriever_pool_size = 32
 
-def get_retriever(grant_filter=None):
+# Skip the multi-query LLM call when a grant was detected or the first pass is confident
+expansion_fast_path = True
+# Chroma relevance score (0..1) of the best first-pass hit that counts as confident
+fast_path_min_score = 0.6
+# Max number of (question, grant filter) pairs whose expanded variants are remembered
+expansion_cache_size = 512
+
+# Fuse BM25 results with MMR results when a lexical index has been built
+hybrid_retrieval = True
+
+# Dense search backend: "numpy" searches an in-memory copy of the collection's vectors,
+# "chroma" queries the persisted collection
+vector_backend = os.getenv("EURUS_VECTOR_BACKEND", "numpy")
+# Compact vectors for the numpy backend: "int8" or "binary" memory-maps the index's
+# vector codes and re-ranks a shortlist exactly; "none" holds every float32 vector in memory
+vector_quantization = os.getenv("EURUS_VECTOR_QUANTIZATION", "none")
+
+# Section-filtered searches with fewer hits than this are topped up from the whole page
+# (indexes built before chunks carried a section label return none)
+section_min_docs = 3
+
+class QueryExpansionCache:
     """
-    Returns a retriever with optional grant-specific filtering.
-    Uses MultiQueryRetriever to expand the query semantically.
+    Thread-safe LRU cache of LLM-generated query variants keyed on the normalized
+    question and the grant filter.
+    """
+
+    def __init__(self, max_entries=expansion_cache_size):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def get(self, question, filter_key):
+        key = (normalize_question(question), filter_key)
+        with self._lock:
+            variants = self._entries.get(key)
+            if variants is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return list(variants)
+
+    def put(self, question, filter_key, variants):
+        key = (normalize_question(question), filter_key)
+        with self._lock:
+            self._entries[key] = list(variants)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+expansion_cache = QueryExpansionCache()
+# Concurrent expansions of the same question and grant filter share one LLM call
+expansion_flight = SingleFlight("expansion")
+
+def batch_search(retriever, queries, config=None):
+    """
+    Results of `retriever` for each query: one batched search when the retriever
+    supports it, otherwise one invoke per query.
+    """
+    search = getattr(retriever, "batch_search", None)
+    if search is not None:
+        return search(queries)
+    return [retriever.invoke(query, config=config) for query in queries]
+
+class ExpandingRetriever(MultiQueryRetriever):
+    """
+    MultiQueryRetriever that avoids the expansion LLM call where it can.
+
+    The fast path returns the first-pass MMR results directly when the retriever is
+    already narrowed to a detected grant, or when the best first-pass hit scores at least
+    `min_score`. Otherwise the question is expanded, with variants served from
+    `expansion_cache` when the same question was expanded before, or shared with an
+    identical expansion already in flight. The expansion call is hedged within the
+    retrieval stage's deadline; if it fails or runs out of time, only the question itself
+    is searched.
+    """
+
+    filter_key: tuple | None = None
+    fast_path: bool = True
+    min_score: float = 0.6
+    cache: QueryExpansionCache | None = None
+
+    def _is_confident(self, query):
+        search_kwargs = self.retriever.search_kwargs
+        with tracing.span("confidence_check") as check:
+            scored = self.retriever.vectorstore.similarity_search_with_relevance_scores(
+                query, k=1, filter=search_kwargs.get("filter")
+            )
+            confident = bool(scored) and scored[0][1] >= self.min_score
+            check.set(confident=confident)
+        return confident
+
+    def generate_queries(self, question, run_manager):
+        with tracing.span("query_expansion") as expansion:
+            if self.cache is not None:
+                variants = self.cache.get(question, self.filter_key)
+                if variants is not None:
+                    expansion.set(cached=True, variants=len(variants))
+                    return variants
+            generate = super().generate_queries
+            try:
+                variants, shared = expansion_flight.do(
+                    (normalize_question(question), self.filter_key),
+                    lambda: resilience.call_llm(generate, question, run_manager, name="expansion")
+                )
+            except Exception as error:
+                expansion.record_error(error)
+                expansion.set(degraded=True)
+                return [question]
+            if self.cache is not None and not shared:
+                self.cache.put(question, self.filter_key, variants)
+            expansion.set(cached=False, coalesced=shared, variants=len(variants))
+            return list(variants)
+
+    def retrieve_documents(self, queries, run_manager):
+        with tracing.span("vector_search", queries=len(queries)):
+            results = batch_search(self.retriever, queries, config={"callbacks": run_manager.get_child()})
+            return [doc for docs in results for doc in docs]
+
+    def _get_relevant_documents(self, query, *, run_manager):
+        if self.fast_path and (self.filter_key or self._is_confident(query)):
+            with tracing.span("vector_search", queries=1, fast_path=True):
+                return self.retriever.invoke(query, config={"callbacks": run_manager.get_child()})
+        return super()._get_relevant_documents(query, run_manager=run_manager)
+
+class HybridRetriever(BaseRetriever):
+    """
+    Fuses dense MMR results with BM25 results using reciprocal rank fusion.
+    Exact acronyms and codes ("PSG-JR", "P00003120") are found by the lexical side.
+    The grant and section filters of the vector retriever are applied to the lexical side as well.
+    """
+
+    vector_retriever: BaseRetriever
+    lexical_index: BM25Index
+    grant_titles: tuple | None = None
+    section: str | None = None
+    k: int = 7
+    rrf_k: int = 60
+
+    @property
+    def vectorstore(self):
+        return self.vector_retriever.vectorstore
+
+    @property
+    def search_kwargs(self):
+        return self.vector_retriever.search_kwargs
+
+    def _fuse(self, query, dense):
+        with tracing.span("lexical_search"):
+            lexical = [doc for doc, _ in self.lexical_index.search(
+                query, k=self.k, grant_titles=self.grant_titles, sections=(self.section,) if self.section else None
+            )]
+        return reciprocal_rank_fusion([dense, lexical], k=self.k, rrf_k=self.rrf_k)
+
+    def batch_search(self, queries):
+        dense = batch_search(self.vector_retriever, queries)
+        return [self._fuse(query, docs) for query, docs in zip(queries, dense)]
+
+    def _get_relevant_documents(self, query, *, run_manager):
+        dense = self.vector_retriever.invoke(query, config={"callbacks": run_manager.get_child()})
+        return self._fuse(query, dense)
+
+class SectionRetriever(BaseRetriever):
+    """
+    Searches only the chunks of one page section ("eligibility", "application") and tops
+    the results up from the unfiltered retriever when the section yields fewer than
+    `min_docs` chunks. Confidence checks see the unfiltered retriever.
+    """
+
+    section_retriever: BaseRetriever
+    retriever: BaseRetriever
+    section: str
+    k: int = 7
+    min_docs: int = 3
+
+    @property
+    def vectorstore(self):
+        return self.retriever.vectorstore
+
+    @property
+    def search_kwargs(self):
+        return self.retriever.search_kwargs
+
+    def _top_up(self, docs, fallback):
+        seen = {(doc.metadata.get("source"), doc.page_content) for doc in docs}
+        for doc in fallback:
+            if len(docs) >= self.k:
+                break
+            if (doc.metadata.get("source"), doc.page_content) not in seen:
+                docs.append(doc)
+        return docs
+
+    def batch_search(self, queries):
+        with tracing.span("section_search", section=self.section, queries=len(queries)) as search:
+            results = batch_search(self.section_retriever, queries)
+            short = [i for i, docs in enumerate(results) if len(docs) < self.min_docs]
+            search.set(topped_up=len(short))
+        if short:
+            fallbacks = batch_search(self.retriever, [queries[i] for i in short])
+            for i, fallback in zip(short, fallbacks):
+                self._top_up(results[i], fallback)
+        return results
+
+    def _get_relevant_documents(self, query, *, run_manager):
+        config = {"callbacks": run_manager.get_child()}
+        with tracing.span("section_search", section=self.section) as search:
+            docs = self.section_retriever.invoke(query, config=config)
+            search.set(hits=len(docs), topped_up=len(docs) < self.min_docs)
+        if len(docs) >= self.min_docs:
+            return docs
+        return self._top_up(docs, self.retriever.invoke(query, config=config))
+
+# Process-wide store handle and retriever pool, shared by all Streamlit sessions
+_pool_lock = threading.Lock()
+_store = None
+_store_version = None
+_lexical_index = None
+_vector_index = None
+_retriever_pool = OrderedDict()
+
+def _filter_key(grant_filter):
+    """
+    Normalizes a grant filter into a hashable pool key. None means "no filter".
     """
-    db = Chroma(
-        persist_directory=persist_directory,
-        embedding_function=embedding
-    )
+    if isinstance(grant_filter, list) and grant_filter:
+        return tuple(sorted(set(grant_filter)))
+    elif isinstance(grant_filter, str) and grant_filter.strip():
+        return (grant_filter,)
+    return None
 
+def _build_search_kwargs(key, section=None):
     # Base retrieval setup
     search_kwargs = {
         "k": 7,
@@ -23,24 +261,174 @@ def get_retriever(grant_filter=None):
     }
 
     # Apply metadata filter if provided
-    if isinstance(grant_filter, list) and grant_filter:
+    if key and len(key) > 1:
         # Apply OR logic for multiple grant titles
         search_kwargs["filter"] = {
-            "$or": [{"grant_title": title} for title in grant_filter]
+            "$or": [{"grant_title": title} for title in key]
         }
-    elif isinstance(grant_filter, str) and grant_filter.strip():
+    elif key:
         # Single string case
-        search_kwargs["filter"] = {"grant_title": grant_filter}
+        search_kwargs["filter"] = {"grant_title": key[0]}
+
+    # Narrow to one page section, combined with the grant filter
+    if section:
+        if "filter" in search_kwargs:
+            search_kwargs["filter"] = {"$and": [search_kwargs["filter"], {"section": section}]}
+        else:
+            search_kwargs["filter"] = {"section": section}
+
+    return search_kwargs
+
+def _sync_with_index_version():
+    """
+    Drops the shared store and every pooled retriever when a refresh has published a
+    new index version, and returns the published version. Must be called with _pool_lock held.
+    """
+    global _store, _store_version, _lexical_index, _vector_index
+    version = vectorstore.get_index_version()
+    if _store is not None and version != _store_version:
+        _store = None
+        _lexical_index = None
+        _vector_index = None
+        _retriever_pool.clear()
+    _store_version = version
+    return version
+
+def get_vectorstore():
+    """
+    Returns the long-lived Chroma handle for the published index, opening it on first use.
+    """
+    global _store, _lexical_index
+    with _pool_lock:
+        version = _sync_with_index_version()
+        if _store is None:
+            index_directory = vectorstore.get_index_directory(version)
+            _store = Chroma(
+                persist_directory=index_directory,
+                embedding_function=clients.get_embedding()
+            )
+            _lexical_index = BM25Index.load(
+                os.path.join(index_directory, vectorstore.lexical_index_filename)
+            )
+        return _store
+
+def get_lexical_index():
+    """
+    Returns the BM25 index published with the current store, or None if none was built.
+    """
+    get_vectorstore()
+    return _lexical_index
+
+def _load_vector_index(db, version):
+    if vector_quantization != "none":
+        directory = os.path.join(vectorstore.get_index_directory(version), vector_codes_dirname)
+        index = NumpyVectorIndex.from_codes(db, directory, vector_quantization)
+        if index is not None:
+            return index
+        print(f"⚠️ No {vector_quantization} vector codes for index version {version}; using full-precision vectors.")
+    return NumpyVectorIndex.from_chroma(db)
+
+def get_vector_index():
+    """
+    Returns the NumPy index over the current store's vectors, loading it on first use.
+    """
+    global _vector_index
+    db = get_vectorstore()
+    with _pool_lock:
+        if _vector_index is None and _store is db:
+            with tracing.span("vector_index_load", quantization=vector_quantization) as load:
+                _vector_index = _load_vector_index(db, _store_version)
+                load.set(chunks=len(_vector_index))
+        return _vector_index if _store is db else _load_vector_index(db, _store_version)
+
+def invalidate_retrievers():
+    """
+    Forgets the shared store and all pooled retrievers. The next call reopens the index.
+    """
+    global _store, _store_version, _lexical_index, _vector_index
+    with _pool_lock:
+        _store = None
+        _store_version = None
+        _lexical_index = None
+        _vector_index = None
+        _retriever_pool.clear()
+
+def _first_pass_retriever(db, key, section=None):
+    search_kwargs = _build_search_kwargs(key, section)
+    if vector_backend == "numpy":
+        retriever = NumpyRetriever(
+            vectorstore=get_vector_index(),
+            search_type="mmr",
+            search_kwargs=search_kwargs
+        )
+    else:
+        retriever = db.as_retriever(
+            search_type="mmr",
+            search_kwargs=search_kwargs
+        )
+
+    # Hybrid lexical + dense first pass
+    lexical_index = get_lexical_index()
+    if hybrid_retrieval and lexical_index is not None:
+        retriever = HybridRetriever(
+            vector_retriever=retriever,
+            lexical_index=lexical_index,
+            grant_titles=key,
+            section=section,
+            k=search_kwargs["k"]
+        )
+    return retriever
+
+def get_retriever(grant_filter=None, section=None):
+    """
+    Returns a retriever with optional grant-specific filtering.
+    Uses MultiQueryRetriever to expand the query semantically, unless the fast path applies.
+    Each search fuses MMR with BM25 results when a lexical index has been built; with the
+    "numpy" backend, MMR runs on the in-memory index and expanded variants are searched in one batch.
+    With a section ("eligibility", "application"), chunks of that section are searched first.
+    Retrievers are pooled per grant filter and section and reused until the index version changes.
+    """
+    key = _filter_key(grant_filter)
+    pool_key = (key, section)
+    with tracing.span("retriever_construction", grant_filter=grant_filter, section=section) as construction:
+        db = get_vectorstore()
+
+        with _pool_lock:
+            pooled = _retriever_pool.get(pool_key)
+            if pooled is not None and pooled[0] is db:
+                _retriever_pool.move_to_end(pool_key)
+                construction.set(pooled=True)
+                return pooled[1]
+
+        retriever = _first_pass_retriever(db, key)
+        if section:
+            retriever = SectionRetriever(
+                section_retriever=_first_pass_retriever(db, key, section),
+                retriever=retriever,
+                section=section,
+                k=retriever.search_kwargs["k"],
+                min_docs=section_min_docs
+            )
 
-    retriever = db.as_retriever(
-        search_type="mmr",
-        search_kwargs=search_kwargs
-    )
+        # Multi-query expansion, skipped on the fast path
+        multi_retriever = ExpandingRetriever.from_llm(
+            retriever=retriever,
+            llm=clients.get_llm()
+        )
+        multi_retriever.filter_key = key
+        multi_retriever.fast_path = expansion_fast_path
+        multi_retriever.min_score = fast_path_min_score
+        multi_retriever.cache = expansion_cache
+        construction.set(pooled=False)
 
-    # Multi-query expansion
-    multi_retriever = MultiQueryRetriever.from_llm(
-        retriever=retriever,
-        llm=llm
-    )
+        with _pool_lock:
+            # Another session may have built the same retriever meanwhile; keep the first
+            pooled = _retriever_pool.get(pool_key)
+            if pooled is not None and pooled[0] is db:
+                return pooled[1]
+            if _store is db:
+                _retriever_pool[pool_key] = (db, multi_retriever)
+                while len(_retriever_pool) > retriever_pool_size:
+                    _retriever_pool.popitem(last=False)
 
-    return multi_retriever
\ No newline at end of file
+        return multi_retriever
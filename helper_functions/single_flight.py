@@ -0,0 +1,115 @@
+"""
+Single-flight coalescing of identical in-flight work.
+
+When many sessions ask the same question within a few seconds, only the first caller
+for a key (the leader) runs the computation; callers arriving while it is in flight
+wait for the same result instead of repeating the expansion, embedding and completion
+calls. An exception raised by the computation is raised to every waiter. Each caller
+waits at most its own timeout; a caller that gives up does not cancel the computation,
+which still completes for the others (and fills any cache behind it). Keys are forgotten
+as soon as the computation finishes, so later callers start a fresh one.
+"""
+import asyncio
+import threading
+import contextvars
+import weakref
+from concurrent.futures import Future
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls with the same key across threads.
+    """
+
+    def __init__(self, name=""):
+        self.name = name
+        self.leaders = 0
+        self.followers = 0
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def _forget(self, key, future):
+        with self._lock:
+            if self._calls.get(key) is future:
+                del self._calls[key]
+
+    def _run(self, key, future, fn):
+        try:
+            result = fn()
+        except BaseException as error:
+            self._forget(key, future)
+            future.set_exception(error)
+        else:
+            self._forget(key, future)
+            future.set_result(result)
+
+    def do(self, key, fn, timeout=None):
+        """
+        Returns (fn()'s result, whether it was shared with an earlier caller). Waits at
+        most `timeout` seconds, then raises TimeoutError. With a timeout the leader runs
+        `fn` on a worker thread so that it, too, can stop waiting.
+        """
+        with self._lock:
+            future = self._calls.get(key)
+            shared = future is not None
+            if shared:
+                self.followers += 1
+            else:
+                future = self._calls[key] = Future()
+                self.leaders += 1
+        if not shared:
+            if timeout is None:
+                self._run(key, future, fn)
+            else:
+                context = contextvars.copy_context()
+                threading.Thread(target=context.run, args=(self._run, key, future, fn),
+                                 name=f"single-flight-{self.name}", daemon=True).start()
+        return future.result(timeout), shared
+
+    def in_flight(self):
+        with self._lock:
+            return len(self._calls)
+
+    def stats(self):
+        total = self.leaders + self.followers
+        return {"leaders": self.leaders, "followers": self.followers,
+                "coalesced_rate": self.followers / total if total else 0.0}
+
+class AsyncSingleFlight:
+    """
+    Coalesces concurrent awaits with the same key on one event loop.
+    """
+
+    def __init__(self, name=""):
+        self.name = name
+        self.leaders = 0
+        self.followers = 0
+        # asyncio tasks belong to one event loop, so keep the in-flight calls per loop
+        self._calls = weakref.WeakKeyDictionary()
+
+    async def do(self, key, coroutine_fn, timeout=None):
+        """
+        Awaits the shared task for `key`, starting `coroutine_fn()` when there is none.
+        Returns (result, shared). A caller's timeout or cancellation leaves the task running.
+        """
+        calls = self._calls.setdefault(asyncio.get_running_loop(), {})
+        task = calls.get(key)
+        shared = task is not None
+        if shared:
+            self.followers += 1
+        else:
+            self.leaders += 1
+            task = calls[key] = asyncio.ensure_future(coroutine_fn())
+
+            def forget(done):
+                if calls.get(key) is done:
+                    del calls[key]
+                if not done.cancelled():
+                    # Mark the exception retrieved even if every waiter gave up
+                    done.exception()
+            task.add_done_callback(forget)
+        return await asyncio.wait_for(asyncio.shield(task), timeout), shared
+
+    def stats(self):
+        total = self.leaders + self.followers
+        return {"leaders": self.leaders, "followers": self.followers,
+                "coalesced_rate": self.followers / total if total else 0.0}
@@ -0,0 +1,99 @@
+import re
+import zlib
+import time
+
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+from helper_functions import qa_chain
+from helper_functions.answer_cache import AnswerCache
+from helper_functions.embedding_cache import CachedEmbeddings
+
+STOPWORDS = {"what", "is", "the", "a", "about", "tell", "me", "please"}
+
+class BagOfWordsEmbeddings(Embeddings):
+    """Offline embedder: questions sharing content words get similar vectors."""
+
+    def embed_query(self, text):
+        vector = [0.0] * 64
+        for word in re.findall(r"[a-z0-9]+", text.lower()):
+            if word not in STOPWORDS:
+                vector[zlib.crc32(word.encode()) % 64] += 1.0
+        return vector
+
+    def embed_documents(self, texts):
+        return [self.embed_query(t) for t in texts]
+
+def test_exact_and_semantic_hits_within_grant():
+    cache = AnswerCache(BagOfWordsEmbeddings(), version_fn=lambda: "v1")
+    cache.put("What is PSG?", "Productivity Solutions Grant", "PSG answer", compute_time=2.0)
+
+    assert cache.get("what is psg", "Productivity Solutions Grant") == "PSG answer"
+    assert cache.get("Tell me about PSG please", "Productivity Solutions Grant") == "PSG answer"
+    assert cache.get("Tell me about PSG please", "Enterprise Development Grant") is None
+    assert cache.get("how to apply for psg", "Productivity Solutions Grant") is None
+    # Keys are normalized like grant detection: punctuation inside a name does not matter
+    cache.put("Who is eligible for CCP-HC?", "Career Conversion Programme for Security Officers", "CCP answer")
+    assert cache.get("who is eligible for ccp hc", "Career Conversion Programme for Security Officers") == "CCP answer"
+
+    metrics = cache.metrics()
+    assert (metrics["exact_hits"], metrics["semantic_hits"], metrics["misses"]) == (2, 1, 2)
+    assert metrics["hit_rate"] == 0.6
+    assert metrics["latency_saved_seconds"] == 4.0
+
+def test_ttl_lru_and_index_version_invalidation():
+    version = ["v1"]
+    cache = AnswerCache(max_entries=2, ttl_seconds=0.05, version_fn=lambda: version[0])
+    cache.put("a", None, "A")
+    cache.put("b", None, "B")
+    cache.get("a")
+    cache.put("c", None, "C")
+    assert cache.get("b") is None
+    assert cache.get("a") == "A"
+
+    version[0] = "v2"
+    assert cache.get("a") is None
+
+    cache.put("d", None, "D")
+    time.sleep(0.06)
+    assert cache.get("d") is None
+
+def test_get_final_response_serves_repeats_from_cache(monkeypatch):
+    calls = []
+
+    def fake_chain(inputs, callbacks=None):
+        calls.append(inputs["query"])
+        return {
+            "result": "Grant Description:\nPSG supports digital adoption.",
+            "source_documents": [Document(page_content="...", metadata={"source": "https://psg"})],
+        }
+
+    cache = AnswerCache(BagOfWordsEmbeddings(), version_fn=lambda: "v1")
+    monkeypatch.setattr(qa_chain, "answer_cache", cache)
+    monkeypatch.setattr(qa_chain, "build_qa_chain", lambda question: fake_chain)
+
+    first = qa_chain.get_final_response("What is PSG?")
+    assert qa_chain.get_final_response("what is psg") == first
+    assert qa_chain.get_final_response("Tell me about PSG") == first
+    assert calls == ["What is PSG?"]
+    assert cache.metrics()["hit_rate"] == 2 / 3
+
+def test_a_miss_shares_its_embedding_with_retrieval(tmp_path):
+    upstream = []
+
+    class CountingEmbeddings(BagOfWordsEmbeddings):
+        def embed_query(self, text):
+            upstream.append(text)
+            return super().embed_query(text)
+
+    embedding = CachedEmbeddings(CountingEmbeddings(), cache_dir=str(tmp_path))
+    cache = AnswerCache(embedding, version_fn=lambda: "v1")
+    cache.put("What is PSG?", "Productivity Solutions Grant", "PSG answer")
+
+    question = "How do I apply for PSG?"
+    assert cache.get(question, "Productivity Solutions Grant") is None
+    # The retriever embeds the question as asked, then the answer is cached under it
+    embedding.embed_query(question)
+    cache.put(question, "Productivity Solutions Grant", "How to apply")
+
+    assert upstream == ["What is PSG?", question]
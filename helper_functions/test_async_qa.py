@@ -0,0 +1,117 @@
+import time
+import asyncio
+
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.messages import AIMessage
+from langchain_core.retrievers import BaseRetriever
+from langchain_core.runnables import RunnableLambda
+
+from helper_functions import async_qa, clients, qa_chain
+from helper_functions.answer_cache import AnswerCache
+from helper_functions.retriever import ExpandingRetriever, QueryExpansionCache
+
+EMBED_LATENCY = 0.01
+SEARCH_LATENCY = 0.005
+LLM_LATENCY = 0.05
+
+class _StubCounters:
+    def __init__(self):
+        self.active = 0
+        self.max_active = 0
+        self.calls = 0
+
+    async def run(self, delay, result):
+        self.calls += 1
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        try:
+            await asyncio.sleep(delay)
+            return result
+        finally:
+            self.active -= 1
+
+class StubEmbeddings(Embeddings):
+    def __init__(self, counters):
+        self.counters = counters
+
+    def embed_documents(self, texts):
+        return [[0.0] for _ in texts]
+
+    def embed_query(self, text):
+        return [0.0]
+
+    async def aembed_documents(self, texts):
+        return await self.counters.run(EMBED_LATENCY, [[0.0] for _ in texts])
+
+    async def aembed_query(self, text):
+        return await self.counters.run(EMBED_LATENCY, [0.0])
+
+class StubLLM:
+    def __init__(self, counters):
+        self.counters = counters
+
+    async def ainvoke(self, prompt):
+        return await self.counters.run(LLM_LATENCY, AIMessage(content="Grant Description:\nSupported."))
+
+class SlowSearch(BaseRetriever):
+    def _get_relevant_documents(self, query, *, run_manager):
+        time.sleep(SEARCH_LATENCY)
+        return [Document(page_content=f"About {query}", metadata={"source": "https://grant"})]
+
+def _setup(monkeypatch, expansion_calls=None):
+    counters = _StubCounters()
+
+    def expand(inputs):
+        if expansion_calls is not None:
+            expansion_calls.append(inputs["question"])
+        return ["variant one", "variant two", "variant three"]
+
+    def get_retriever(grant_filter=None, section=None):
+        return ExpandingRetriever(
+            retriever=SlowSearch(), llm_chain=RunnableLambda(expand),
+            filter_key=(grant_filter,) if grant_filter else None,
+            min_score=1.1, cache=QueryExpansionCache(),
+        )
+
+    monkeypatch.setattr(clients, "embedding", StubEmbeddings(counters))
+    monkeypatch.setattr(async_qa, "get_retriever", get_retriever)
+    monkeypatch.setattr(clients, "llm", StubLLM(counters))
+    monkeypatch.setattr(qa_chain, "answer_cache", AnswerCache(version_fn=lambda: "v1"))
+    monkeypatch.setattr(ExpandingRetriever, "_is_confident", lambda self, query: False)
+    return counters
+
+def test_question_without_grant_is_expanded_once(monkeypatch):
+    expansions = []
+    _setup(monkeypatch, expansions)
+
+    answer = asyncio.run(async_qa.aget_final_response("What support do SMEs get?"))
+
+    assert answer.startswith("Grant Description:")
+    assert expansions == ["What support do SMEs get?"]
+
+def test_semaphore_caps_upstream_calls(monkeypatch):
+    counters = _setup(monkeypatch)
+    monkeypatch.setattr(async_qa, "upstream_concurrency", 4)
+
+    questions = [f"How do I apply for psg, case {i}?" for i in range(32)]
+    answers = async_qa.batch_final_responses(questions)
+
+    assert len(answers) == 32 and all(a.startswith("Grant Description:") for a in answers)
+    assert counters.max_active <= 4
+
+def test_throughput_benchmark(monkeypatch):
+    throughput = {}
+    for concurrency in (1, 8, 64):
+        _setup(monkeypatch)
+        monkeypatch.setattr(async_qa, "upstream_concurrency", concurrency)
+        questions = [f"Tell me about the ctc grant, case {i}" for i in range(64)]
+
+        start = time.perf_counter()
+        async_qa.batch_final_responses(questions)
+        throughput[concurrency] = len(questions) / (time.perf_counter() - start)
+
+    print("\n📊 Questions/s by upstream concurrency: " +
+          ", ".join(f"{c}: {qps:.0f}" for c, qps in throughput.items()))
+    assert throughput[8] > 3 * throughput[1]
+    assert throughput[64] > throughput[8]
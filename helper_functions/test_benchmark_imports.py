@@ -0,0 +1,19 @@
+from helper_functions.benchmark_imports import check_budgets, import_budgets, measure_import, parse_importtime
+
+def test_parse_importtime_reads_the_cumulative_time():
+    stderr = ("import time: self [us] | cumulative | imported package\n"
+              "import time:       120 |        120 |   helper_functions.tracing\n"
+              "import time:      4353 |     243794 | helper_functions.qa_chain\n")
+    assert parse_importtime(stderr, "helper_functions.qa_chain") == 243.794
+    assert parse_importtime(stderr, "helper_functions.async_qa") is None
+
+def test_entry_modules_import_lazily_within_budget():
+    results = [measure_import(module, repeats=1) for module in import_budgets]
+
+    assert all(result["heavy"] == [] and not result["clients_built"] for result in results)
+    assert check_budgets(results) == []
+
+def test_budget_check_flags_heavy_imports_and_slow_modules():
+    eager = {"module": "helper_functions.qa_chain", "import_ms": 4800.0, "heavy": ["langchain_openai"],
+             "clients_built": True}
+    assert len(check_budgets([eager])) == 3
@@ -0,0 +1,27 @@
+import json
+
+from helper_functions import benchmark_retrieval, vectorstore
+
+def test_golden_set_covers_every_grant():
+    with open(benchmark_retrieval.golden_path, encoding="utf-8") as f:
+        golden = json.load(f)
+    assert {case["expected_grant"] for case in golden} == set(vectorstore.url_metadata_map.values())
+
+def test_golden_set_has_no_quality_regressions():
+    results = benchmark_retrieval.run_benchmark()
+    benchmark_retrieval.print_report(results)
+
+    with open(benchmark_retrieval.baseline_path, encoding="utf-8") as f:
+        baseline = json.load(f)
+    # Latency is machine dependent; the CLI checks it against the saved baseline
+    assert benchmark_retrieval.compare_with_baseline(results, baseline, check_latency=False) == []
+    assert vectorstore.persist_directory == "data/chroma_db"
+
+def test_regressions_are_reported():
+    baseline = {"recall@7": 0.9, "mrr": 0.8, "grant_precision": 0.9, "fallback_rate": 0.0,
+                "latency_ms": {"answer": {"p50": 1.0, "p95": 2.0, "p99": 3.0}}}
+    results = dict(baseline, mrr=0.5, fallback_rate=0.2,
+                   latency_ms={"answer": {"p50": 5.0, "p95": 50.0, "p99": 60.0}})
+
+    regressions = benchmark_retrieval.compare_with_baseline(results, baseline)
+    assert len(regressions) == 3
@@ -0,0 +1,83 @@
+import os
+import time
+
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+from helper_functions.bm25_index import BM25Index, reciprocal_rank_fusion, tokenize
+from helper_functions.retriever import HybridRetriever
+from helper_functions.text_splitter import splitter
+from helper_functions.vectorstore import url_metadata_map
+from helper_functions.web_scraper import extract_filename_from_url
+
+def _scraped_corpus():
+    chunks = []
+    for url, grant_title in url_metadata_map.items():
+        path = os.path.join("data/scraped_pages", extract_filename_from_url(url) + ".txt")
+        if not os.path.exists(path):
+            continue
+        with open(path, encoding="utf-8") as f:
+            for chunk in splitter.split_text(f.read()):
+                chunks.append(Document(page_content=chunk, metadata={"source": url, "grant_title": grant_title}))
+    return chunks
+
+CORPUS = _scraped_corpus()
+
+def test_tokenize_keeps_codes_whole_and_split():
+    assert tokenize("Apply for PSG-JR (P00003120)") == ["apply", "for", "psg-jr", "psg", "jr", "p00003120"]
+
+def test_acronym_queries_rank_matching_chunks_first():
+    index = BM25Index.from_documents(CORPUS)
+
+    top, _ = index.search("What is PSG-JR?", k=1)[0]
+    assert "PSG-JR" in top.page_content
+
+    filtered = index.search("eligibility", k=5, grant_titles=("Productivity Solutions Grant",))
+    assert filtered and all(d.metadata["grant_title"] == "Productivity Solutions Grant" for d, _ in filtered)
+
+def test_lexical_search_is_sub_millisecond():
+    index = BM25Index.from_documents(CORPUS)
+    queries = ["PSG-JR consultancy", "CCP-HC eligibility", "SFQB AETOS", "how to apply for ctc grant"]
+
+    rounds = 200
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for query in queries:
+            index.search(query, k=7)
+    per_query = (time.perf_counter() - start) / (rounds * len(queries))
+
+    print(f"\n⏱️ BM25 search over {len(index)} chunks: {per_query * 1e6:.0f}µs per query")
+    assert per_query < 0.001
+
+def test_save_and_load_round_trip(tmp_path):
+    index = BM25Index.from_documents(CORPUS[:50])
+    path = str(tmp_path / "bm25_index.json")
+    index.save(path)
+
+    loaded = BM25Index.load(path)
+    assert [d.page_content for d, _ in loaded.search("grant support")] == \
+        [d.page_content for d, _ in index.search("grant support")]
+    assert BM25Index.load(str(tmp_path / "missing.json")) is None
+
+class _FixedRetriever(BaseRetriever):
+    docs: list
+
+    def _get_relevant_documents(self, query, *, run_manager):
+        return self.docs
+
+def test_hybrid_retriever_fuses_dense_and_lexical_results():
+    code_chunk = Document(page_content="Programme ID P00003120 for security officers.",
+                          metadata={"source": "a", "grant_title": "Career Conversion Programme for Security Officers"})
+    dense_only = [Document(page_content=f"Generic grant text {i}.", metadata={"source": "b", "grant_title": "X"})
+                  for i in range(3)]
+    index = BM25Index.from_documents([code_chunk] + dense_only)
+
+    hybrid = HybridRetriever(vector_retriever=_FixedRetriever(docs=dense_only), lexical_index=index, k=3)
+    docs = hybrid.invoke("Tell me about P00003120")
+
+    assert len(docs) == 3
+    assert code_chunk in docs
+
+def test_reciprocal_rank_fusion_rewards_agreement():
+    a, b, c = (Document(page_content=t, metadata={"source": "s"}) for t in "abc")
+    assert reciprocal_rank_fusion([[a, b, c], [b, c]], k=3)[0] == b
@@ -0,0 +1,74 @@
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+from helper_functions import context_packer, tracing
+from helper_functions.context_packer import PackedContextRetriever, deduplicate, merge_neighbours, pack_context
+from helper_functions.tokens import count_tokens
+
+ELIGIBILITY = ("Eligibility\nBusiness entity registered and operating in Singapore. Company has at least "
+               "30% local equity held directly or indirectly by Singaporeans or Singapore PRs.")
+
+def _doc(text, source="https://edg", **metadata):
+    return Document(page_content=text, metadata={"source": source, **metadata})
+
+def test_exact_and_near_duplicates_keep_the_better_rank():
+    docs = [
+        _doc(ELIGIBILITY),
+        _doc(ELIGIBILITY.replace("\n", "  ")),                          # same text, other whitespace
+        _doc(ELIGIBILITY + " Apply now", source="manual_html::edg.html"),  # manual copy of the page
+        _doc("The CTC grant supports job redesign and training.", source="https://ctc"),
+    ]
+    kept, dropped = deduplicate(docs)
+
+    assert dropped == 2
+    # The longer copy replaces the one it contains, at the better rank
+    assert [doc.metadata["source"] for doc in kept] == ["manual_html::edg.html", "https://ctc"]
+
+def test_neighbouring_chunks_of_a_page_are_merged():
+    first = _doc("Eligibility\nRegistered in Singapore.", position=3, heading_path="EDG > Eligibility")
+    second = _doc("Eligibility\nAt least 30% local equity.", position=4, heading_path="EDG > Eligibility")
+    other_page = _doc("Eligibility\nUnionised workforce.", source="https://ctc", position=4,
+                      heading_path="CTC > Eligibility")
+    merged, merges = merge_neighbours([second, other_page, first])
+
+    assert merges == 1
+    assert merged[0].page_content == "Eligibility\nRegistered in Singapore.\nAt least 30% local equity."
+    assert merged[1] is other_page
+
+    # Character-overlapping chunks of the older fixed-size splitter are joined on their overlap
+    text = "The grant covers consultancy fees, software and equipment, and internal manpower costs. " * 3
+    merged, merges = merge_neighbours([_doc(text[:150]), _doc(text[100:])])
+    assert merges == 1 and merged[0].page_content == text
+
+def test_packing_respects_the_budget_and_reports_tokens_saved(monkeypatch):
+    docs = [_doc(f"Chunk {i} " + "word " * 60, source=f"https://page{i}") for i in range(10)]
+    docs.insert(3, _doc(docs[0].page_content, source="manual_html::copy.html"))
+
+    tracing.reset()
+    monkeypatch.setattr(tracing, "enabled", True)
+    packed, stats = pack_context(docs, max_tokens=300)
+
+    assert count_tokens(context_packer.chunk_separator.join(d.page_content for d in packed)) <= 300
+    assert [d.page_content.split()[1] for d in packed] == ["0", "1", "2", "3"][:len(packed)]
+    assert stats["duplicates"] == 1 and stats["chunks_in"] == 11
+    assert stats["tokens_saved"] == count_tokens("\n\n".join(d.page_content for d in docs)) - stats["context_tokens"]
+    assert [span["attributes"]["tokens_saved"] for span in tracing.recorded_spans()
+            if span["name"] == "context_packing"] == [stats["tokens_saved"]]
+    assert 'eurus_llm_tokens_total{stage="context_packing",kind="tokens_saved"}' in tracing.prometheus_text()
+    tracing.reset()
+
+def test_an_oversized_best_chunk_is_cut_to_the_budget():
+    long_doc = _doc("\n".join(f"Line {i} of a very long eligibility section" for i in range(200)))
+    packed, stats = pack_context([long_doc], max_tokens=100)
+    assert len(packed) == 1 and 0 < count_tokens(packed[0].page_content) <= 100
+    assert stats["tokens_saved"] > 0
+
+class _Fixed(BaseRetriever):
+    docs: list
+
+    def _get_relevant_documents(self, query, *, run_manager):
+        return list(self.docs)
+
+def test_packed_retriever_feeds_the_stuff_chain_packed_chunks():
+    retriever = PackedContextRetriever(retriever=_Fixed(docs=[_doc(ELIGIBILITY), _doc(ELIGIBILITY)]))
+    assert [doc.page_content for doc in retriever.invoke("Who is eligible for EDG?")] == [ELIGIBILITY]
@@ -0,0 +1,97 @@
+import hashlib
+import threading
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from helper_functions.embedding_cache import CachedEmbeddings
+
+class FakeEmbeddings(Embeddings):
+    """Deterministic offline embedder that records every text it embeds."""
+
+    def __init__(self, model="fake-embedding-model"):
+        self.model = model
+        self.calls = []
+
+    def _vector(self, text):
+        digest = hashlib.sha256(f"{self.model}:{text}".encode("utf-8")).digest()
+        return [b / 255 for b in digest[:8]]
+
+    def embed_documents(self, texts):
+        self.calls.extend(texts)
+        return [self._vector(t) for t in texts]
+
+    def embed_query(self, text):
+        self.calls.append(text)
+        return self._vector(text)
+
+def test_second_run_is_served_from_disk(tmp_path):
+    texts = ["eligibility criteria", "how to apply", "eligibility criteria"]
+
+    first = CachedEmbeddings(FakeEmbeddings(), cache_dir=str(tmp_path), max_entries=16)
+    vectors = first.embed_documents(texts)
+    assert first.embedder.calls == ["eligibility criteria", "how to apply"]
+    assert first.stats()["misses"] == 3
+
+    # A new process reopens the memory-mapped cache
+    second = CachedEmbeddings(FakeEmbeddings(), cache_dir=str(tmp_path), max_entries=16)
+    again = second.embed_documents(texts)
+    assert second.embedder.calls == []
+    assert second.stats()["hits"] == 3
+    assert np.allclose(again, vectors)
+
+    assert second.embed_query("how to apply") == again[1]
+    assert second.embedder.calls == []
+
+def test_cache_key_includes_model(tmp_path):
+    CachedEmbeddings(FakeEmbeddings("model-a"), cache_dir=str(tmp_path)).embed_query("psg")
+    other = CachedEmbeddings(FakeEmbeddings("model-b"), cache_dir=str(tmp_path))
+    other.embed_query("psg")
+    assert other.embedder.calls == ["psg"]
+    assert other.stats()["misses"] == 1
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    cache = CachedEmbeddings(FakeEmbeddings(), cache_dir=str(tmp_path), max_entries=2)
+    cache.embed_query("a")
+    cache.embed_query("b")
+    cache.embed_query("a")  # "b" is now least recently used
+    cache.embed_query("c")
+    assert len(cache) == 2
+
+    cache.embedder.calls.clear()
+    cache.embed_query("a")
+    cache.embed_query("c")
+    assert cache.embedder.calls == []
+    cache.embed_query("b")
+    assert cache.embedder.calls == ["b"]
+
+def test_instances_sharing_a_directory_never_mix_up_vectors(tmp_path):
+    # Like the server and the refresh daemon's child process, each with its own mapping
+    server = CachedEmbeddings(FakeEmbeddings(), cache_dir=str(tmp_path), max_entries=64)
+    refresh = CachedEmbeddings(FakeEmbeddings(), cache_dir=str(tmp_path), max_entries=64)
+    server.embed_query("user question")
+    refresh.embed_query("chunk about eligibility")
+
+    texts = [f"chunk {i}" for i in range(40)]
+    threads = [threading.Thread(target=cache.embed_documents, args=(texts[i::2],))
+               for i, cache in enumerate((server, refresh))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    # A different size must not truncate the shared cache
+    fresh = CachedEmbeddings(FakeEmbeddings(), cache_dir=str(tmp_path), max_entries=8)
+    expected = FakeEmbeddings()
+    for text in ["user question", "chunk about eligibility", *texts]:
+        assert np.allclose(fresh.embed_query(text), expected.embed_query(text))
+    assert fresh.embedder.calls == [] and fresh.stats()["misses"] == 0
+    assert fresh.stats()["max_entries"] == 64
+
+def test_a_slot_reused_by_another_instance_reads_as_a_miss(tmp_path):
+    first = CachedEmbeddings(FakeEmbeddings(), cache_dir=str(tmp_path), max_entries=1)
+    second = CachedEmbeddings(FakeEmbeddings(), cache_dir=str(tmp_path), max_entries=1)
+    first.embed_query("a")
+    second.embed_query("b")  # evicts "a" from the only slot
+
+    assert np.allclose(first.embed_query("a"), FakeEmbeddings().embed_query("a"))
+    assert first.embedder.calls == ["a", "a"]
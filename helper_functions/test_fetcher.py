@@ -0,0 +1,105 @@
+import time
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+from helper_functions.fetcher import ConcurrentFetcher, print_fetch_report
+
+class _GrantSiteHandler(BaseHTTPRequestHandler):
+    """Local stand-in for a grant site: slow pages, ETags and one flaky path."""
+    state = {}
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        state = self.server.state
+        with state["lock"]:
+            state["active"] += 1
+            state["max_active"] = max(state["max_active"], state["active"])
+            state["hits"][self.path] = state["hits"].get(self.path, 0) + 1
+            hits = state["hits"][self.path]
+        try:
+            time.sleep(0.1)
+            if self.path == "/flaky" and hits == 1:
+                self.send_response(503)
+                self.end_headers()
+                return
+            etag = f'"{self.path}-v1"'
+            if self.headers.get("If-None-Match") == etag:
+                self.send_response(304)
+                self.end_headers()
+                return
+            body = f"<html><body><p>Page {self.path}</p></body></html>".encode()
+            self.send_response(200)
+            self.send_header("ETag", etag)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        finally:
+            with state["lock"]:
+                state["active"] -= 1
+
+@pytest.fixture
+def grant_site():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _GrantSiteHandler)
+    server.state = {"lock": threading.Lock(), "active": 0, "max_active": 0, "hits": {}}
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+def test_concurrent_fetch_respects_host_limit_and_retries(grant_site, tmp_path):
+    base = f"http://127.0.0.1:{grant_site.server_address[1]}"
+    urls = [f"{base}/page{i}" for i in range(8)] + [f"{base}/flaky"]
+    fetcher = ConcurrentFetcher(validators_path=str(tmp_path / "validators.json"),
+                                max_workers=8, per_host_limit=4, backoff=0.01)
+
+    start = time.perf_counter()
+    results = fetcher.fetch_all(urls)
+    wall = time.perf_counter() - start
+    print_fetch_report(results, wall_time=wall)
+
+    assert all(r.ok for r in results)
+    assert grant_site.state["max_active"] <= 4
+    assert wall < sum(r.elapsed for r in results)
+    assert results[-1].attempts == 2
+    assert [r.url for r in results] == urls
+
+def test_unchanged_pages_return_not_modified(grant_site, tmp_path):
+    base = f"http://127.0.0.1:{grant_site.server_address[1]}"
+    urls = [f"{base}/page{i}" for i in range(3)]
+    validators_path = str(tmp_path / "validators.json")
+
+    first = ConcurrentFetcher(validators_path=validators_path)
+    assert all(r.ok for r in first.fetch_all(urls))
+
+    # Validators are not persisted until the caller commits the run
+    assert all(r.ok for r in ConcurrentFetcher(validators_path=validators_path).fetch_all(urls))
+    first.save_validators()
+
+    second = ConcurrentFetcher(validators_path=validators_path).fetch_all(urls)
+    assert all(r.not_modified and r.text is None for r in second)
+
+def test_request_errors_are_recorded_per_url(grant_site):
+    base = f"http://127.0.0.1:{grant_site.server_address[1]}"
+    urls = [f"{base}/page0", "grants.gov.sg/no-scheme", "http://", f"{base}/page1"]
+    results = ConcurrentFetcher(backoff=0.01).fetch_all(urls)
+    print_fetch_report(results)
+
+    assert [r.ok for r in results] == [True, False, False, True]
+    assert [r.error for r in results[1:3]] == ["MissingSchema", "InvalidURL"]
+    assert all(r.attempts == 1 and r.status is None for r in results[1:3])
+
+def test_retry_after_is_capped():
+    fetcher = ConcurrentFetcher(backoff=1, max_retry_delay=5)
+    response = requests.Response()
+    response.headers["Retry-After"] = "86400"
+
+    assert fetcher._retry_delay(0, response) == 5
+    response.headers["Retry-After"] = "2"
+    assert fetcher._retry_delay(0, response) == 2
+    assert fetcher._retry_delay(10) == 5
@@ -0,0 +1,78 @@
+import time
+
+import pytest
+
+from helper_functions.grant_detector import (
+    _detect, detect_grant_from_question, grant_intents, grant_to_keywords
+)
+
+ALIAS_CASES = [
+    (f"Tell me about {alias}", grant)
+    for grant, aliases in grant_to_keywords.items() for alias in aliases
+] + [
+    (f"{alias.upper()}?", grant)
+    for grant, aliases in grant_to_keywords.items() for alias in aliases
+]
+
+INTENT_CASES = [
+    (f"How can I {phrase} this year", grant)
+    for grant, phrases in grant_intents for phrase in phrases
+]
+
+EDGE_CASES = [
+    # Aliases must match whole words only
+    ("How do I get more leads for my business", None),
+    ("Any funding for roads and downloads", None),
+    ("What about fctcx", None),
+    # Punctuation and spacing variants
+    ("Is CCP-HC open now?", "Career Conversion Programme for Human Capital Professionals"),
+    ("ccp   for   SOs", "Career Conversion Programme for Security Officers"),
+    ("what is the ctc grant", "Company Training Committee Grant"),
+    # The earliest grant in the question wins
+    ("Should I use edg or psg", "Enterprise Development Grant"),
+    ("Should I use psg or edg", "Productivity Solutions Grant"),
+    # Job Redesign under PSG is its own grant, not PSG
+    ("What is PSG-JR job redesign consultancy support?", "Job Redesign under Productivity Solutions Grant"),
+    ("How do I apply for job redesign under the Productivity Solutions Grant?",
+     "Job Redesign under Productivity Solutions Grant"),
+    ("Which PSG solutions cover job redesign?", "Productivity Solutions Grant"),
+    # Bounded token-level fuzzy matching
+    ("Tell me about the skillsfutre queen bee", "SkillsFuture Queen Bee by AETOS"),
+    ("productivty solutions grant eligibility", "Productivity Solutions Grant"),
+    ("company trainng committee grant", "Company Training Committee Grant"),
+    ("Is there a ctc gant for us", "Company Training Committee Grant"),
+    # Abbreviations are never fuzzy-matched, only the longer words around them
+    ("Can the ccp to help me", None),
+    ("what about cop so", None),
+    ("ccp hx", None),
+    ("my ccp sp application", None),
+    ("Can I get ads", "Advanced Digital Solutions Grant"),
+    ("Can I add staff", None),
+    # Aliases take priority over intent phrases
+    ("security training under psg", "Productivity Solutions Grant"),
+    ("What grants are there for security agencies", None),
+]
+
+@pytest.mark.parametrize("question,expected", ALIAS_CASES + INTENT_CASES + EDGE_CASES)
+def test_detection_table(question, expected):
+    assert detect_grant_from_question(question) == expected
+
+def test_microbenchmark():
+    questions = [q for q, _ in ALIAS_CASES + INTENT_CASES + EDGE_CASES]
+    rounds = 20
+
+    start = time.perf_counter()
+    for _ in range(rounds):
+        _detect.cache_clear()
+        for question in questions:
+            detect_grant_from_question(question)
+    cold = (time.perf_counter() - start) / (rounds * len(questions))
+
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for question in questions:
+            detect_grant_from_question(question)
+    warm = (time.perf_counter() - start) / (rounds * len(questions))
+
+    print(f"\n⏱️ detect_grant_from_question: {cold * 1e6:.1f}µs uncached, {warm * 1e6:.2f}µs memoized")
+    assert warm < cold
@@ -0,0 +1,88 @@
+from langchain_core.documents import Document
+
+from helper_functions import qa_chain
+from helper_functions.benchmark_retrieval import offline_pipeline
+from helper_functions.grant_profiles import (
+    GrantProfileStore, canonical_grant, compile_profiles, format_overview, format_security_agency_list,
+    grant_catalogue, is_overview_question, save_profiles, grant_profiles_filename,
+)
+from helper_functions.web_scraper import extract_grant_metadata
+
+EDG = "Enterprise Development Grant"
+
+def _chunk(text, section, position, source="https://www.enterprisesg.gov.sg/edg", heading="Overview"):
+    return Document(page_content=text, metadata={
+        "source": source, "grant_title": EDG, "section": section, "position": position,
+        "heading_path": f"EDG > {heading}",
+    })
+
+def test_overview_questions_are_recognised():
+    assert is_overview_question("What is the Enterprise Development Grant?")
+    assert is_overview_question("Tell me about CTC")
+    assert is_overview_question("What's EDG grant")
+    assert not is_overview_question("Who is eligible for EDG?")
+    assert not is_overview_question("What is the deadline for the PSG grant?")
+    assert not is_overview_question("What is the weather today?")
+    assert canonical_grant("edg") == EDG and canonical_grant("Unknown") == "Unknown"
+
+def test_profiles_are_compiled_from_chunks_without_page_furniture():
+    docs = [
+        _chunk("Eligibility\nBusiness entity registered and operating in Singapore\nApply now\n"
+               "Employers eligible for the\nSkillsFuture Enterprise Credit can qualify for more support.",
+               "eligibility", 2, heading="Eligibility"),
+        _chunk("Overview\nAbout this programme\nThe Enterprise Development Grant (EDG) supports projects that "
+               "help you upgrade, innovate, grow and transform your business.\nCopyright © 2025 EnterpriseSG",
+               "description", 0),
+        _chunk("How to apply\nSubmit your application on the Business Grants Portal.", "application", 3,
+               heading="How to apply"),
+        _chunk("Overview\nAn older manual copy of the page.", "description", 0, source="manual_html::edg.html"),
+    ]
+    profile = compile_profiles(docs)[EDG]
+
+    assert profile["summary"].startswith("The Enterprise Development Grant (EDG) supports projects")
+    assert profile["eligibility"] == ("Business entity registered and operating in Singapore\n"
+                                      "Employers eligible for the SkillsFuture Enterprise Credit can qualify for "
+                                      "more support.")
+    assert profile["application"] == "Submit your application on the Business Grants Portal."
+    assert profile["sources"] == ["https://www.enterprisesg.gov.sg/edg"]
+    assert profile["complements"] == ["SkillsFuture Enterprise Credit"]
+    assert "Grant Description:\nThe Enterprise Development Grant" in format_overview(profile)
+    # Grants without compiled text keep their static facts and are not answered from the store
+    assert format_overview(compile_profiles(docs)["Company Training Committee Grant"]) is None
+
+def test_store_reloads_profiles_for_a_new_index_version(tmp_path):
+    for version in ("v1", "v2"):
+        profiles = {grant: {"complements": [f"{version}-partner"]} for grant in grant_catalogue}
+        save_profiles(profiles, str(tmp_path / version / grant_profiles_filename))
+    current = {"version": "v1"}
+    store = GrantProfileStore(directory_fn=lambda v: str(tmp_path / v), version_fn=lambda: current["version"])
+
+    assert store.complement("EDG") == "v1-partner"
+    current["version"] = "v2"
+    assert store.complement("Enterprise Development Grant") == "v2-partner"
+    assert store.complement(None) is None
+
+def test_complementary_grant_and_security_list_come_from_the_catalogue():
+    # Each grant's complement is a lookup, including grants named by abbreviation
+    assert qa_chain.profile_store.complement("PSG") == "Career Conversion Programme for Security Officers"
+    assert "**Career Conversion Programme for Security Officers**: This grant complements the objectives of the " \
+           "Productivity Solutions Grant." in qa_chain.find_complementary_grant("PSG")
+    assert qa_chain.find_complementary_grant("Job Redesign under Productivity Solutions Grant") == ""
+    listing = format_security_agency_list()
+    assert listing == qa_chain.security_agency_response
+    assert "**SkillsFuture Queen Bee (SFQB) by AETOS**" in listing and "PSG-JR" not in listing
+
+def test_overview_question_is_answered_without_retrieval_or_llm(monkeypatch):
+    with offline_pipeline() as llm:
+        monkeypatch.setattr(qa_chain, "get_retriever", lambda *a, **kw: (_ for _ in ()).throw(AssertionError))
+        answer = qa_chain.get_final_response("What is the Enterprise Development Grant?")
+
+        assert answer.startswith("Grant Description:\nThe Enterprise Development Grant (EDG)")
+        assert "### 🔗 Sources:" in answer and "SkillsFuture Enterprise Credit" in answer
+        assert llm.calls == 0
+
+def test_scraper_metadata_uses_the_catalogue():
+    metadata = extract_grant_metadata("Apply for the Productivity Solutions Grant (PSG) today")
+    assert metadata["grant_title"] == "Productivity Solutions Grant"
+    assert metadata["target"] == grant_catalogue["Productivity Solutions Grant"]["target"]
+    assert extract_grant_metadata("Nothing relevant")["grant_title"] == "Unknown"
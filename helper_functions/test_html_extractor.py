@@ -0,0 +1,73 @@
+import os
+
+import pytest
+
+from helper_functions import html_extractor
+from helper_functions.benchmark_extraction import run_benchmark
+from helper_functions.html_extractor import extract_file, extract_text
+
+PAGE = """<html><head><title>CTC Grant</title><style>p { color: red }</style></head>
+<body class="page menu-link-color">
+<div id="cookie-banner">We use cookies. <a href="#">Accept</a></div>
+<header><a href="/">Home</a> <a href="/grants">Grants</a></header>
+<ul class="main-menu"><li><a href="/a">About</a></li><li><a href="/b">Programmes</a></li></ul>
+<form id="aspnetForm">
+  <h1>Company Training Committee Grant</h1>
+  <p>The CTC grant supports <b>job redesign</b> and training.</p>
+  <ul><li>Registered in Singapore</li><li>Has a unionised workforce</li></ul>
+  <script>trackPageView();</script>
+</form>
+<footer>Copyright 2025 <a href="/privacy">Privacy</a></footer>
+</body></html>"""
+
+EXPECTED = [
+    "CTC Grant",
+    "Company Training Committee Grant",
+    "The CTC grant supports job redesign and training.",
+    "Registered in Singapore",
+    "Has a unionised workforce",
+]
+
+@pytest.mark.parametrize("backend", sorted(html_extractor.backends))
+def test_backends_drop_boilerplate_and_keep_content(backend):
+    assert extract_text(PAGE, backend).splitlines() == EXPECTED
+
+def test_stream_backend_survives_malformed_html():
+    html = "<div><p>First<p>Second</div></span><nav><a>Menu</a><li>Third"
+    assert extract_text(html, "stream").splitlines() == ["First", "Second"]
+
+def test_file_cache_is_keyed_on_mtime_and_hash(tmp_path, monkeypatch):
+    calls = []
+    monkeypatch.setitem(html_extractor.backends, "stream",
+                        lambda html: calls.append(html) or html_extractor.extract_text_stream(html))
+    page = tmp_path / "page.html"
+    page.write_text(PAGE, encoding="utf-8")
+    cache_dir = str(tmp_path / "cache")
+
+    first = extract_file(str(page), backend="stream", cache_dir=cache_dir)
+    assert extract_file(str(page), backend="stream", cache_dir=cache_dir) == first
+    assert len(calls) == 1
+
+    # Touched but unchanged: the hash matches, so nothing is re-parsed
+    os.utime(page, ns=(0, os.stat(page).st_mtime_ns + 10**9))
+    assert extract_file(str(page), backend="stream", cache_dir=cache_dir) == first
+    assert len(calls) == 1
+
+    page.write_text(PAGE.replace("job redesign", "job transformation"), encoding="utf-8")
+    os.utime(page, ns=(0, os.stat(page).st_mtime_ns + 2 * 10**9))
+    assert "job transformation" in extract_file(str(page), backend="stream", cache_dir=cache_dir)
+    assert len(calls) == 2
+
+    # New extraction rules: text cached by the old ones is not reused
+    monkeypatch.setattr(html_extractor, "EXTRACTOR_VERSION", html_extractor.EXTRACTOR_VERSION + 1)
+    extract_file(str(page), backend="stream", cache_dir=cache_dir)
+    assert len(calls) == 3
+
+def test_benchmark_on_bundled_files():
+    results = run_benchmark()
+    print("\n" + "\n".join(f"{name}: {result}" for name, result in results.items()))
+
+    original = results["original"]
+    assert results[html_extractor.default_backend]["ms"] < original["ms"]
+    assert results["stream"]["peak_kb"] < original["peak_kb"] / 4
+    assert results["cached"]["ms"] < original["ms"] / 10
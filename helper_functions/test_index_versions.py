@@ -0,0 +1,135 @@
+import os
+import json
+import hashlib
+
+import pytest
+from langchain_core.embeddings import Embeddings
+
+from helper_functions import clients, html_extractor
+from helper_functions import retriever as retriever_module
+from helper_functions import vectorstore
+
+class HashEmbeddings(Embeddings):
+    model_name = "hash-16"
+
+    def _vector(self, text):
+        digest = hashlib.sha256(text.lower().encode("utf-8")).digest()
+        return [b / 255 - 0.5 for b in digest[:16]]
+
+    def embed_documents(self, texts):
+        return [self._vector(t) for t in texts]
+
+    def embed_query(self, text):
+        return self._vector(text)
+
+def _write_page(directory, name, text):
+    with open(os.path.join(directory, name), "w", encoding="utf-8") as f:
+        f.write(f"<html><body><p>{text}</p></body></html>")
+
+@pytest.fixture
+def index_root(monkeypatch, tmp_path):
+    manual = tmp_path / "manual"
+    manual.mkdir()
+    _write_page(manual, "company_training_committee_grant.html", "The CTC grant supports job redesign.")
+    _write_page(manual, "skillsfuture_queen_bee.html", "SFQB helps security SMEs upskill.")
+
+    embedder = HashEmbeddings()
+    monkeypatch.setattr(vectorstore, "persist_directory", str(tmp_path / "chroma_db"))
+    monkeypatch.setattr(vectorstore, "manual_scrape_dir", str(manual))
+    monkeypatch.setattr(clients, "embedding", embedder)
+    monkeypatch.setattr(html_extractor, "extraction_cache_dir", str(tmp_path / "extraction_cache"))
+    retriever_module.invalidate_retrievers()
+    yield manual
+    retriever_module.invalidate_retrievers()
+
+def test_refresh_builds_on_the_side_and_publishes_with_manifest(index_root):
+    vectorstore.refresh_vectorstore([])
+    first = vectorstore.get_index_version()
+    manifest = vectorstore.read_manifest(first)
+
+    assert vectorstore.get_index_directory().endswith(os.path.join("versions", first))
+    assert manifest["chunk_count"] == 2
+    assert set(manifest["sources"]) == {"manual_html::company_training_committee_grant.html",
+                                        "manual_html::skillsfuture_queen_bee.html"}
+    assert manifest["embedding_model"] == "hash-16"
+
+    # Readers keep the published version open while the next one is built
+    live = retriever_module.get_vectorstore()
+    _write_page(index_root, "company_training_committee_grant.html", "CTC now also covers training costs.")
+    vectorstore.refresh_vectorstore([])
+    second = vectorstore.get_index_version()
+
+    assert second != first
+    assert vectorstore.read_manifest(second)["parent"] == first
+    assert "job redesign" in " ".join(live.get()["documents"])
+    assert retriever_module.get_vectorstore() is not live
+    assert "training costs" in " ".join(retriever_module.get_vectorstore().get()["documents"])
+
+def test_unchanged_refresh_keeps_the_published_version(index_root):
+    vectorstore.refresh_vectorstore([])
+    version = vectorstore.get_index_version()
+
+    vectorstore.refresh_vectorstore([])
+
+    assert vectorstore.get_index_version() == version
+    assert [m["version"] for m in vectorstore.list_index_versions()] == [version]
+
+def test_rollback_and_garbage_collection(index_root, monkeypatch):
+    monkeypatch.setattr(vectorstore, "index_versions_to_keep", 2)
+    published = []
+    for i in range(3):
+        _write_page(index_root, "skillsfuture_queen_bee.html", f"SFQB revision {i}.")
+        vectorstore.refresh_vectorstore([])
+        published.append(vectorstore.get_index_version())
+
+    assert [m["version"] for m in vectorstore.list_index_versions()] == published[1:]
+
+    assert vectorstore.rollback_index() == published[1]
+    assert "revision 1" in " ".join(retriever_module.get_vectorstore().get()["documents"])
+    with pytest.raises(ValueError):
+        vectorstore.rollback_index()
+    assert vectorstore.rollback_index(published[2]) == published[2]
+
+def test_fingerprints_are_only_saved_with_a_published_version(index_root):
+    vectorstore.refresh_vectorstore([])
+    legacy = vectorstore.get_index_version()
+    # A manifest written before fingerprints were recorded
+    path = os.path.join(vectorstore.get_index_directory(), vectorstore.index_manifest_filename)
+    manifest = vectorstore.read_manifest(legacy)
+    del manifest["fingerprints"]
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f)
+
+    status = {}
+    vectorstore.refresh_vectorstore([], status=status)
+
+    assert status["outcome"] == "published" and vectorstore.get_index_version() != legacy
+    assert "fingerprints" not in vectorstore.read_manifest(legacy)
+    assert len(vectorstore.read_manifest(vectorstore.get_index_version())["fingerprints"]) == 2
+
+def test_index_version_is_read_once_per_publish(tmp_path, monkeypatch):
+    directory = str(tmp_path)
+    version = vectorstore.publish_index_version(directory)
+    reads = []
+    real_open = open
+
+    def counting_open(path, *args, **kwargs):
+        if str(path).endswith(vectorstore.index_version_filename):
+            reads.append(path)
+        return real_open(path, *args, **kwargs)
+
+    monkeypatch.setattr("builtins.open", counting_open)
+    assert [vectorstore.get_index_version(directory) for _ in range(5)] == [version] * 5
+    assert len(reads) == 1
+
+    # A publish, here or by a refresh in another process, is seen on the next read
+    newer = vectorstore.publish_index_version(directory)
+    assert vectorstore.get_index_version(directory) == newer
+    monkeypatch.setattr(vectorstore, "_index_versions", {})
+    path = os.path.join(directory, vectorstore.index_version_filename)
+    assert vectorstore.get_index_version(directory) == newer
+    with real_open(f"{path}.tmp", "w", encoding="utf-8") as f:
+        f.write("elsewhere")
+    os.replace(f"{path}.tmp", path)
+    assert vectorstore.get_index_version(directory) == "elsewhere"
+    assert len(reads) == 4
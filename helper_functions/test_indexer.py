@@ -0,0 +1,62 @@
+import hashlib
+from langchain_chroma import Chroma
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+from helper_functions.indexer import index_documents
+
+class CountingEmbeddings(Embeddings):
+    """Deterministic offline embedder that counts how many texts it was asked to embed."""
+
+    def __init__(self):
+        self.embedded = 0
+
+    def _vector(self, text):
+        digest = hashlib.sha256(text.encode("utf-8")).digest()
+        return [b / 255 for b in digest[:16]]
+
+    def embed_documents(self, texts):
+        self.embedded += len(texts)
+        return [self._vector(t) for t in texts]
+
+    def embed_query(self, text):
+        return self._vector(text)
+
+def _chunks(source, texts):
+    return [Document(page_content=t, metadata={"source": source, "grant_title": "Test"}) for t in texts]
+
+def test_unchanged_corpus_makes_no_embedding_calls(tmp_path):
+    embedder = CountingEmbeddings()
+    db = Chroma(persist_directory=str(tmp_path), embedding_function=embedder)
+    corpus = _chunks("https://a", ["one", "two", "two"]) + _chunks("https://b", ["three"])
+
+    first = index_documents(db, corpus)
+    assert embedder.embedded == 4
+    assert first["https://a"] == {"added": 3, "updated": 0, "deleted": 0, "unchanged": 0}
+
+    second = index_documents(db, corpus)
+    assert embedder.embedded == 4
+    assert second["https://a"] == {"added": 0, "updated": 0, "deleted": 0, "unchanged": 3}
+    assert len(db.get()["ids"]) == 4
+
+def test_changed_and_removed_sources(tmp_path):
+    embedder = CountingEmbeddings()
+    db = Chroma(persist_directory=str(tmp_path), embedding_function=embedder)
+    index_documents(db, _chunks("https://a", ["one", "two"]) + _chunks("https://b", ["three"]))
+    embedder.embedded = 0
+
+    report = index_documents(db, _chunks("https://a", ["one", "two v2", "four"]))
+
+    assert embedder.embedded == 2
+    assert report["https://a"] == {"added": 1, "updated": 1, "deleted": 0, "unchanged": 1}
+    assert report["https://b"] == {"added": 0, "updated": 0, "deleted": 1, "unchanged": 0}
+    assert sorted(db.get()["documents"]) == ["four", "one", "two v2"]
+
+def test_kept_sources_are_not_deleted(tmp_path):
+    db = Chroma(persist_directory=str(tmp_path), embedding_function=CountingEmbeddings())
+    index_documents(db, _chunks("https://a", ["one"]) + _chunks("https://b", ["three"]))
+
+    report = index_documents(db, _chunks("https://a", ["one"]), keep_sources={"https://b"})
+
+    assert "https://b" not in report
+    assert sorted(db.get()["documents"]) == ["one", "three"]
@@ -0,0 +1,104 @@
+import os
+import hashlib
+import threading
+
+import pytest
+from langchain_chroma import Chroma
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+from helper_functions import ingestion
+from helper_functions.indexer import assign_chunk_ids
+from helper_functions.ingestion import ingest_chunks, token_batches
+
+class RateLimitError(Exception):
+    """Same class name as openai.RateLimitError."""
+
+class FlakyEmbeddings(Embeddings):
+    """
+    Offline embedder that rejects the first attempt of every `reject_every`th request with a
+    rate-limit error, and raises `crash_with` once `crash_after` requests have succeeded.
+    """
+
+    def __init__(self, reject_every=0, crash_after=None, crash_with=RuntimeError):
+        self.reject_every = reject_every
+        self.crash_after = crash_after
+        self.crash_with = crash_with
+        self.requests = 0
+        self.embedded = 0
+        self._lock = threading.Lock()
+
+    def embed_documents(self, texts):
+        with self._lock:
+            self.requests += 1
+            request = self.requests
+            succeeded = self.requests - (self.requests // self.reject_every if self.reject_every else 0)
+        if self.reject_every and request % self.reject_every == 0:
+            raise RateLimitError("429 Too Many Requests")
+        if self.crash_after is not None and succeeded > self.crash_after:
+            raise self.crash_with("embedding service went away")
+        with self._lock:
+            self.embedded += len(texts)
+        return [[b / 255 for b in hashlib.sha256(t.encode()).digest()[:8]] for t in texts]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+def _items(n):
+    chunks = [Document(page_content=f"Chunk {i} about grant eligibility " * 10,
+                       metadata={"source": "https://grant", "grant_title": "Test"}) for i in range(n)]
+    return assign_chunk_ids(chunks)
+
+@pytest.fixture(autouse=True)
+def fast_backoff(monkeypatch):
+    monkeypatch.setattr(ingestion, "rate_limit_backoff", 0.001)
+
+def test_batches_respect_token_and_size_limits():
+    items = _items(20)
+    batches = token_batches(items, max_tokens=400, max_size=3)
+
+    assert [item for batch, _ in batches for item in batch] == items
+    assert all(len(batch) <= 3 for batch, _ in batches)
+    assert all(tokens <= 400 for _, tokens in batches)
+
+def test_rate_limited_batches_are_retried_and_all_chunks_written(tmp_path):
+    embedder = FlakyEmbeddings(reject_every=3)
+    db = Chroma(persist_directory=str(tmp_path), embedding_function=embedder)
+    items = _items(120)
+
+    stats = ingest_chunks(db, items, concurrency=4, max_tokens=800)
+
+    print(f"\n⚡ {stats['chunks']} chunks in {stats['batches']} batches, "
+          f"{stats['chunks_per_second']:.0f} chunks/s, {stats['rate_limit_retries']} retries")
+    assert stats["chunks"] == 120 and stats["batches"] > 4
+    assert stats["rate_limit_retries"] > 0
+    assert embedder.embedded == 120
+    assert sorted(db.get()["ids"]) == sorted(chunk_id for chunk_id, _ in items)
+
+def test_crashed_run_resumes_from_checkpoint(tmp_path):
+    checkpoint = str(tmp_path / "ingest_checkpoint.json")
+    items = _items(60)
+    db = Chroma(persist_directory=str(tmp_path / "db"), embedding_function=FlakyEmbeddings())
+
+    with pytest.raises(RuntimeError):
+        ingest_chunks(db, items, embedder=FlakyEmbeddings(crash_after=3), checkpoint_path=checkpoint,
+                      concurrency=1, max_size=5)
+    assert os.path.exists(checkpoint)
+    written = len(db.get()["ids"])
+    assert 0 < written < 60
+
+    resumed = FlakyEmbeddings()
+    stats = ingest_chunks(db, items, embedder=resumed, checkpoint_path=checkpoint, concurrency=1, max_size=5)
+
+    assert stats["skipped"] == written
+    assert resumed.embedded == 60 - written
+    assert len(db.get()["ids"]) == 60
+    assert not os.path.exists(checkpoint)
+
+def test_other_errors_are_not_retried(tmp_path):
+    db = Chroma(persist_directory=str(tmp_path), embedding_function=FlakyEmbeddings())
+    embedder = FlakyEmbeddings(crash_after=0, crash_with=ValueError)
+
+    with pytest.raises(ValueError):
+        ingest_chunks(db, _items(3), embedder=embedder)
+    assert embedder.requests == 1
@@ -0,0 +1,43 @@
+import pytest
+
+from helper_functions import load_test, tracing
+from helper_functions.load_test import build_schedule, memory_growth, parse_mix, run_load_test
+
+def test_schedule_follows_mix_and_arrival_rate():
+    schedule = build_schedule(2000, mix={"keyword": 3, "security_agency": 1}, arrival_rate=100, seed=1)
+    kinds = [kind for _, kind, _ in schedule]
+
+    assert set(kinds) == {"keyword", "security_agency"}
+    assert 0.7 < kinds.count("keyword") / len(kinds) < 0.8
+    assert 17 < schedule[-1][0] < 23  # 2000 arrivals at 100/s
+    assert all(question in load_test.question_mix[kind] for _, kind, question in schedule)
+    assert all(offset == 0 for offset, _, _ in build_schedule(10))
+
+def test_parse_mix_rejects_unknown_kinds():
+    assert parse_mix("keyword=0.7,generic=0.3") == {"keyword": 0.7, "generic": 0.3}
+    with pytest.raises(ValueError):
+        parse_mix("keywords=1")
+
+def test_memory_growth_separates_plateaus_from_leaks():
+    plateau = [{"completed": i * 10, "rss_mb": 100.0 + min(i, 2), "objects": 1000} for i in range(20)]
+    leak = [{"completed": i * 10, "rss_mb": 100.0 + i, "objects": 1000 + 50 * i} for i in range(20)]
+
+    assert memory_growth(plateau)["rss_mb_per_1000"] == pytest.approx(0.0, abs=1e-6)
+    assert memory_growth(leak)["rss_mb_per_1000"] == pytest.approx(100.0)
+    assert memory_growth(leak)["objects_per_1000"] == pytest.approx(5000.0)
+
+def test_concurrent_run_reports_throughput_errors_and_memory():
+    report = run_load_test(requests=40, concurrency=20, llm_latency=0.2, embedding_latency=0.005,
+                           llm_error_rate=0.25, seed=3)
+    load_test.print_report(report)
+
+    assert report["requests"] == 40
+    # 20 workers overlap the fake LLM latency: far faster than answering one at a time
+    assert report["seconds"] < 40 * 0.2 / 2
+    # Retries absorb most injected LLM failures; the rest become degraded answers
+    assert report["llm_attempt_errors"] > 0
+    assert report["error_rate"] + report["degraded_rate"] < 0.6
+    assert report["latency_ms"]["p99"] >= report["latency_ms"]["p50"] > 0
+    assert set(report["latency_ms_by_kind"]) <= set(load_test.question_mix)
+    assert len(report["memory_samples"]) >= 2 and report["memory"]["rss_end_mb"] > 0
+    assert not tracing.enabled and tracing.recorded_spans() == []
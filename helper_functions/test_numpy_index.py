@@ -0,0 +1,105 @@
+import hashlib
+
+import numpy as np
+from langchain_chroma import Chroma
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+from helper_functions import benchmark_vector_index
+from helper_functions.numpy_index import NumpyRetriever, NumpyVectorIndex, build_vector_codes, parse_filter
+from helper_functions.retriever import _build_search_kwargs
+
+GRANTS = ["Productivity Solutions Grant", "Enterprise Development Grant", "Company Training Committee Grant"]
+SECTIONS = ["eligibility", "application", None]
+
+class RandomEmbeddings(Embeddings):
+    """Dense unit-length pseudo-random vectors seeded by the text, so no two chunks tie."""
+
+    def embed_query(self, text):
+        seed = int(hashlib.sha256(text.encode()).hexdigest()[:8], 16)
+        vector = np.random.default_rng(seed).normal(size=64)
+        return (vector / np.linalg.norm(vector)).tolist()
+
+    def embed_documents(self, texts):
+        return [self.embed_query(text) for text in texts]
+
+def _chroma(tmp_path, space="cosine"):
+    docs = [
+        Document(page_content=f"{grant} chunk {i} about funding and support",
+                 metadata={"grant_title": grant, "source": f"https://{i % 3}", **({"section": section} if section else {})})
+        for i in range(60)
+        for grant, section in [(GRANTS[i % 3], SECTIONS[(i // 3) % 3])]
+    ]
+    db = Chroma(persist_directory=str(tmp_path / space), embedding_function=RandomEmbeddings(),
+                collection_metadata={"hnsw:space": space})
+    db.add_documents(docs)
+    return db
+
+def test_filters_of_every_pooled_retriever_are_understood():
+    assert parse_filter(_build_search_kwargs(None).get("filter")) == (None, None)
+    assert parse_filter(_build_search_kwargs((GRANTS[0],))["filter"]) == ((GRANTS[0],), None)
+    assert parse_filter(_build_search_kwargs(tuple(GRANTS[:2]))["filter"]) == (tuple(GRANTS[:2]), None)
+    assert parse_filter(_build_search_kwargs(tuple(GRANTS[:2]), "eligibility")["filter"]) == \
+        (tuple(GRANTS[:2]), "eligibility")
+    assert parse_filter(_build_search_kwargs(None, "application")["filter"]) == (None, "application")
+
+def test_grant_partitions_and_section_masks_select_only_their_rows(tmp_path):
+    index = NumpyVectorIndex.from_chroma(_chroma(tmp_path))
+
+    assert index.matrix.dtype == np.float32 and index.matrix.flags["C_CONTIGUOUS"]
+    single = index.rows((GRANTS[1],))
+    assert isinstance(single, slice) and single.stop - single.start == 20
+    assert {index.documents[row].metadata["grant_title"] for row in range(single.start, single.stop)} == {GRANTS[1]}
+
+    rows = index.rows((GRANTS[0], GRANTS[2]), "eligibility")
+    assert len(rows) == 14
+    assert all(index.documents[row].metadata["grant_title"] in (GRANTS[0], GRANTS[2])
+               and index.documents[row].metadata["section"] == "eligibility" for row in rows)
+    assert len(index.rows(("Unknown Grant",))) == 0
+
+def test_results_match_chroma(tmp_path):
+    for space in ("cosine", "l2"):
+        db = _chroma(tmp_path, space)
+        index = NumpyVectorIndex.from_chroma(db)
+        for key, section in [(None, None), ((GRANTS[0],), None), (tuple(GRANTS[1:]), None), ((GRANTS[2],), "application")]:
+            where = _build_search_kwargs(key, section).get("filter")
+            for query in ["How do I apply?", "Who is eligible for funding?"]:
+                assert index.max_marginal_relevance_search(query, k=7, fetch_k=30, filter=where) == \
+                    db.max_marginal_relevance_search(query, k=7, fetch_k=30, filter=where)
+                assert index.similarity_search(query, k=5, filter=where) == db.similarity_search(query, k=5, filter=where)
+                ours = index.similarity_search_with_relevance_scores(query, k=3, filter=where)
+                theirs = db.similarity_search_with_relevance_scores(query, k=3, filter=where)
+                assert [doc for doc, _ in ours] == [doc for doc, _ in theirs]
+                assert np.allclose([score for _, score in ours], [score for _, score in theirs], atol=1e-4)
+
+def test_batched_variants_match_single_searches(tmp_path):
+    index = NumpyVectorIndex.from_chroma(_chroma(tmp_path))
+    retriever = NumpyRetriever(vectorstore=index, search_type="mmr",
+                               search_kwargs=_build_search_kwargs(tuple(GRANTS[:2])))
+    variants = ["How do I apply?", "Details of How do I apply?", "Eligibility and application for How do I apply?"]
+
+    assert retriever.batch_search(variants) == [retriever.invoke(variant) for variant in variants]
+
+def test_benchmark_against_chroma_on_the_bundled_corpus():
+    results = benchmark_vector_index.run_benchmark(dimensions=256, repeats=1)
+    benchmark_vector_index.print_report(results)
+
+    assert results["chunks"] > 200
+    assert results["overlap@k"] >= benchmark_vector_index.min_overlap
+    assert results["relevance_score_match_rate"] == 1.0
+    assert results["latency_ms"]["numpy_variants"]["p50"] < results["latency_ms"]["chroma_variants"]["p50"]
+
+def test_empty_collection_returns_no_documents(tmp_path):
+    db = Chroma(persist_directory=str(tmp_path / "empty"), embedding_function=RandomEmbeddings(),
+                collection_metadata={"hnsw:space": "cosine"})
+    index = NumpyVectorIndex.from_chroma(db)
+    where = _build_search_kwargs((GRANTS[0],), "eligibility")["filter"]
+
+    assert len(index) == 0 and index.partitions == {}
+    assert index.similarity_search("How do I apply?", k=4) == []
+    assert index.max_marginal_relevance_search("How do I apply?", k=4, filter=where) == []
+    assert index.similarity_search_with_relevance_scores("How do I apply?") == []
+    assert index.similarity_search_by_vectors([RandomEmbeddings().embed_query("q")], k=4) == [[]]
+    assert index.mmr_search_by_vectors([RandomEmbeddings().embed_query("q")], k=4) == [[]]
+    assert NumpyRetriever(vectorstore=index, search_kwargs={"k": 4}).invoke("How do I apply?") == []
+    assert len(build_vector_codes(db, str(tmp_path / "codes"))) == 0
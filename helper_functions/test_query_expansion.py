@@ -0,0 +1,109 @@
+import time
+import hashlib
+
+from langchain_chroma import Chroma
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+
+from helper_functions import retriever as retriever_module
+from helper_functions import clients, vectorstore
+
+LLM_LATENCY = 0.2
+
+class HashEmbeddings(Embeddings):
+    def _vector(self, text):
+        digest = hashlib.sha256(text.lower().encode("utf-8")).digest()
+        return [b / 255 - 0.5 for b in digest[:16]]
+
+    def embed_documents(self, texts):
+        return [self._vector(t) for t in texts]
+
+    def embed_query(self, text):
+        return self._vector(text)
+
+class CountingChatModel(FakeListChatModel):
+    """Stub expansion LLM with a fixed latency that counts how often it is called."""
+    calls: int = 0
+
+    def _call(self, *args, **kwargs):
+        self.calls += 1
+        return super()._call(*args, **kwargs)
+
+CHUNKS = [
+    ("The CTC grant supports job redesign.", "Company Training Committee Grant"),
+    ("PSG funds pre-approved digital solutions.", "Productivity Solutions Grant"),
+    ("EDG helps companies innovate and grow overseas.", "Enterprise Development Grant"),
+]
+
+def _setup(monkeypatch, tmp_path):
+    embedder = HashEmbeddings()
+    db = Chroma(persist_directory=str(tmp_path), embedding_function=embedder,
+                collection_metadata={"hnsw:space": "cosine"})
+    db.add_documents([Document(page_content=text, metadata={"grant_title": title, "source": title})
+                      for text, title in CHUNKS])
+    llm = CountingChatModel(responses=["grant support\nfunding help\nsubsidy options"], sleep=LLM_LATENCY)
+
+    monkeypatch.setattr(vectorstore, "persist_directory", str(tmp_path))
+    monkeypatch.setattr(retriever_module, "Chroma", lambda **kwargs: db)
+    monkeypatch.setattr(clients, "llm", llm)
+    monkeypatch.setattr(clients, "embedding", embedder)
+    retriever_module.invalidate_retrievers()
+    retriever_module.expansion_cache.clear()
+    return llm
+
+def _time_to_first_doc(grant_filter, question):
+    start = time.perf_counter()
+    docs = retriever_module.get_retriever(grant_filter=grant_filter).invoke(question)
+    return time.perf_counter() - start, docs
+
+def test_fast_path_skips_expansion_for_detected_grant(monkeypatch, tmp_path):
+    llm = _setup(monkeypatch, tmp_path)
+
+    elapsed, docs = _time_to_first_doc("Company Training Committee Grant", "Tell me about the ctc grant")
+
+    assert llm.calls == 0
+    assert docs and all(d.metadata["grant_title"] == "Company Training Committee Grant" for d in docs)
+    assert elapsed < LLM_LATENCY
+
+def test_fast_path_skips_expansion_when_first_pass_is_confident(monkeypatch, tmp_path):
+    llm = _setup(monkeypatch, tmp_path)
+
+    _, docs = _time_to_first_doc(None, CHUNKS[1][0])
+
+    assert llm.calls == 0
+    assert docs[0].page_content == CHUNKS[1][0]
+
+def test_expanded_variants_are_cached(monkeypatch, tmp_path):
+    llm = _setup(monkeypatch, tmp_path)
+    monkeypatch.setattr(retriever_module, "fast_path_min_score", 1.1)
+
+    slow, _ = _time_to_first_doc(None, "What support is there?")
+    fast, _ = _time_to_first_doc(None, "  what SUPPORT is there? ")
+
+    print(f"\n⏱️ Expansion miss: {slow * 1000:.0f}ms, hit: {fast * 1000:.0f}ms")
+    assert llm.calls == 1
+    assert retriever_module.expansion_cache.hits == 1
+    assert slow - fast > LLM_LATENCY * 0.5
+
+def test_benchmark_llm_calls_with_and_without_fast_path(monkeypatch, tmp_path):
+    questions = [
+        ("Company Training Committee Grant", "how to apply for ctc"),
+        ("Productivity Solutions Grant", "what is psg"),
+        (None, CHUNKS[2][0]),
+        (None, "list of grants"),
+        (None, "list of grants"),
+    ]
+    results = {}
+    for enabled in (False, True):
+        llm = _setup(monkeypatch, tmp_path / str(enabled))
+        monkeypatch.setattr(retriever_module, "expansion_fast_path", enabled)
+        start = time.perf_counter()
+        for grant_filter, question in questions:
+            retriever_module.get_retriever(grant_filter=grant_filter).invoke(question)
+        results[enabled] = (llm.calls, time.perf_counter() - start)
+
+    print(f"\n📊 Without fast path: {results[False][0]} LLM calls, {results[False][1] * 1000:.0f}ms; "
+          f"with fast path: {results[True][0]} LLM calls, {results[True][1] * 1000:.0f}ms")
+    assert results[False][0] == 4
+    assert results[True][0] <= 1
@@ -0,0 +1,233 @@
+import os
+import time
+import hashlib
+import datetime
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from helper_functions import bm25_index, clients, html_extractor, refresh_daemon, text_splitter, vectorstore
+from helper_functions import retriever as retriever_module
+from helper_functions.fetcher import ConcurrentFetcher
+from helper_functions.refresh_daemon import RefreshLock, build_scheduler, run_daemon, run_refresh
+from helper_functions.test_index_versions import HashEmbeddings, _write_page
+
+class _PageHandler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        if self.path in getattr(self.server, "down", ()):
+            self.send_response(503)
+            self.end_headers()
+            return
+        body = self.server.body.encode()
+        etag = f'"{hashlib.sha256(body).hexdigest()[:16]}"'
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("ETag", etag)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+@pytest.fixture
+def grant_page():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _PageHandler)
+    server.body = "<html><body><p>The EDG grant supports upgrading projects.</p></body></html>"
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+@pytest.fixture
+def index_root(monkeypatch, tmp_path):
+    manual = tmp_path / "manual"
+    manual.mkdir()
+    _write_page(manual, "company_training_committee_grant.html", "The CTC grant supports job redesign.")
+    embedder = HashEmbeddings()
+    monkeypatch.setattr(vectorstore, "persist_directory", str(tmp_path / "chroma_db"))
+    monkeypatch.setattr(vectorstore, "manual_scrape_dir", str(manual))
+    monkeypatch.setattr(clients, "embedding", embedder)
+    monkeypatch.setattr(html_extractor, "extraction_cache_dir", str(tmp_path / "extraction_cache"))
+    # clean_page saves a text copy of every scraped page under ./data/scraped_pages
+    monkeypatch.chdir(tmp_path)
+    retriever_module.invalidate_retrievers()
+    yield manual
+    retriever_module.invalidate_retrievers()
+
+def test_unchanged_content_stops_before_chunking(index_root, grant_page, monkeypatch):
+    url = f"http://127.0.0.1:{grant_page.server_address[1]}/edg"
+    first = run_refresh([url])
+    assert first["outcome"] == "published" and first["urls_fetched"] == 1
+
+    def no_chunking(docs):
+        raise AssertionError("unchanged pages must not be chunked")
+    monkeypatch.setattr(text_splitter.splitter, "split_documents", no_chunking)
+
+    # Re-rendered whitespace and case leave the fingerprint alone
+    grant_page.body = "<html><body>\n<p>The EDG grant   supports\nupgrading projects.</p></body></html>"
+    assert run_refresh([url])["outcome"] == "unchanged"
+    assert vectorstore.get_index_version() == first["version"]
+
+def test_changed_page_is_republished_and_tracked_per_url(index_root, grant_page):
+    url = f"http://127.0.0.1:{grant_page.server_address[1]}/edg"
+    first = run_refresh([url])
+    grant_page.body = "<html><body><p>The EDG grant now also funds overseas expansion.</p></body></html>"
+    second = run_refresh([url])
+
+    assert second["outcome"] == "published" and second["version"] != first["version"]
+    assert second["changed_sources"] == [url]
+    history = refresh_daemon.load_state()["urls"][url]
+    assert [record["status"] for record in history] == [200, 200]
+    assert len({record["fingerprint"] for record in history}) == 2
+    assert vectorstore.read_manifest(second["version"])["fingerprints"][url] == history[-1]["fingerprint"]
+
+def test_failed_validation_does_not_save_http_validators(index_root, grant_page, monkeypatch):
+    url = f"http://127.0.0.1:{grant_page.server_address[1]}/edg"
+    first = run_refresh([url])
+    grant_page.body = "<html><body><p>The EDG grant now also funds overseas expansion.</p></body></html>"
+    validate_index = vectorstore.validate_index
+    monkeypatch.setattr(vectorstore, "validate_index", lambda db, lexical_index: ["smoke test failed"])
+    assert run_refresh([url])["outcome"] == "invalid"
+    monkeypatch.setattr(vectorstore, "validate_index", validate_index)
+
+    # The changed page is fetched again in full rather than answered with a 304
+    retry = run_refresh([url])
+    assert retry["outcome"] == "published" and retry["version"] != first["version"]
+    assert [record["status"] for record in refresh_daemon.load_state()["urls"][url]] == [200, 200, 200]
+    assert run_refresh([url])["outcome"] == "unchanged"
+    assert refresh_daemon.load_state()["urls"][url][-1]["status"] == 304
+
+def test_build_interrupted_before_publishing_is_published_when_resumed(index_root, grant_page, monkeypatch):
+    url = f"http://127.0.0.1:{grant_page.server_address[1]}/edg"
+    first = run_refresh([url])
+    grant_page.body = "<html><body><p>The EDG grant now also funds overseas expansion.</p></body></html>"
+
+    # Chunks are ingested into the side build, then the refresh dies before publishing
+    def crash(db, path):
+        raise RuntimeError("killed")
+    build_lexical_index = bm25_index.build_lexical_index
+    monkeypatch.setattr(bm25_index, "build_lexical_index", crash)
+    assert run_refresh([url])["outcome"] == "error"
+    monkeypatch.setattr(bm25_index, "build_lexical_index", build_lexical_index)
+
+    resumed = run_refresh([url])
+    assert resumed["outcome"] == "published" and resumed["version"] != first["version"]
+    assert "overseas expansion" in " ".join(retriever_module.get_vectorstore().get()["documents"])
+    assert run_refresh([url])["outcome"] == "unchanged"
+
+def test_rollback_drops_http_validators(index_root, grant_page):
+    url = f"http://127.0.0.1:{grant_page.server_address[1]}/edg"
+    first = run_refresh([url])
+    grant_page.body = "<html><body><p>The EDG grant now also funds overseas expansion.</p></body></html>"
+    run_refresh([url])
+
+    assert vectorstore.rollback_index() == first["version"]
+    # The newer page is fetched in full again rather than answered with a 304
+    again = run_refresh([url])
+    assert again["outcome"] == "published" and again["changed_sources"] == [url]
+    assert refresh_daemon.load_state()["urls"][url][-1]["status"] == 200
+
+def test_pipeline_change_rebuilds_unchanged_pages(index_root, grant_page, monkeypatch):
+    port = grant_page.server_address[1]
+    edg, sfec = f"http://127.0.0.1:{port}/edg", f"http://127.0.0.1:{port}/sfec"
+    monkeypatch.setattr(ConcurrentFetcher, "_retry_delay", lambda self, attempt, response=None: 0)
+    monkeypatch.setitem(vectorstore.url_metadata_map, edg, "Enterprise Development Grant")
+    monkeypatch.setitem(vectorstore.url_metadata_map, sfec, "SkillsFuture Enterprise Credit")
+    first = run_refresh([edg, sfec])
+    assert vectorstore.read_manifest(first["version"])["pipeline"] == vectorstore.pipeline_version()
+    assert run_refresh([edg, sfec])["outcome"] == "unchanged"
+
+    # Same page text, new grant title for one page while the other is unreachable
+    monkeypatch.setitem(vectorstore.url_metadata_map, edg, "EDG (renamed)")
+    grant_page.down = {"/sfec"}
+    second = run_refresh([edg, sfec])
+    assert second["outcome"] == "published" and second["changed_sources"] == []
+    assert refresh_daemon.load_state()["urls"][edg][-1]["status"] == 200
+    titles = {meta["source"]: meta["grant_title"] for meta in retriever_module.get_vectorstore().get()["metadatas"]}
+    assert titles[edg] == "EDG (renamed)" and titles[sfec] == "SkillsFuture Enterprise Credit"
+
+    # A new embedding model re-embeds everything, not just changed chunks
+    grant_page.down = set()
+    monkeypatch.setattr(HashEmbeddings, "model_name", "hash-16-v2")
+    third = run_refresh([edg, sfec])
+    assert third["outcome"] == "published"
+    assert vectorstore.read_manifest(third["version"])["embedding_model"] == "hash-16-v2"
+    assert run_refresh([edg, sfec])["outcome"] == "unchanged"
+
+def test_overlapping_runs_are_skipped_and_stale_locks_taken_over(index_root):
+    holder = RefreshLock()
+    assert holder.acquire()
+    assert run_refresh([])["outcome"] == "skipped"
+    assert refresh_daemon.load_state()["last_run"] is None
+    holder.release()
+
+    # A lock left by a process that no longer exists does not block the next run
+    with open(RefreshLock().path, "w", encoding="utf-8") as f:
+        f.write('{"pid": 999999999, "host": "%s", "started": %f}' % (refresh_daemon.socket.gethostname(), time.time()))
+    assert run_refresh([])["outcome"] == "published"
+    assert not os.path.exists(RefreshLock().path)
+
+def test_stale_lock_is_taken_over_by_exactly_one_process(index_root):
+    path = RefreshLock().path
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write('{"pid": 1, "host": "elsewhere", "started": 0}')
+
+    barrier = threading.Barrier(8)
+    locks = [RefreshLock() for _ in range(8)]
+
+    def contend(lock):
+        barrier.wait()
+        return lock.acquire()
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        acquired = list(pool.map(contend, locks))
+    assert acquired.count(True) == 1
+    winner = locks[acquired.index(True)]
+    assert RefreshLock().holder()["token"] == winner.token
+
+    # A holder whose lock was taken over does not delete its successor's lock
+    superseded = RefreshLock()
+    superseded.acquired, superseded.token = True, "old"
+    superseded.release()
+    assert RefreshLock().holder()["token"] == winner.token
+    winner.release()
+    assert not os.path.exists(path)
+
+def test_manual_and_once_runs_take_the_lock_and_report_failures(index_root, monkeypatch):
+    monkeypatch.setattr(vectorstore, "urls_to_scrape", [])
+    holder = RefreshLock()
+    assert holder.acquire()
+    assert vectorstore.main([]) == 1
+    assert refresh_daemon.main(["once", "--urls"]) == 1
+    holder.release()
+
+    monkeypatch.setattr(vectorstore, "validate_index", lambda db, lexical_index: ["smoke test failed"])
+    assert refresh_daemon.main(["once", "--urls"]) == 1
+    assert refresh_daemon.load_state()["last_run"]["outcome"] == "invalid"
+
+def test_schedule_applies_jitter_and_status_reports_the_last_run(index_root, capsys):
+    scheduler = build_scheduler(lambda: None, interval_minutes=60, jitter_minutes=10)
+    delay = (scheduler.next_run - datetime.datetime.now()).total_seconds() / 60
+    assert 49.9 <= delay <= 70
+
+    runs, stop = [], threading.Event()
+    thread = threading.Thread(target=run_daemon, kwargs={
+        "interval_minutes": 60, "jitter_minutes": 10, "stop": stop, "job": lambda: runs.append(run_refresh([])),
+    })
+    thread.start()
+    time.sleep(0.5)
+    stop.set()
+    thread.join(timeout=5)
+
+    assert [run["outcome"] for run in runs] == ["published"]
+    state = refresh_daemon.load_state()
+    assert state["last_run"]["outcome"] == "published" and state["next_run_at"]
+    refresh_daemon.main(["status"])
+    assert "Last refresh" in capsys.readouterr().out
@@ -0,0 +1,289 @@
+import time
+import asyncio
+import threading
+
+import pytest
+from langchain_core.messages import AIMessageChunk
+
+from helper_functions import async_qa, clients, qa_chain, resilience, tracing
+from helper_functions.answer_cache import AnswerCache
+from helper_functions.benchmark_retrieval import offline_pipeline
+from helper_functions.test_streaming import DOCS as STREAM_DOCS, _FixedRetriever
+from helper_functions.resilience import CircuitBreaker, CircuitOpenError, DeadlineExceeded, call_llm
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+class ServerError(Exception):
+    status_code = 503
+
+class BadRequest(Exception):
+    status_code = 400
+
+@pytest.fixture(autouse=True)
+def fresh_state():
+    resilience.llm_breaker.reset()
+    resilience.latency_trackers.clear()
+    yield
+    resilience.llm_breaker.reset()
+    resilience.latency_trackers.clear()
+
+def _eventually(condition, polls=5000):
+    for _ in range(polls):
+        if condition():
+            return True
+        time.sleep(0.001)
+    return False
+
+def _blocked_then_fast(release):
+    """The first attempt hangs until `release` is set; later attempts answer at once."""
+    calls = []
+
+    def upstream():
+        calls.append(threading.current_thread().name)
+        if len(calls) == 1:
+            release.wait()
+            return "slow"
+        return "fast"
+    return upstream, calls
+
+def test_hedging_cuts_the_tail(monkeypatch):
+    monkeypatch.setattr(resilience, "hedge_default_delay", 0.01)
+    release = threading.Event()
+    upstream, calls = _blocked_then_fast(release)
+    try:
+        # The hedge answers while the first attempt is still stuck
+        assert call_llm(upstream, name="hedged", breaker=CircuitBreaker()) == "fast"
+        assert len(calls) == 2 and not release.is_set()
+    finally:
+        release.set()
+
+    monkeypatch.setattr(resilience, "max_attempts", 1)
+    release = threading.Event()
+    upstream, calls = _blocked_then_fast(release)
+    threading.Timer(0.05, release.set).start()
+    assert call_llm(upstream, name="unhedged", breaker=CircuitBreaker()) == "slow"
+    assert len(calls) == 1
+
+def test_hedges_are_capped_and_their_slots_returned(monkeypatch):
+    monkeypatch.setattr(resilience, "hedge_default_delay", 0.01)
+    monkeypatch.setattr(resilience, "max_hedges_in_flight", 1)
+    first_release, second_release = threading.Event(), threading.Event()
+
+    def both_hang():
+        first_release.wait()
+        return "late"
+
+    try:
+        # A call whose attempt and hedge both hang holds the only hedge slot...
+        hung = resilience._executor.submit(call_llm, both_hang, name="hung", breaker=CircuitBreaker())
+        assert _eventually(lambda: resilience._hedges_in_flight == 1)
+
+        # ...so the next slow call waits for its one attempt instead of hedging
+        upstream, calls = _blocked_then_fast(second_release)
+        threading.Timer(0.05, second_release.set).start()
+        assert call_llm(upstream, name="capped", breaker=CircuitBreaker()) == "slow"
+        assert len(calls) == 1
+    finally:
+        first_release.set()
+        second_release.set()
+
+    assert hung.result() == "late"
+    assert _eventually(lambda: resilience._hedges_in_flight == 0)
+
+def test_failed_attempts_are_retried_and_traced():
+    tracing.reset()
+    tracing.enable()
+    try:
+        outcomes = iter([ServerError("HTTP 503"), "answer"])
+
+        def flaky():
+            outcome = next(outcomes)
+            if isinstance(outcome, Exception):
+                raise outcome
+            return outcome
+
+        breaker = CircuitBreaker()
+        assert call_llm(flaky, breaker=breaker) == "answer"
+        assert breaker.state == "closed" and breaker.failures == 0
+        assert tracing.error_counts() == {("llm_attempt", "ServerError"): 1}
+
+        # Bad requests and other client errors are neither retried nor held against the upstream
+        for error in (BadRequest("invalid prompt"), ValueError("bad request")):
+            calls, breaker = [], CircuitBreaker(1)
+
+            def refused():
+                calls.append(1)
+                raise error
+
+            with pytest.raises(type(error)):
+                call_llm(refused, breaker=breaker)
+            assert calls == [1] and breaker.state == "closed" and breaker.failures == 0
+    finally:
+        tracing.disable()
+        tracing.reset()
+
+def test_retries_back_off_with_jitter(monkeypatch):
+    monkeypatch.setattr(resilience, "retry_backoff_seconds", 0.05)
+    monkeypatch.setattr(resilience.random, "uniform", lambda low, high: low)
+
+    def flaky(starts):
+        def upstream():
+            starts.append(time.perf_counter())
+            if len(starts) < 3:
+                raise ServerError("HTTP 503")
+            return "answer"
+        return upstream
+
+    async def aflaky(starts):
+        return flaky(starts)()
+
+    sync_starts, async_starts = [], []
+    assert call_llm(flaky(sync_starts), breaker=CircuitBreaker()) == "answer"
+    assert asyncio.run(resilience.acall_llm(aflaky, async_starts, breaker=CircuitBreaker())) == "answer"
+    for starts in (sync_starts, async_starts):
+        # Half of 0.05s after the first failure, then half of 0.1s after the second
+        gaps = [later - earlier for earlier, later in zip(starts, starts[1:])]
+        assert gaps[0] >= 0.025 and gaps[1] >= 0.05
+
+def test_chat_client_is_bounded_by_the_deadline(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+    monkeypatch.setattr(clients, "llm", None)
+    llm = clients.get_llm()
+    assert llm.request_timeout == resilience.request_deadline_seconds
+    assert llm.max_retries == 0
+
+def test_retryable_errors():
+    assert resilience.is_retryable(TimeoutError()) and resilience.is_retryable(ConnectionError())
+    assert resilience.is_retryable(ServerError()) and not resilience.is_retryable(BadRequest())
+    assert resilience.is_retryable(type("APITimeoutError", (Exception,), {})())
+    assert not resilience.is_retryable(type("AuthenticationError", (Exception,), {"status_code": 401})())
+    assert not resilience.is_retryable(RuntimeError("boom"))
+
+def test_stages_share_the_request_deadline(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(resilience, "clock", clock)
+    with resilience.deadline(1.0):
+        with resilience.stage("retrieval") as retrieval:
+            assert retrieval.remaining() == pytest.approx(0.35)
+            clock.now += 0.1
+        with resilience.stage("generation") as generation:
+            assert generation.remaining() == pytest.approx(0.9)
+
+    # Out of time: no attempt is started, even though none is pending
+    calls = []
+    with resilience.deadline(0.5):
+        clock.now += 0.5
+        with pytest.raises(DeadlineExceeded):
+            call_llm(lambda: calls.append(1), breaker=CircuitBreaker())
+    assert calls == []
+
+def test_a_hung_attempt_runs_out_the_deadline():
+    release = threading.Event()
+    breaker = CircuitBreaker()
+    try:
+        with resilience.deadline(0.05), pytest.raises(DeadlineExceeded):
+            call_llm(release.wait, breaker=breaker)
+        assert breaker.failures == 1
+    finally:
+        release.set()
+
+def test_breaker_fails_fast_then_lets_a_trial_through(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(resilience, "clock", clock)
+    breaker = CircuitBreaker(failure_threshold=2, cooldown=30)
+    calls = []
+    breaker.record_failure()
+    breaker.record_failure()
+
+    assert breaker.state == "open"
+    with pytest.raises(CircuitOpenError):
+        call_llm(lambda: calls.append(1), breaker=breaker)
+    assert calls == [] and breaker.rejected == 1
+
+    clock.now += 30
+    breaker.before_call()
+    assert breaker.state == "half_open"
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    breaker.record_success()
+    assert breaker.state == "closed"
+    assert call_llm(lambda: "answer", breaker=breaker) == "answer"
+
+def test_async_hedge_wins_and_the_slow_attempt_is_cancelled(monkeypatch):
+    monkeypatch.setattr(resilience, "hedge_default_delay", 0.01)
+    started, cancelled = [], []
+
+    async def scenario():
+        release = asyncio.Event()
+
+        async def upstream():
+            started.append(len(started))
+            if len(started) == 1:
+                try:
+                    await release.wait()
+                except asyncio.CancelledError:
+                    cancelled.append(True)
+                    raise
+            return len(started)
+
+        result = await resilience.acall_llm(upstream, breaker=CircuitBreaker())
+        await asyncio.sleep(0)
+        return result
+
+    assert asyncio.run(scenario()) == 2
+    assert cancelled == [True]
+    assert resilience._hedges_in_flight == 0
+
+class _StalledStream:
+    """Chat chunks that stop after `tokens` until `release` is set."""
+
+    def __init__(self, tokens, release):
+        self.tokens, self.release = tokens, release
+
+    def __call__(self, prompt, **kwargs):
+        for token in self.tokens:
+            yield AIMessageChunk(content=token)
+        self.release.wait()
+        yield AIMessageChunk(content=" late")
+
+@pytest.mark.parametrize("tokens,limit", [([], "stream_first_token_seconds"), (["Grant", " Description"], "stream_total_seconds")])
+def test_stalled_stream_degrades_to_the_passages(monkeypatch, tokens, limit):
+    release = threading.Event()
+    monkeypatch.setattr(resilience, limit, 0.05)
+    monkeypatch.setattr(clients, "llm", type("StalledLLM", (), {"stream": _StalledStream(tokens, release)})())
+    monkeypatch.setattr(qa_chain, "get_retriever", lambda grant_filter=None, section=None: _FixedRetriever(docs=STREAM_DOCS))
+    monkeypatch.setattr(qa_chain, "answer_cache", AnswerCache(version_fn=lambda: "v1"))
+    try:
+        events = list(qa_chain.stream_final_response("How do I apply for the CTC grant?"))
+    finally:
+        release.set()
+
+    assert "".join(e["text"] for e in events if e["type"] == "token") == "".join(tokens)
+    replace = [e for e in events if e["type"] == "replace"]
+    assert replace and replace[0]["text"].startswith(qa_chain.degraded_notice)
+    assert "https://www.e2i.com.sg/ctc/" in replace[0]["text"]
+    assert resilience.llm_breaker.failures == 1
+
+def test_slow_llm_gets_a_degraded_answer_with_sources(monkeypatch):
+    question = "Who is eligible for the Enterprise Development Grant?"
+    with offline_pipeline() as llm:
+        healthy = qa_chain.get_final_response(question)
+        monkeypatch.setattr(resilience, "request_deadline_seconds", 0.4)
+        llm.latency = 1.0
+
+        start = time.perf_counter()
+        answer = qa_chain.get_final_response(question)
+        elapsed = time.perf_counter() - start
+        async_answer = asyncio.run(async_qa.aget_final_response(question))
+
+    assert not healthy.startswith(qa_chain.degraded_notice)
+    assert elapsed < 0.9
+    for degraded in (answer, async_answer):
+        assert degraded.startswith(qa_chain.degraded_notice)
+        assert "> **Enterprise Development Grant**" in degraded
+        assert "https://" in degraded
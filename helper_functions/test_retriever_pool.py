@@ -0,0 +1,92 @@
+import time
+import statistics
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from langchain_core.retrievers import BaseRetriever
+
+from helper_functions import clients
+from helper_functions import retriever as retriever_module
+from helper_functions import vectorstore
+
+GRANT_FILTERS = [
+    None,
+    "Company Training Committee Grant",
+    "Productivity Solutions Grant",
+    ["Career Conversion Programme for Security Officers", "Company Training Committee Grant"],
+]
+
+class _StaticRetriever(BaseRetriever):
+    def _get_relevant_documents(self, query, *, run_manager):
+        return []
+
+class _SlowChroma:
+    """Stands in for Chroma; opening the persisted collection costs 200ms."""
+    opened = 0
+    lock = threading.Lock()
+
+    def __init__(self, persist_directory=None, embedding_function=None):
+        time.sleep(0.2)
+        with _SlowChroma.lock:
+            _SlowChroma.opened += 1
+
+    def as_retriever(self, search_type=None, search_kwargs=None):
+        return _StaticRetriever()
+
+@pytest.fixture(autouse=True)
+def fresh_pool():
+    # No test may see, or leave behind, a retriever over another test's store
+    retriever_module.invalidate_retrievers()
+    yield
+    retriever_module.invalidate_retrievers()
+
+def _setup(monkeypatch, tmp_path):
+    _SlowChroma.opened = 0
+    monkeypatch.setattr(retriever_module, "Chroma", _SlowChroma)
+    # Nothing is embedded or expanded, so no real client is needed
+    monkeypatch.setattr(clients, "embedding", object())
+    monkeypatch.setattr(clients, "llm", FakeListChatModel(responses=[""]))
+    # The fake stands in for Chroma's own search, not for the in-memory index
+    monkeypatch.setattr(retriever_module, "vector_backend", "chroma")
+    monkeypatch.setattr(vectorstore, "persist_directory", str(tmp_path))
+
+def test_pool_reuses_store_and_retrievers_across_sessions(monkeypatch, tmp_path):
+    _setup(monkeypatch, tmp_path)
+
+    start = time.perf_counter()
+    retriever_module.get_retriever()
+    cold = time.perf_counter() - start
+
+    def session(i):
+        timings = []
+        for j in range(50):
+            grant_filter = GRANT_FILTERS[(i + j) % len(GRANT_FILTERS)]
+            start = time.perf_counter()
+            retriever_module.get_retriever(grant_filter=grant_filter)
+            timings.append(time.perf_counter() - start)
+        return timings
+
+    with ThreadPoolExecutor(max_workers=16) as pool:
+        warm = [t for timings in pool.map(session, range(16)) for t in timings]
+
+    print(f"\n⏱️ Cold setup: {cold * 1000:.1f}ms, warm median: {statistics.median(warm) * 1e6:.1f}µs")
+    assert _SlowChroma.opened == 1
+    assert statistics.median(warm) < 0.001
+    assert retriever_module.get_retriever("Productivity Solutions Grant") is \
+        retriever_module.get_retriever("Productivity Solutions Grant")
+    assert retriever_module.get_retriever([GRANT_FILTERS[1], GRANT_FILTERS[2]]) is \
+        retriever_module.get_retriever([GRANT_FILTERS[2], GRANT_FILTERS[1]])
+
+def test_pool_is_invalidated_when_new_index_is_published(monkeypatch, tmp_path):
+    _setup(monkeypatch, tmp_path)
+
+    before = retriever_module.get_retriever("Productivity Solutions Grant")
+    assert retriever_module.get_retriever("Productivity Solutions Grant") is before
+
+    vectorstore.publish_index_version(str(tmp_path))
+
+    after = retriever_module.get_retriever("Productivity Solutions Grant")
+    assert after is not before
+    assert _SlowChroma.opened == 2
@@ -0,0 +1,144 @@
+import time
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from helper_functions.embedding_cache import CachedEmbeddings
+from helper_functions.load_test import run_duplicate_test
+from helper_functions.single_flight import AsyncSingleFlight, SingleFlight
+
+def _slow(calls, value, delay=0.2, error=None):
+    def fn():
+        calls.append(value)
+        time.sleep(delay)
+        if error:
+            raise error
+        return value
+    return fn
+
+def _concurrently(n, fn):
+    barrier = threading.Barrier(n)
+
+    def call(i):
+        barrier.wait()
+        try:
+            return fn(i)
+        except Exception as error:
+            return error
+    with ThreadPoolExecutor(max_workers=n) as pool:
+        return list(pool.map(call, range(n)))
+
+def test_identical_calls_share_one_computation():
+    flight, calls = SingleFlight(), []
+    results = _concurrently(20, lambda i: flight.do(("psg", i % 2), _slow(calls, i % 2)))
+
+    assert sorted(calls) == [0, 1]
+    assert sorted(value for value, _ in results) == [0] * 10 + [1] * 10
+    assert sum(shared for _, shared in results) == 18
+    assert flight.stats()["followers"] == 18 and flight.in_flight() == 0
+    # Finished keys are forgotten: the next call computes again
+    flight.do(("psg", 0), _slow(calls, 0, delay=0))
+    assert len(calls) == 3
+
+def test_errors_reach_every_waiter():
+    flight, calls = SingleFlight(), []
+    results = _concurrently(10, lambda i: flight.do("q", _slow(calls, i, error=RuntimeError("upstream 503"))))
+
+    assert len(calls) == 1
+    assert all(isinstance(result, RuntimeError) and str(result) == "upstream 503" for result in results)
+    assert flight.do("q", lambda: "recovered") == ("recovered", False)
+
+def test_timeouts_are_per_caller():
+    flight, calls = SingleFlight(), []
+    outcomes = {}
+
+    def leader():
+        try:
+            outcomes["leader"] = flight.do("q", _slow(calls, "answer", delay=0.3), timeout=0.05)
+        except TimeoutError:
+            outcomes["leader"] = "timed out"
+
+    def patient():
+        outcomes["patient"] = flight.do("q", _slow(calls, "unused"))
+
+    threads = [threading.Thread(target=leader)]
+    threads[0].start()
+    time.sleep(0.02)
+    with pytest.raises(TimeoutError):
+        flight.do("q", _slow(calls, "unused"), timeout=0.05)
+    threads.append(threading.Thread(target=patient))
+    threads[1].start()
+    for thread in threads:
+        thread.join()
+
+    # The leader gave up too, but the computation finished for the patient waiter
+    assert outcomes["leader"] == "timed out"
+    assert outcomes["patient"] == ("answer", True)
+    assert calls == ["answer"]
+
+def test_async_flight_shares_results_errors_and_honours_timeouts():
+    flight = AsyncSingleFlight()
+    calls = []
+
+    async def answer(value, delay=0.1, error=None):
+        calls.append(value)
+        await asyncio.sleep(delay)
+        if error:
+            raise error
+        return value
+
+    async def scenario():
+        shared = await asyncio.gather(*(flight.do("q", lambda: answer("a")) for _ in range(10)))
+        failed = await asyncio.gather(*(flight.do("e", lambda: answer("e", error=ValueError("bad"))) for _ in range(5)),
+                                      return_exceptions=True)
+        slow = asyncio.ensure_future(flight.do("s", lambda: answer("s", delay=0.2)))
+        await asyncio.sleep(0)
+        with pytest.raises(asyncio.TimeoutError):
+            await flight.do("s", lambda: answer("unused"), timeout=0.05)
+        return shared, failed, await slow
+
+    shared, failed, slow = asyncio.run(scenario())
+    assert [value for value, _ in shared] == ["a"] * 10 and sum(s for _, s in shared) == 9
+    assert all(isinstance(error, ValueError) for error in failed)
+    assert slow == ("s", False)
+    assert calls == ["a", "e", "s"]
+
+class _CountingEmbedder:
+    model = "counting"
+
+    def __init__(self):
+        self.calls = 0
+
+    def embed_query(self, text):
+        self.calls += 1
+        time.sleep(0.1)
+        return [1.0, float(len(text))]
+
+    def embed_documents(self, texts):
+        self.calls += 1
+        time.sleep(0.1)
+        return [[1.0, float(len(text))] for text in texts]
+
+def test_concurrent_embedding_misses_share_one_upstream_call(tmp_path):
+    embedder = _CountingEmbedder()
+    cache = CachedEmbeddings(embedder, cache_dir=str(tmp_path))
+
+    vectors = _concurrently(8, lambda i: cache.embed_query("What is PSG?"))
+    batches = _concurrently(8, lambda i: cache.embed_documents(["variant one", "variant two"]))
+
+    assert embedder.calls == 2
+    assert all(vector == [1.0, 12.0] for vector in vectors)
+    assert all(batch == [[1.0, 11.0], [1.0, 11.0]] for batch in batches)
+    assert cache.stats()["coalesced"] == 14
+
+def test_upstream_calls_stay_flat_as_duplicate_sessions_grow():
+    coalesced = run_duplicate_test(levels=(1, 10, 30), llm_latency=0.05, embedding_latency=0.01)
+    uncoalesced = run_duplicate_test(levels=(1, 10, 30), llm_latency=0.05, embedding_latency=0.01, coalesce=False)
+
+    first, *rest = coalesced["levels"]
+    assert all(row["llm_calls"] == first["llm_calls"] and row["embedding_calls"] == first["embedding_calls"]
+               for row in rest)
+    assert all(row["distinct_answers"] == 1 for row in coalesced["levels"])
+    assert uncoalesced["levels"][-1]["llm_calls"] > 10 * first["llm_calls"]
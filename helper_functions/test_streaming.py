@@ -0,0 +1,79 @@
+import pytest
+from langchain_core.documents import Document
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from langchain_core.retrievers import BaseRetriever
+
+from helper_functions import clients, qa_chain
+from helper_functions.answer_cache import AnswerCache
+from helper_functions.grant_profiles import GrantProfileStore
+
+class _FixedRetriever(BaseRetriever):
+    docs: list
+
+    def _get_relevant_documents(self, query, *, run_manager):
+        return self.docs
+
+DOCS = [Document(page_content="CTC supports job redesign.",
+                 metadata={"source": "https://www.e2i.com.sg/ctc/", "grant_title": "Company Training Committee Grant"})]
+
+@pytest.fixture(autouse=True)
+def static_profiles(monkeypatch, tmp_path):
+    # An index without saved profiles, so the static catalogue is used and data/ is never read
+    monkeypatch.setattr(qa_chain, "profile_store",
+                        GrantProfileStore(directory_fn=lambda version: str(tmp_path), version_fn=lambda: "v1"))
+
+def _setup(monkeypatch, answer, docs=DOCS, sleep=0.002):
+    llm = FakeListChatModel(responses=[answer], sleep=sleep)
+    monkeypatch.setattr(clients, "llm", llm)
+    monkeypatch.setattr(qa_chain, "get_retriever", lambda grant_filter=None, section=None: _FixedRetriever(docs=docs))
+    monkeypatch.setattr(qa_chain, "answer_cache", AnswerCache(version_fn=lambda: "v1"))
+
+def test_status_then_tokens_then_suggestion_and_sources(monkeypatch):
+    answer = "Grant Description:\nCTC helps companies transform."
+    _setup(monkeypatch, answer)
+
+    events = list(qa_chain.stream_final_response("How do I apply for the CTC grant?"))
+    kinds = [e["type"] for e in events]
+
+    assert kinds[0] == "status"
+    assert kinds[-1] == "done"
+    tokens = [e["text"] for e in events if e["type"] == "token"]
+    assert len(tokens) > len(answer)  # one event per streamed character plus the suffix
+    text = "".join(tokens)
+    assert text.startswith(answer)
+    assert "Complementary Grant Suggestion" in text
+    assert "https://www.e2i.com.sg/ctc/" in text
+
+    done = events[-1]
+    assert 0 < done["time_to_first_token"] < done["total_time"]
+    print(f"\n⏱️ Time to first token: {done['time_to_first_token'] * 1000:.1f}ms, "
+          f"total: {done['total_time'] * 1000:.1f}ms")
+
+def test_fallback_phrase_in_stream_replaces_answer(monkeypatch):
+    _setup(monkeypatch, "Sorry, I cannot answer that from the documents. More text follows here.")
+
+    events = list(qa_chain.stream_final_response("Tell me about the ctc grant"))
+
+    replace = [e for e in events if e["type"] == "replace"]
+    assert replace and replace[0]["text"] == qa_chain.fallback_response
+    streamed = "".join(e["text"] for e in events if e["type"] == "token")
+    assert streamed == "Sorry"  # generation stops once the fallback phrase is seen
+
+def test_no_documents_falls_back_without_calling_llm(monkeypatch):
+    _setup(monkeypatch, "unused", docs=[])
+
+    events = list(qa_chain.stream_final_response("Tell me about the ctc grant"))
+
+    assert [e["type"] for e in events] == ["status", "replace", "done"]
+    assert clients.llm.i == 0
+
+def test_streamed_answer_matches_blocking_answer(monkeypatch):
+    _setup(monkeypatch, "Eligibility Criteria:\n- Companies registered in Singapore.")
+    # A second LLM call would answer differently
+    clients.llm.responses.append("Eligibility Criteria:\n- Anyone.")
+    streamed = "".join(e["text"] for e in qa_chain.stream_final_response("who is eligible for ctc")
+                       if e["type"] == "token")
+    assert streamed.startswith("Eligibility Criteria:")
+
+    # The second call is served from the answer cache populated by the stream
+    assert qa_chain.get_final_response("Who is eligible for CTC?") == streamed
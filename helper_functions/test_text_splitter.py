@@ -0,0 +1,125 @@
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+from helper_functions.bm25_index import BM25Index
+from helper_functions.grant_detector import detect_section_from_question
+from helper_functions.retriever import SectionRetriever, _build_search_kwargs
+from helper_functions.text_splitter import StructureAwareTextSplitter, label_section, split_sections, splitter
+from helper_functions.tokens import count_tokens
+
+PAGE = "\n".join([
+    "Enterprise Development Grant (EDG)",
+    "About this programme",
+    "The Enterprise Development Grant (EDG) supports projects that help you upgrade, innovate and grow.",
+    "Eligibility",
+    "Business entity registered and operating in Singapore",
+    "Company has at least 30% local equity held directly or indirectly by Singaporeans.",
+    "Project categories",
+    "Projects fall under one of three categories described below, each with its own scope.",
+    "Core Capabilities",
+    "Innovation & Productivity",
+    "Market Access",
+    "How to apply",
+    "Submit your application on the Business Grants Portal with the following documents:",
+    "Latest audited financial statements",
+    "Vendor quotations",
+    "Project proposal",
+])
+
+def test_headings_become_sections_and_lists_are_not_headings():
+    headings = [heading for heading, _ in split_sections(PAGE)]
+    assert headings == [None, "About this programme", "Eligibility", "Project categories", "How to apply"]
+
+def test_chunks_carry_section_heading_path_and_position():
+    docs = StructureAwareTextSplitter(min_section_tokens=0).create_documents(
+        [PAGE], [{"grant_title": "Enterprise Development Grant"}]
+    )
+    by_section = {doc.metadata["section"]: doc for doc in docs}
+
+    eligibility = by_section["eligibility"]
+    assert eligibility.page_content.startswith("Eligibility\nBusiness entity registered")
+    assert eligibility.metadata["heading_path"] == "Enterprise Development Grant (EDG) > Eligibility"
+    assert eligibility.metadata["grant_title"] == "Enterprise Development Grant"
+    assert by_section["application"].page_content.endswith("Vendor quotations\nProject proposal")
+    assert [doc.metadata["position"] for doc in docs] == list(range(len(docs)))
+
+def test_long_sections_split_on_list_boundaries_within_token_budget():
+    items = [f"Supporting document number {i} for the claim" for i in range(40)]
+    text = "\n".join(["Grant", "How to apply", "Prepare the following documents:", *items,
+                      "Then submit the claim on the portal once every document is ready:", *items])
+    small = StructureAwareTextSplitter(chunk_size=120)
+    chunks = small.split_text(text)
+
+    assert len(chunks) > 2
+    assert all(count_tokens(chunk) <= 120 for chunk in chunks)
+    assert all(chunk.startswith("How to apply\n") for chunk in chunks)
+    # The second list starts a fresh chunk instead of trailing the first one
+    assert any(chunk.split("\n")[1].startswith("Then submit") for chunk in chunks)
+
+def test_sections_are_labelled_from_heading_phrases_only():
+    assert label_section("How to apply") == "application"
+    assert label_section("About the grant") == "description"
+    assert label_section("Apply the funding to approved vendors") == "general"
+    assert label_section("Frequently asked questions about claims") == "general"
+
+def test_short_sections_keep_their_label_when_merged():
+    text = "\n".join([
+        "Grant",
+        "Eligibility",
+        "Singapore-registered companies.",
+        "How to apply",
+        "Submit your application on the Business Grants Portal with the supporting documents listed there.",
+        "Apply now",
+        "Submit the form online.",
+    ])
+    sections = StructureAwareTextSplitter(min_section_tokens=10).split_with_metadata(text)
+    (eligibility, first), (application, second), last = sections
+
+    # The short eligibility section stands alone instead of opening the application section
+    assert first["section"] == "eligibility" and eligibility.endswith("Singapore-registered companies.")
+    assert second["section"] == "application" and application.startswith("How to apply\nSubmit")
+    # A short last section has nothing to merge into and keeps its own heading
+    assert last == ("Apply now\nSubmit the form online.",
+                    {"section": "application", "heading_path": "Grant > Apply now", "position": 2})
+
+def test_bundled_pages_label_eligibility_and_application_sections():
+    with open("data/scraped_pages/www.enterprisesg.gov.sg_financial-support_enterprise-development-grant.txt",
+              encoding="utf-8") as f:
+        sections = {metadata["section"] for _, metadata in splitter.split_with_metadata(f.read())}
+    assert {"eligibility", "application", "description"} <= sections
+
+def test_section_intent_detection():
+    assert detect_section_from_question("Who is eligible for the EDG?") == "eligibility"
+    assert detect_section_from_question("Who can apply for CTC?") == "eligibility"
+    assert detect_section_from_question("How do I apply for PSG?") == "application"
+    assert detect_section_from_question("What does SFQB cover?") is None
+
+def test_section_filter_combines_with_grant_filter():
+    kwargs = _build_search_kwargs(("EDG", "PSG"), "eligibility")
+    assert kwargs["filter"] == {"$and": [
+        {"$or": [{"grant_title": "EDG"}, {"grant_title": "PSG"}]}, {"section": "eligibility"}
+    ]}
+    assert _build_search_kwargs(None, "application")["filter"] == {"section": "application"}
+
+class _Fixed(BaseRetriever):
+    docs: list
+
+    def _get_relevant_documents(self, query, *, run_manager):
+        return list(self.docs)
+
+def test_section_search_is_topped_up_when_the_section_is_sparse():
+    lexical = BM25Index.from_documents([
+        Document(page_content="EDG eligibility local equity", metadata={"section": "eligibility"}),
+        Document(page_content="EDG eligible project costs", metadata={"section": "general"}),
+    ])
+    assert [doc.metadata["section"] for doc, _ in lexical.search("EDG", sections=("eligibility",))] == ["eligibility"]
+
+    section_doc = Document(page_content="Eligibility", metadata={"source": "a"})
+    other_docs = [Document(page_content=f"Other {i}", metadata={"source": "a"}) for i in range(5)]
+    retriever = SectionRetriever(section_retriever=_Fixed(docs=[section_doc]),
+                                 retriever=_Fixed(docs=[section_doc, *other_docs]),
+                                 section="eligibility", k=4, min_docs=3)
+    assert [doc.page_content for doc in retriever.invoke("q")] == ["Eligibility", "Other 0", "Other 1", "Other 2"]
+
+    retriever.min_docs = 1
+    assert retriever.invoke("q") == [section_doc]
@@ -0,0 +1,79 @@
+import json
+import time
+import urllib.request
+
+import pytest
+
+from helper_functions import qa_chain, tracing
+from helper_functions.answer_cache import AnswerCache
+from helper_functions.benchmark_retrieval import offline_pipeline
+
+@pytest.fixture
+def traced(monkeypatch):
+    monkeypatch.setattr(tracing, "enabled", True)
+    tracing.reset()
+    yield
+    tracing.reset()
+
+def test_disabled_spans_record_nothing_and_are_cheap(monkeypatch):
+    monkeypatch.setattr(tracing, "enabled", False)
+    tracing.reset()
+
+    rounds = 100000
+    start = time.perf_counter()
+    for _ in range(rounds):
+        with tracing.span("detection", grant="x") as s:
+            s.set(outcome="ok")
+    per_span = (time.perf_counter() - start) / rounds
+
+    print(f"\n⏱️ Disabled span overhead: {per_span * 1e9:.0f}ns")
+    assert tracing.recorded_spans() == []
+    assert per_span < 2e-6
+
+def test_answer_path_records_every_stage(traced, tmp_path):
+    with offline_pipeline():
+        tracing.reset()  # drop the spans of building the index
+        answer = qa_chain.get_final_response("How do I apply for the Company Training Committee Grant?")
+    assert answer.startswith("Grant Description:")
+
+    spans = tracing.recorded_spans()
+    names = {s["name"] for s in spans}
+    assert {"answer", "detection", "retriever_construction", "vector_search",
+            "llm_completion", "complementary_grant"} <= names
+
+    root = next(s for s in spans if s["name"] == "answer")
+    assert root["attributes"]["outcome"] == "answered"
+    assert all(s["trace_id"] == root["trace_id"] for s in spans)
+
+    path = str(tmp_path / "spans.jsonl")
+    assert tracing.export_jsonl(path) == len(spans)
+    with open(path, encoding="utf-8") as f:
+        assert json.loads(f.readline())["duration_ms"] >= 0
+
+def test_swallowed_errors_are_recorded_by_type(traced, monkeypatch):
+    def broken_chain(question):
+        raise TimeoutError("upstream timed out")
+
+    monkeypatch.setattr(qa_chain, "answer_cache", AnswerCache(version_fn=lambda: "v1"))
+    monkeypatch.setattr(qa_chain, "build_qa_chain", broken_chain)
+
+    assert qa_chain.get_final_response("What is PSG?") == qa_chain.fallback_response
+
+    root = next(s for s in tracing.recorded_spans() if s["name"] == "answer")
+    assert root["error_type"] == "TimeoutError"
+    assert 'eurus_stage_errors_total{stage="answer",error_type="TimeoutError"} 1' in tracing.prometheus_text()
+
+def test_metrics_endpoint_serves_prometheus_text(traced):
+    with tracing.span("llm_completion") as s:
+        s.set(prompt_tokens=120, completion_tokens=30)
+
+    server = tracing.serve_metrics(port=0)
+    try:
+        url = f"http://127.0.0.1:{server.server_address[1]}/metrics"
+        body = urllib.request.urlopen(url, timeout=5).read().decode()
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    assert 'eurus_stage_duration_seconds_count{stage="llm_completion"} 1' in body
+    assert 'eurus_llm_tokens_total{stage="llm_completion",kind="prompt_tokens"} 120' in body
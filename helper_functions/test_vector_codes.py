@@ -0,0 +1,107 @@
+import os
+import hashlib
+
+import numpy as np
+from langchain_chroma import Chroma
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+from helper_functions import benchmark_vector_codes, retriever, vector_codes
+from helper_functions.benchmark_retrieval import offline_pipeline
+from helper_functions.numpy_index import NumpyVectorIndex, build_vector_codes
+from helper_functions.retriever import _build_search_kwargs
+from helper_functions.vector_codes import BinaryCodes, Int8Codes
+
+GRANTS = ["Productivity Solutions Grant", "Enterprise Development Grant", "Company Training Committee Grant"]
+
+class RandomEmbeddings(Embeddings):
+    """Dense unit-length pseudo-random vectors seeded by the text."""
+
+    def embed_query(self, text):
+        seed = int(hashlib.sha256(text.encode()).hexdigest()[:8], 16)
+        vector = np.random.default_rng(seed).normal(size=100)
+        return (vector / np.linalg.norm(vector)).tolist()
+
+    def embed_documents(self, texts):
+        return [self.embed_query(text) for text in texts]
+
+def _chroma(tmp_path, chunks=150):
+    docs = [Document(page_content=f"{GRANTS[i % 3]} chunk {i}", metadata={"grant_title": GRANTS[i % 3], "source": f"https://{i}"})
+            for i in range(chunks)]
+    db = Chroma(persist_directory=str(tmp_path / "db"), embedding_function=RandomEmbeddings(),
+                collection_metadata={"hnsw:space": "cosine"})
+    db.add_documents(docs)
+    return db
+
+def test_code_scores_approximate_exact_dot_products():
+    rng = np.random.default_rng(0)
+    matrix = rng.normal(size=(200, 101)).astype(np.float32)
+    matrix /= np.linalg.norm(matrix, axis=1, keepdims=True)
+    queries, rows = matrix[:3] + 0.01, np.arange(20, 180)
+    exact = queries @ matrix[rows].T
+
+    int8 = Int8Codes.encode(matrix)
+    assert int8.codes.dtype == np.int8 and int8.nbytes < matrix.nbytes / 3.5
+    assert np.abs(int8.scores(queries, rows) - exact).max() < 0.02
+
+    binary = BinaryCodes.encode(matrix)
+    assert binary.codes.shape == (200, 13) and binary.nbytes < matrix.nbytes / 8
+    signs = np.unpackbits(binary.codes, axis=1, count=101).astype(np.float32) * 2 - 1
+    assert np.allclose(binary.scores(queries, rows), (queries - binary.thresholds) @ signs[rows].T, atol=1e-4)
+    assert np.corrcoef(binary.scores(queries, rows).ravel(), exact.ravel())[0, 1] > 0.7
+
+def test_memory_mapped_codes_rerank_to_full_precision_results(tmp_path):
+    db = _chroma(tmp_path)
+    directory = str(tmp_path / "codes")
+    full = build_vector_codes(db, directory)
+
+    for quantization in vector_codes.quantizations:
+        index = NumpyVectorIndex.from_codes(db, directory, quantization)
+        assert isinstance(index.matrix, np.memmap) and isinstance(index.codes.codes, np.memmap)
+        assert index.documents == full.documents and index.partitions == full.partitions
+        for key in (None, (GRANTS[1],), tuple(GRANTS[:2])):
+            where = _build_search_kwargs(key).get("filter")
+            for query in ["How do I apply?", "Who is eligible for funding?"]:
+                top = index.similarity_search(query, k=5, filter=where)
+                expected = full.similarity_search(query, k=5, filter=where)
+                assert len({doc.id for doc in top} & {doc.id for doc in expected}) >= 4
+                if quantization == "int8":
+                    assert top == expected
+                    assert index.max_marginal_relevance_search(query, k=7, fetch_k=20, filter=where) == \
+                        full.max_marginal_relevance_search(query, k=7, fetch_k=20, filter=where)
+
+def test_missing_stale_or_unfinished_codes_are_not_used(tmp_path):
+    db = _chroma(tmp_path, chunks=30)
+    directory = str(tmp_path / "codes")
+    assert NumpyVectorIndex.from_codes(db, directory) is None
+
+    build_vector_codes(db, directory)
+    assert NumpyVectorIndex.from_codes(db, directory, "none").codes is None
+    db.add_documents([Document(page_content="A new chunk", metadata={"grant_title": GRANTS[0]})])
+    assert NumpyVectorIndex.from_codes(db, directory) is None
+
+    build_vector_codes(db, directory)
+    assert len(NumpyVectorIndex.from_codes(db, directory)) == 31
+    os.remove(os.path.join(directory, "rows.json"))
+    assert NumpyVectorIndex.from_codes(db, directory) is None
+
+def test_retriever_serves_from_codes_when_configured(monkeypatch):
+    question = "Who is eligible for the Enterprise Development Grant?"
+    with offline_pipeline():
+        full = retriever.get_retriever().invoke(question)
+        monkeypatch.setattr(retriever, "vector_quantization", "int8")
+        retriever.invalidate_retrievers()
+        index = retriever.get_vector_index()
+        quantized = retriever.get_retriever().invoke(question)
+
+    assert isinstance(index.matrix, np.memmap) and index.codes.name == "int8"
+    assert [doc.page_content for doc in quantized] == [doc.page_content for doc in full]
+
+def test_benchmark_reports_memory_saved_and_recall_on_the_bundled_corpus():
+    results = benchmark_vector_codes.run_benchmark(dimensions=256, repeats=1)
+    benchmark_vector_codes.print_report(results)
+
+    assert results["chunks"] > 200
+    assert results["memory_saved"]["int8"] > 0.7 and results["memory_saved"]["binary"] > 0.9
+    for name, floor in benchmark_vector_codes.min_recall.items():
+        assert results["recall@k"][name]["similarity"] >= floor
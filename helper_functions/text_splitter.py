@@ -1,15 +1,174 @@
-from langchain.text_splitter import RecursiveCharacterTextSplitter
+from langchain.text_splitter import RecursiveCharacterTextSplitter, TextSplitter
 from langchain.schema import Document
 import re
 
-splitter = RecursiveCharacterTextSplitter(chunk_size=500, chunk_overlap=50)
+from helper_functions.tokens import count_tokens
+
+# Recorded in every index manifest: bump it whenever a change to the chunking rules changes
+# the chunks of existing pages, so the next refresh re-chunks pages whose text is unchanged
+SPLITTER_VERSION = 2
+
+# Chunk sizes in tokens
+chunk_max_tokens = 300
+# Sections smaller than this are merged into the section that follows them, unless that
+# would put them under a heading with another section label
+section_min_tokens = 25
+# A heading is a short line without closing punctuation that introduces longer text
+heading_max_words = 8
+heading_max_chars = 70
 
 def label_section(text):
-    if re.search(r'\b(eligibility|eligible|who can apply)\b', text, re.I):
+    # Heading phrases only: a bare "apply" or "about" also turns up in headings of other sections
+    if re.search(r'\b(eligibility|eligible|who can apply|criteria|qualify)\b', text, re.I):
         return "eligibility"
-    elif re.search(r'\b(application|how to apply|steps)\b', text, re.I):
+    elif re.search(r'\b(application|how to apply|apply now|steps)\b', text, re.I):
         return "application"
-    elif re.search(r'\b(overview|introduction|objective|grant description)\b', text, re.I):
+    elif re.search(r'\b(overview|introduction|objective|grant description'
+                   r'|about (the|this) (grant|programme|program|scheme|initiative))\b', text, re.I):
         return "description"
     else:
-        return "general"
\ No newline at end of file
+        return "general"
+
+def _is_short(line):
+    return len(line) <= heading_max_chars and len(line.split()) <= heading_max_words
+
+def is_heading(line, next_line, previous_line=None, previous_is_heading=False):
+    """
+    A heading is a short line without closing punctuation followed by a longer line or a
+    list lead-in. Right after another heading, a list lead-in or a list-like line, only
+    lines naming a known section (see label_section) count as headings.
+    """
+    if not _is_short(line) or line[-1] in ".,;:!?)" or not (line[0].isupper() or line[0].isdigit()):
+        return False
+    if next_line is None or not (next_line[0].isupper() or next_line[0].isdigit()):
+        return False
+    if not (len(next_line) >= 2 * len(line) or next_line.endswith(":")):
+        return False
+    in_list = previous_line is not None and (previous_line.endswith(":") or (
+        len(previous_line) <= 2 * heading_max_chars and previous_line[-1] not in ".;!?)"
+    ))
+    if previous_is_heading or in_list:
+        return label_section(line) != "general"
+    return True
+
+def split_sections(text):
+    """
+    Splits extracted page text (one block per line) into (heading, lines) sections.
+    Lines before the first heading form a section with heading None.
+    """
+    lines = [line.strip() for line in text.splitlines() if line.strip()]
+    sections = [(None, [])]
+    previous_is_heading = False
+    for i, line in enumerate(lines):
+        next_line = lines[i + 1] if i + 1 < len(lines) else None
+        previous_line = lines[i - 1] if i else None
+        previous_is_heading = is_heading(line, next_line, previous_line, previous_is_heading)
+        if previous_is_heading:
+            sections.append((line, []))
+        else:
+            sections[-1][1].append(line)
+    return [(heading, body) for heading, body in sections if heading or body]
+
+def _units(lines):
+    """
+    Groups lines into units that are kept together when possible: a line ending in ":"
+    starts a list that runs until the next lead-in line.
+    """
+    units = []
+    for line in lines:
+        if units and units[-1][0].endswith(":") and not line.endswith(":"):
+            units[-1].append(line)
+        else:
+            units.append([line])
+    return units
+
+class StructureAwareTextSplitter(TextSplitter):
+    """
+    Splits page text along its own headings and lists instead of at fixed character
+    offsets. Each chunk stays within one section, starts with that section's heading,
+    and carries `section` (from label_section), `heading_path` and `position` metadata.
+    Sizes are measured in tokens.
+    """
+
+    def __init__(self, chunk_size=None, min_section_tokens=None, **kwargs):
+        super().__init__(chunk_size=chunk_size or chunk_max_tokens, chunk_overlap=0,
+                         length_function=count_tokens, **kwargs)
+        self._min_section_tokens = section_min_tokens if min_section_tokens is None else min_section_tokens
+        self._fallback = RecursiveCharacterTextSplitter(
+            chunk_size=self._chunk_size, chunk_overlap=min(30, self._chunk_size // 10),
+            length_function=count_tokens, separators=["\n", ". ", "; ", " "]
+        )
+
+    def _merged_sections(self, text):
+        """
+        Sections of `text`, each short one merged into the next unless its label would be
+        lost: it only merges when it has no label of its own or the same one as the next.
+        """
+        merged, carry = [], None
+        for heading, body in split_sections(text):
+            lines = body
+            if carry:
+                carry_heading, carry_lines = carry
+                carry_label = label_section(carry_heading) if carry_heading else "general"
+                if carry_label in ("general", label_section(heading)):
+                    lines = ([carry_heading] if carry_heading else []) + carry_lines + body
+                else:
+                    merged.append(carry)
+            carry = None
+            size = self._length_function("\n".join(([heading] if heading else []) + lines))
+            if size < self._min_section_tokens:
+                carry = (heading, lines)
+                continue
+            merged.append((heading, lines))
+        if carry:
+            merged.append(carry)
+        return merged
+
+    def _pack(self, heading, lines):
+        budget = self._chunk_size - (self._length_function(heading) if heading else 0)
+        chunks, current, current_size = [], [], 0
+        for unit in _units(lines):
+            pieces = [unit]
+            unit_size = self._length_function("\n".join(unit))
+            if unit_size > budget:
+                # Oversized list or paragraph: split at line, then sentence boundaries
+                pieces = [[piece] for piece in self._fallback.split_text("\n".join(unit))]
+            for piece in pieces:
+                size = self._length_function("\n".join(piece))
+                if current and current_size + size > budget:
+                    chunks.append(current)
+                    current, current_size = [], 0
+                current.extend(piece)
+                current_size += size
+        if current:
+            chunks.append(current)
+        return ["\n".join(([heading] if heading else []) + chunk) for chunk in chunks]
+
+    def split_with_metadata(self, text):
+        """
+        Returns (chunk_text, metadata) pairs for `text`.
+        """
+        lines = [line.strip() for line in text.splitlines() if line.strip()]
+        title = lines[0] if lines else ""
+        results = []
+        for heading, body in self._merged_sections(text):
+            for chunk in self._pack(heading, body):
+                results.append((chunk, {
+                    "section": label_section(heading) if heading else "general",
+                    "heading_path": f"{title} > {heading}" if heading and heading != title else title,
+                    "position": len(results),
+                }))
+        return results
+
+    def split_text(self, text):
+        return [chunk for chunk, _ in self.split_with_metadata(text)]
+
+    def create_documents(self, texts, metadatas=None):
+        documents = []
+        for i, text in enumerate(texts):
+            base = metadatas[i] if metadatas else {}
+            for chunk, metadata in self.split_with_metadata(text):
+                documents.append(Document(page_content=chunk, metadata={**base, **metadata}))
+        return documents
+
+splitter = StructureAwareTextSplitter()
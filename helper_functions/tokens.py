@@ -0,0 +1,32 @@
+import threading
+
+# Encoding used by the OpenAI embedding models
+encoding_name = "cl100k_base"
+# Rough characters per token, used when the tiktoken encoding cannot be loaded
+chars_per_token = 4
+
+_lock = threading.Lock()
+_encoding = None
+_loaded = False
+
+def get_encoding():
+    """
+    Returns the tiktoken encoding, loaded on first use. tiktoken downloads the BPE file the
+    first time, so None is returned (and token counts are estimated) when that fails offline.
+    """
+    global _encoding, _loaded
+    with _lock:
+        if not _loaded:
+            _loaded = True
+            try:
+                import tiktoken
+                _encoding = tiktoken.get_encoding(encoding_name)
+            except Exception as e:
+                print(f"⚠️ tiktoken encoding unavailable ({type(e).__name__}); estimating token counts.")
+        return _encoding
+
+def count_tokens(text):
+    encoding = get_encoding()
+    if encoding is None:
+        return max(1, -(-len(text) // chars_per_token)) if text else 0
+    return len(encoding.encode(text, disallowed_special=()))
@@ -0,0 +1,239 @@
+import os
+import json
+import time
+import uuid
+import threading
+import contextvars
+from collections import deque, defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Tracing is off unless EURUS_TRACING is set; disabled spans cost one function call
+enabled = os.getenv("EURUS_TRACING", "").lower() in ("1", "true", "yes")
+# Finished spans kept in memory for JSON-lines export
+max_recorded_spans = 10000
+# Upper bounds (seconds) of the latency histogram buckets
+latency_buckets = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_lock = threading.Lock()
+_spans = deque(maxlen=max_recorded_spans)
+_current = contextvars.ContextVar("eurus_current_span", default=None)
+
+def _new_stats():
+    return {"count": 0, "sum": 0.0, "buckets": [0] * len(latency_buckets)}
+
+_stage_stats = defaultdict(_new_stats)
+_error_counts = defaultdict(int)
+_token_counts = defaultdict(int)
+
+class Span:
+    """
+    One timed stage. Use as a context manager via span(); attributes such as token counts
+    can be added with set(). An exception leaving the block is recorded as the error type.
+    """
+
+    __slots__ = ("name", "attributes", "trace_id", "span_id", "parent_id", "start",
+                 "duration", "error_type", "_token", "_started")
+
+    def __init__(self, name, attributes):
+        self.name = name
+        self.attributes = attributes
+        self.span_id = uuid.uuid4().hex[:16]
+        self.error_type = None
+        self.duration = None
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+        return self
+
+    def record_error(self, error):
+        # Accepts an exception or an already formatted error type such as "HTTP 503"
+        self.error_type = error if isinstance(error, str) else type(error).__name__
+
+    def __enter__(self):
+        parent = _current.get()
+        self.parent_id = parent.span_id if parent else None
+        self.trace_id = parent.trace_id if parent else uuid.uuid4().hex
+        self._token = _current.set(self)
+        self.start = time.time()
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.duration = time.perf_counter() - self._started
+        _current.reset(self._token)
+        if exc_type is not None and self.error_type is None:
+            self.error_type = exc_type.__name__
+        _record(self)
+        return False
+
+    def to_dict(self):
+        return {
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start": self.start,
+            "duration_ms": round(self.duration * 1000, 3),
+            "error_type": self.error_type,
+            "attributes": self.attributes,
+        }
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def set(self, **attributes):
+        return self
+
+    def record_error(self, error):
+        pass
+
+_noop_span = _NoopSpan()
+
+def span(name, **attributes):
+    """
+    Returns a context manager timing the stage `name`; a shared no-op when tracing is off.
+    """
+    if not enabled:
+        return _noop_span
+    return Span(name, attributes)
+
+def record_error(name, error, **attributes):
+    """
+    Records a zero-length span for a failure handled outside any open span.
+    """
+    if not enabled:
+        return
+    with Span(name, attributes) as failed:
+        failed.record_error(error)
+
+def current_span():
+    return _current.get() if enabled else None
+
+def _record(finished):
+    with _lock:
+        _spans.append(finished)
+        stats = _stage_stats[finished.name]
+        stats["count"] += 1
+        stats["sum"] += finished.duration
+        for i, bound in enumerate(latency_buckets):
+            if finished.duration <= bound:
+                stats["buckets"][i] += 1
+        if finished.error_type:
+            _error_counts[(finished.name, finished.error_type)] += 1
+        for kind in ("prompt_tokens", "completion_tokens", "total_tokens", "context_tokens", "tokens_saved"):
+            if kind in finished.attributes:
+                _token_counts[(finished.name, kind)] += finished.attributes[kind]
+
+def enable():
+    global enabled
+    enabled = True
+
+def disable():
+    global enabled
+    enabled = False
+
+def reset():
+    with _lock:
+        _spans.clear()
+        _stage_stats.clear()
+        _error_counts.clear()
+        _token_counts.clear()
+
+def error_counts():
+    """
+    Returns {(stage, error_type): count} of the failures recorded since the last reset.
+    """
+    with _lock:
+        return dict(_error_counts)
+
+def recorded_spans():
+    with _lock:
+        return [s.to_dict() for s in _spans]
+
+def export_jsonl(path):
+    """
+    Appends all recorded spans to `path` as JSON lines and returns how many were written.
+    """
+    spans = recorded_spans()
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "a", encoding="utf-8") as f:
+        for record in spans:
+            f.write(json.dumps(record) + "\n")
+    return len(spans)
+
+def prometheus_text():
+    """
+    Renders stage latency histograms, error counts and token counts in the Prometheus
+    text exposition format.
+    """
+    lines = [
+        "# HELP eurus_stage_duration_seconds Duration of pipeline stages.",
+        "# TYPE eurus_stage_duration_seconds histogram",
+    ]
+    with _lock:
+        for stage, stats in sorted(_stage_stats.items()):
+            for bound, count in zip(latency_buckets, stats["buckets"]):
+                lines.append(f'eurus_stage_duration_seconds_bucket{{stage="{stage}",le="{bound}"}} {count}')
+            lines.append(f'eurus_stage_duration_seconds_bucket{{stage="{stage}",le="+Inf"}} {stats["count"]}')
+            lines.append(f'eurus_stage_duration_seconds_sum{{stage="{stage}"}} {stats["sum"]:.6f}')
+            lines.append(f'eurus_stage_duration_seconds_count{{stage="{stage}"}} {stats["count"]}')
+
+        lines += [
+            "# HELP eurus_stage_errors_total Stage failures by exception type.",
+            "# TYPE eurus_stage_errors_total counter",
+        ]
+        for (stage, error_type), count in sorted(_error_counts.items()):
+            lines.append(f'eurus_stage_errors_total{{stage="{stage}",error_type="{error_type}"}} {count}')
+
+        lines += [
+            "# HELP eurus_llm_tokens_total LLM tokens used per stage, and context tokens kept and saved by packing.",
+            "# TYPE eurus_llm_tokens_total counter",
+        ]
+        for (stage, kind), count in sorted(_token_counts.items()):
+            lines.append(f'eurus_llm_tokens_total{{stage="{stage}",kind="{kind}"}} {count}')
+    return "\n".join(lines) + "\n"
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        if self.path != "/metrics":
+            self.send_response(404)
+            self.end_headers()
+            return
+        body = prometheus_text().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+def serve_metrics(port=9464, host="127.0.0.1"):
+    """
+    Serves prometheus_text() on http://host:port/metrics from a daemon thread.
+    """
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+_callback_handlers = None
+
+def callbacks():
+    """
+    LangChain callbacks recording LLM calls as spans, or None while tracing is disabled.
+    The handler (and langchain_core) is only loaded once tracing is on.
+    """
+    global _callback_handlers
+    if not enabled:
+        return None
+    if _callback_handlers is None:
+        from helper_functions.tracing_callbacks import TracingCallbackHandler
+        _callback_handlers = [TracingCallbackHandler()]
+    return _callback_handlers
@@ -0,0 +1,49 @@
+import time
+import uuid
+from langchain_core.callbacks import BaseCallbackHandler
+
+from helper_functions import tracing
+
+class TracingCallbackHandler(BaseCallbackHandler):
+    """
+    LangChain callback recording each LLM call as an "llm_completion" span, with token
+    usage and the enclosing stage (for example "query_expansion").
+    """
+
+    def __init__(self):
+        self._open = {}
+
+    def _start(self, run_id):
+        if not tracing.enabled:
+            return
+        parent = tracing._current.get()
+        opened = tracing.Span("llm_completion", {"stage": parent.name if parent else None})
+        opened.parent_id = parent.span_id if parent else None
+        opened.trace_id = parent.trace_id if parent else uuid.uuid4().hex
+        opened.start = time.time()
+        opened._started = time.perf_counter()
+        self._open[run_id] = opened
+
+    def on_llm_start(self, serialized, prompts, *, run_id, **kwargs):
+        self._start(run_id)
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        self._start(run_id)
+
+    def _finish(self, run_id, error=None, usage=None):
+        opened = self._open.pop(run_id, None)
+        if opened is None:
+            return
+        opened.duration = time.perf_counter() - opened._started
+        if error is not None:
+            opened.record_error(error)
+        if usage:
+            opened.set(**{k: usage[k] for k in ("prompt_tokens", "completion_tokens", "total_tokens") if k in usage})
+        tracing._record(opened)
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        usage = (response.llm_output or {}).get("token_usage") if response else None
+        self._finish(run_id, usage=usage)
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._finish(run_id, error=error)
@@ -25,4 +25,22 @@ def check_password():
     )  
     if "password_correct" in st.session_state:  
         st.error("😕 Password incorrect")  
-    return False
\ No newline at end of file
+    return False
+
+def render_response_stream(events):
+    """Renders events from `stream_final_response` as they arrive and returns the final text."""
+    status = st.empty()
+    placeholder = st.empty()
+    text = ""
+    for event in events:
+        if event["type"] == "status":
+            status.caption(event["text"])
+        elif event["type"] == "token":
+            status.empty()
+            text += event["text"]
+            placeholder.markdown(text + "▌")
+        elif event["type"] == "replace":
+            status.empty()
+            text = event["text"]
+    placeholder.markdown(text)
+    return text
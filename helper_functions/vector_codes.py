@@ -0,0 +1,142 @@
+"""
+Compact int8 and binary codes of the chunk vectors, stored as memory-mapped arrays.
+
+build_vector_codes (numpy_index) saves, next to a published Chroma collection, the
+unit-length chunk vectors in NumpyVectorIndex row order together with two compressed
+copies of them: int8 scalar codes (one byte per dimension, scaled per dimension) and
+binary codes (one bit per dimension, set where the value is above that dimension's mean).
+Serving workers memory-map the files and score the filtered rows on the codes; only a
+shortlist of the best rows is re-ranked with the exact vectors, so the float32 matrix is
+paged in a few rows at a time instead of being held in every worker's memory.
+"""
+import os
+import json
+import numpy as np
+
+vector_codes_dirname = "vector_codes"
+quantizations = ("int8", "binary")
+# Rows re-ranked with the exact vectors per result needed (k, or fetch_k for MMR); one
+# bit per dimension ranks more coarsely than a byte, so binary codes need a longer shortlist
+rerank_factors = {"int8": 4, "binary": 10}
+
+_rows_filename = "rows.json"
+_vectors_filename = "float32.npy"
+# The eight +1/-1 signs each byte value encodes, most significant bit first
+_byte_signs = np.unpackbits(np.arange(256, dtype=np.uint8)[:, None], axis=1).astype(np.float32) * 2 - 1
+
+class Int8Codes:
+    """
+    One signed byte per dimension; dimension d is stored as round(x / scales[d]).
+    """
+
+    name = "int8"
+
+    def __init__(self, codes, scales):
+        self.codes = codes
+        self.scales = scales
+
+    @classmethod
+    def encode(cls, matrix):
+        scales = np.abs(matrix).max(axis=0) / 127
+        scales[scales == 0] = 1.0
+        codes = np.clip(np.rint(matrix / scales), -127, 127).astype(np.int8)
+        return cls(codes, scales.astype(np.float32))
+
+    def scores(self, queries, rows):
+        """
+        Approximate dot products of each query with the given rows.
+        """
+        return (queries * self.scales) @ self.codes[rows].T.astype(np.float32)
+
+    @property
+    def params(self):
+        return self.scales
+
+    @property
+    def nbytes(self):
+        return self.codes.nbytes + self.scales.nbytes
+
+class BinaryCodes:
+    """
+    One bit per dimension, packed eight to a byte: whether x is above the dimension's mean
+    (its sign, for centred embeddings like OpenAI's). Queries are not quantized: a row
+    scores the centred query's dot product with its bits read as +1/-1, which ranks far
+    better than the Hamming distance between bit strings.
+    """
+
+    name = "binary"
+
+    def __init__(self, codes, thresholds):
+        self.codes = codes
+        self.thresholds = thresholds
+
+    @classmethod
+    def encode(cls, matrix):
+        thresholds = matrix.mean(axis=0).astype(np.float32)
+        return cls(np.packbits(matrix > thresholds, axis=1), thresholds)
+
+    def scores(self, queries, rows):
+        """
+        Approximate dot products of each centred query with the given rows' +1/-1 bits,
+        summed from a per-query table of every byte value's contribution.
+        """
+        centred = queries - self.thresholds
+        blocks = self.codes.shape[1]
+        centred = np.pad(centred, ((0, 0), (0, blocks * 8 - centred.shape[1]))).reshape(len(queries), blocks, 8)
+        tables = centred @ _byte_signs.T
+        return tables[:, np.arange(blocks), self.codes[rows]].sum(axis=2)
+
+    @property
+    def params(self):
+        return self.thresholds
+
+    @property
+    def nbytes(self):
+        return self.codes.nbytes + self.thresholds.nbytes
+
+_codecs = {codec.name: codec for codec in (Int8Codes, BinaryCodes)}
+
+def write_codes(directory, matrix, ids, space):
+    """
+    Saves the exact vectors, their codes in every quantization and the row order.
+    """
+    os.makedirs(directory, exist_ok=True)
+    # Codes copied over from the previous version stop counting as finished until rewritten
+    if os.path.exists(os.path.join(directory, _rows_filename)):
+        os.remove(os.path.join(directory, _rows_filename))
+    matrix = np.ascontiguousarray(matrix, dtype=np.float32)
+    np.save(os.path.join(directory, _vectors_filename), matrix)
+    for name, codec in _codecs.items():
+        encoded = codec.encode(matrix)
+        np.save(os.path.join(directory, f"{name}.npy"), encoded.codes)
+        np.save(os.path.join(directory, f"{name}_params.npy"), encoded.params)
+    # Written last: a directory without it is an unfinished build
+    with open(os.path.join(directory, _rows_filename), "w", encoding="utf-8") as f:
+        json.dump({"ids": list(ids), "space": space, "dimensions": int(matrix.shape[1])}, f)
+
+def read_codes(directory, quantization):
+    """
+    Memory-maps what write_codes saved. Returns (ids, space, exact vectors, codes), with
+    codes None when `quantization` is not one of `quantizations`, or None when the
+    directory holds no finished codes.
+    """
+    try:
+        with open(os.path.join(directory, _rows_filename), "r", encoding="utf-8") as f:
+            rows = json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+    matrix = np.load(os.path.join(directory, _vectors_filename), mmap_mode="r")
+    codes = None
+    if quantization in _codecs:
+        codes = _codecs[quantization](
+            np.load(os.path.join(directory, f"{quantization}.npy"), mmap_mode="r"),
+            np.load(os.path.join(directory, f"{quantization}_params.npy")),
+        )
+    return rows["ids"], rows["space"], matrix, codes
+
+def disk_bytes(directory):
+    """
+    Size on disk of each saved array, by file name.
+    """
+    return {name: os.path.getsize(os.path.join(directory, name))
+            for name in sorted(os.listdir(directory)) if name.endswith(".npy")}
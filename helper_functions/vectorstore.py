@@ -1,26 +1,32 @@
 import os
-from dotenv import load_dotenv
-from bs4 import BeautifulSoup
-from langchain_core.documents import Document
-from langchain_openai import OpenAIEmbeddings
-from langchain_chroma import Chroma
-from langchain.text_splitter import RecursiveCharacterTextSplitter
+import sys
+import json
+import time
+import uuid
+import shutil
+import hashlib
+import argparse
+from collections import Counter
 
-from helper_functions.web_scraper import scrape_and_clean
+from helper_functions import clients, tracing
 
-# Load environment variables
-load_dotenv()
+# Scraping, chunking, Chroma and the embedding client are imported by the functions
+# that build an index, so readers of the index version pay nothing for them.
 
-embedding = OpenAIEmbeddings(openai_api_key=os.getenv("OPENAI_API_KEY"))
 persist_directory = "data/chroma_db"
+
+index_version_filename = "INDEX_VERSION"
+http_validators_filename = "http_validators.json"
+lexical_index_filename = "bm25_index.json"
+ingest_checkpoint_filename = "ingest_checkpoint.json"
+index_versions_dirname = "versions"
+index_manifest_filename = "manifest.json"
+# Completed index versions kept on disk for rollback, including the published one
+index_versions_to_keep = 3
 manual_scrape_dir = "data/manual_scrapes"
 
-# Improved splitter to chunk on paragraphs and smaller units
-splitter = RecursiveCharacterTextSplitter(
-    chunk_size=1000,
-    chunk_overlap=150,
-    separators=["\n\n", "\n", ".", " "]
-)
+# Version tag last read from each tag file, with the file's identity when it was read
+_index_versions = {}
 
 # URL to grant title mapping dictionary
 url_metadata_map = {
@@ -48,17 +54,19 @@ url_metadata_map = {
     "https://www.aetos.com.sg/SFQB": "SkillsFuture Queen Bee by AETOS"
 }
 
-def load_manual_documents(directory_path):
+def load_manual_documents(directory_path, cache_dir=None):
     """
     Load manual .html documents from a directory and convert them to Document objects.
+    Extracted text is cached per file and reused until the file changes.
     """
+    from langchain_core.documents import Document
+    from helper_functions.html_extractor import extract_file
+
     manual_docs = []
     for filename in os.listdir(directory_path):
         if filename.endswith(".html"):
             file_path = os.path.join(directory_path, filename)
-            with open(file_path, "r", encoding="utf-8") as f:
-                soup = BeautifulSoup(f, "html.parser")
-                content = soup.get_text(separator="\n", strip=True)
+            content = extract_file(file_path, cache_dir=cache_dir)
 
             normalized_name = filename.replace(".html", "").lower()
 
@@ -81,43 +89,367 @@ def load_manual_documents(directory_path):
             print(f"📄 Loaded HTML file: {filename}")
     return manual_docs
 
-def refresh_vectorstore(urls):
+def get_index_version(directory=None):
+    """
+    Returns the version tag of the index currently published in the persist directory.
+    Readers compare this tag to know when a refresh has replaced the index under them.
+    It is read on every answer-cache lookup, so the tag is only re-read when the tag
+    file was replaced since the last read, by this process or by a refresh elsewhere.
+    """
+    path = os.path.join(directory or persist_directory, index_version_filename)
+    try:
+        stat = os.stat(path)
+        # Publishing renames a new file into place, so the inode changes with every tag
+        key = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        cached = _index_versions.get(path)
+        if cached and cached[0] == key:
+            return cached[1]
+        with open(path, "r", encoding="utf-8") as f:
+            version = f.read().strip() or None
+    except FileNotFoundError:
+        return None
+    _index_versions[path] = (key, version)
+    return version
+
+def get_index_directory(version=None, directory=None):
+    """
+    Returns the directory holding the Chroma collection and BM25 index of `version`,
+    the published version by default. Indexes built before versioning, or updated in
+    place, live directly in the persist directory.
+    """
+    directory = directory or persist_directory
+    version = version or get_index_version(directory)
+    if version:
+        path = os.path.join(directory, index_versions_dirname, version)
+        if os.path.isdir(path):
+            return path
+    return directory
+
+def publish_index_version(directory=None, version=None):
+    """
+    Points readers at `version` by rewriting the version tag; a fresh random tag is used
+    when no version is given. The tag is written to a temp file and renamed, so the switch
+    is atomic and readers never see a partial value.
+    """
+    directory = directory or persist_directory
+    os.makedirs(directory, exist_ok=True)
+    version = version or uuid.uuid4().hex
+    path = os.path.join(directory, index_version_filename)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(version)
+    os.replace(tmp_path, path)
+    _index_versions.pop(path, None)
+    return version
+
+def read_manifest(version, directory=None):
+    """
+    Returns the manifest of a completed index version, or None for unfinished builds.
+    """
+    path = os.path.join(directory or persist_directory, index_versions_dirname, version, index_manifest_filename)
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+def list_index_versions(directory=None):
+    """
+    Returns the manifests of all completed index versions, oldest first.
+    """
+    root = os.path.join(directory or persist_directory, index_versions_dirname)
+    names = sorted(os.listdir(root)) if os.path.isdir(root) else []
+    return [manifest for manifest in (read_manifest(name, directory) for name in names) if manifest]
+
+def _prepare_build_directory(fresh=False):
+    """
+    Returns (version, path, resumed) for the side directory the next index is built in.
+    An unfinished build left by a crashed refresh is resumed; otherwise the published
+    index is copied, so unchanged and temporarily unreachable sources carry over.
+    With fresh=True the build starts empty, and unfinished builds (copies of an index
+    built by another pipeline) are deleted instead.
+    """
+    root = os.path.join(persist_directory, index_versions_dirname)
+    current = get_index_version()
+    if os.path.isdir(root):
+        for name in sorted(os.listdir(root), reverse=True):
+            if name != current and read_manifest(name) is None:
+                if fresh:
+                    shutil.rmtree(os.path.join(root, name), ignore_errors=True)
+                    continue
+                print(f"♻️ Resuming unfinished index build {name}.")
+                return name, os.path.join(root, name), True
+
+    # Names sort in build order: timestamp with microseconds
+    now = time.time()
+    version = f"{time.strftime('%Y%m%d-%H%M%S', time.localtime(now))}-{int(now * 1e6) % 1000000:06d}"
+    path = os.path.join(root, version)
+    published = get_index_directory()
+    if not fresh and os.path.exists(os.path.join(published, "chroma.sqlite3")):
+        shutil.copytree(published, path, ignore=shutil.ignore_patterns(
+            index_versions_dirname, index_version_filename, index_manifest_filename,
+            http_validators_filename, ingest_checkpoint_filename, "*.tmp"
+        ))
+    else:
+        os.makedirs(path)
+    return version, path, False
+
+def validate_index(db, lexical_index):
+    """
+    Returns a list of problems that should stop a freshly built index from being published.
+    """
+    count = db._collection.count()
+    if count == 0:
+        return ["the collection is empty"]
+    if lexical_index is None or len(lexical_index) != count:
+        return [f"the BM25 index has {len(lexical_index) if lexical_index else 0} chunks, the collection {count}"]
+    if not db.similarity_search("grant eligibility", k=1):
+        return ["a smoke-test query returned no chunks"]
+    return []
+
+def pipeline_version(embedding=None):
+    """
+    Describes everything besides page text that shapes the stored chunks: the embedding
+    model, the extraction and chunking rules and the URL to grant title mapping. A refresh
+    whose pipeline differs from the published manifest's rebuilds every chunk.
+    """
+    from helper_functions import html_extractor, text_splitter
+
+    embedding = embedding if embedding is not None else clients.get_embedding()
+    return {
+        "embedding_model": getattr(embedding, "model_name", type(embedding).__name__),
+        "extractor": f"{html_extractor.default_backend}-{html_extractor.EXTRACTOR_VERSION}",
+        "splitter": f"{text_splitter.SPLITTER_VERSION}-{text_splitter.chunk_max_tokens}-{text_splitter.section_min_tokens}",
+        "url_metadata": hashlib.sha256(json.dumps(url_metadata_map, sort_keys=True).encode("utf-8")).hexdigest()[:16],
+    }
+
+def _published_chunks(sources, embedding):
+    """
+    Returns the published chunks of `sources` as Documents, with grant titles from the
+    current url_metadata_map, for carrying pages that could not be fetched into a rebuild.
+    """
+    from langchain_chroma import Chroma
+    from langchain_core.documents import Document
+
+    published = get_index_directory()
+    if not sources or not os.path.exists(os.path.join(published, "chroma.sqlite3")):
+        return []
+    stored = Chroma(persist_directory=published, embedding_function=embedding).get(
+        where={"source": {"$in": sorted(sources)}}, include=["documents", "metadatas"]
+    )
+    chunks = []
+    for text, metadata in zip(stored["documents"], stored["metadatas"]):
+        metadata = dict(metadata or {})
+        if metadata.get("source") in url_metadata_map:
+            metadata["grant_title"] = url_metadata_map[metadata["source"]]
+        chunks.append(Document(page_content=text, metadata=metadata))
+    return chunks
+
+def write_manifest(db, version, path, parent=None, fingerprints=None):
+    stored = db.get(include=["metadatas"])
+    embedding = db.embeddings
+    sources = Counter((meta or {}).get("source", "") for meta in stored["metadatas"])
+    manifest = {
+        "version": version,
+        "built_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "chunk_count": len(stored["ids"]),
+        "sources": dict(sorted(sources.items())),
+        "embedding_model": getattr(embedding, "model_name", type(embedding).__name__),
+        "parent": parent,
+        "pipeline": pipeline_version(embedding),
+        # Normalized content fingerprint per source page, compared by the next refresh
+        "fingerprints": dict(sorted((fingerprints or {}).items())),
+    }
+    manifest_path = os.path.join(path, index_manifest_filename)
+    with open(f"{manifest_path}.tmp", "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(f"{manifest_path}.tmp", manifest_path)
+    return manifest
+
+def gc_index_versions(keep=None):
+    """
+    Deletes completed index versions beyond the newest `keep`, never the published one.
+    Returns the deleted version names.
+    """
+    keep = keep or index_versions_to_keep
+    current = get_index_version()
+    versions = [manifest["version"] for manifest in list_index_versions()]
+    deleted = [version for version in versions[:-keep] if version != current]
+    for version in deleted:
+        shutil.rmtree(os.path.join(persist_directory, index_versions_dirname, version), ignore_errors=True)
+    return deleted
+
+def rollback_index(version=None):
+    """
+    Publishes `version`, or the completed version before the published one, and returns it.
+    The saved HTTP validators describe the newer content, so they are dropped: otherwise
+    304s would keep the rolled-back pages as they are and the newer content would never
+    be fetched again.
+    """
+    current = get_index_version()
+    versions = [manifest["version"] for manifest in list_index_versions()]
+    if version is None:
+        older = versions[:versions.index(current)] if current in versions else versions[:-1]
+        if not older:
+            raise ValueError("There is no older index version to roll back to.")
+        version = older[-1]
+    elif version not in versions:
+        raise ValueError(f"Unknown index version: {version}")
+    published = publish_index_version(version=version)
+    try:
+        os.remove(os.path.join(persist_directory, http_validators_filename))
+    except FileNotFoundError:
+        pass
+    return published
+
+def refresh_vectorstore(urls, status=None):
+    """
+    Builds a new index version on the side, validates it and publishes it by switching
+    the version tag. Retrievers move to the new version on their next query; the
+    published index is never written to.
+
+    When every page's content fingerprint matches the published manifest, the refresh
+    stops before chunking or embedding. When the pipeline (see pipeline_version) differs
+    from the published manifest's, every page is fetched in full and the index is rebuilt
+    from scratch. `status`, if given, is filled with the outcome, the version and a record
+    per fetched URL.
+    """
+    from langchain_chroma import Chroma
+    from helper_functions.web_scraper import clean_page
+    from helper_functions.text_splitter import splitter
+    from helper_functions.fetcher import ConcurrentFetcher, print_fetch_report
+    from helper_functions.indexer import index_documents, print_index_report, content_fingerprint
+    from helper_functions.bm25_index import build_lexical_index
+    from helper_functions.grant_profiles import build_grant_profiles, grant_profiles_filename
+    from helper_functions.numpy_index import build_vector_codes
+    from helper_functions.vector_codes import vector_codes_dirname
+
     print("🚀 Starting vectorstore refresh...")
+    status = {} if status is None else status
+    current = get_index_version()
+    published = (read_manifest(current) or {}) if current else {}
+    previous_fingerprints = published.get("fingerprints")
+    embedding = clients.get_embedding()
+    pipeline = pipeline_version(embedding)
+    # An index built by another pipeline cannot be updated chunk by chunk: unchanged chunk
+    # IDs would keep their old vectors and metadata
+    rebuild = bool(published) and published.get("pipeline") != pipeline
+    if rebuild:
+        print(f"🔁 Pipeline changed since index version {current}; rebuilding every chunk.")
+
+    # 1. Scrape live URLs concurrently; a rebuild needs every page, so none are conditional
+    fetcher = ConcurrentFetcher(
+        validators_path=os.path.join(persist_directory, http_validators_filename),
+        conditional=not rebuild,
+    )
+    start = time.perf_counter()
+    results = fetcher.fetch_all(urls)
+    print_fetch_report(results, wall_time=time.perf_counter() - start)
 
-    # 1. Scrape live URLs
     docs = []
-    for url in urls:
-        doc = scrape_and_clean(url, url_metadata_map)
-        if doc:
-            docs.append(doc)
+    retained_sources = set()
+    fingerprints = {}
+    status["urls"] = []
+    fetched_at = time.strftime("%Y-%m-%dT%H:%M:%S%z")
+    for result in results:
+        if result.ok:
+            with tracing.span("clean_page", url=result.url):
+                docs.append(clean_page(result.url, result.text, url_metadata_map))
+            fingerprints[result.url] = content_fingerprint(docs[-1].page_content)
+        elif result.not_modified or result.status not in (404, 410):
+            # Unchanged or temporarily unreachable: keep what is already indexed
+            retained_sources.add(result.url)
+            if result.url in (previous_fingerprints or {}):
+                fingerprints[result.url] = previous_fingerprints[result.url]
+        status["urls"].append({
+            "url": result.url, "fetched_at": fetched_at, "status": result.status,
+            "elapsed": round(result.elapsed, 3), "error": result.error, "fingerprint": fingerprints.get(result.url),
+        })
     print(f"✅ Scraped {len(docs)} documents from URLs.")
 
     # 2. Load manual .html documents
     manual_docs = load_manual_documents(manual_scrape_dir)
     docs.extend(manual_docs)
+    fingerprints.update({doc.metadata["source"]: content_fingerprint(doc.page_content) for doc in manual_docs})
     print(f"📄 Total documents after adding manual HTMLs: {len(docs)}")
-    
-    # 3. Chunk documents with improved splitter
-    all_chunks = []
-    for doc in docs:
-        chunks = splitter.split_text(doc.page_content)
-        for chunk in chunks:
-            all_chunks.append(Document(page_content=chunk, metadata=doc.metadata))
+
+    changed_sources = sorted(
+        source for source in set(fingerprints) | set(previous_fingerprints or {})
+        if fingerprints.get(source) != (previous_fingerprints or {}).get(source)
+    )
+    status.update(version=current, changed_sources=changed_sources)
+    if previous_fingerprints is not None and not changed_sources and not rebuild:
+        fetcher.save_validators()
+        fetcher.close()
+        status["outcome"] = "unchanged"
+        print(f"✅ No content changes since index version {current}; skipped chunking and embedding.")
+        return {}
+
+    # 3. Chunk documents along their headings and lists, labelling each chunk's section
+    all_chunks = splitter.split_documents(docs)
     print(f"📚 Split into {len(all_chunks)} chunks.")
+    if rebuild and retained_sources:
+        carried = _published_chunks(retained_sources, embedding)
+        all_chunks.extend(carried)
+        print(f"📦 Carried over {len(carried)} published chunks of {len(retained_sources)} unreachable pages.")
 
     # 4. Check for empty chunks
     if len(all_chunks) == 0:
         print("⚠️ No chunks to add to vectorstore. Aborting.")
+        fetcher.close()
+        status["outcome"] = "aborted"
         return
 
-    # 5. Save chunks to vectorstore
-    db = Chroma.from_documents(
-        documents=all_chunks,
-        embedding=embedding,
-        persist_directory=persist_directory
+    # 5. Upsert new or changed chunks into a copy of the published index (or an empty one)
+    version, build_directory, resumed = _prepare_build_directory(fresh=rebuild)
+    db = Chroma(
+        persist_directory=build_directory,
+        embedding_function=embedding
     )
-    
-    print("✅ Vectorstore refresh complete.")
+    with tracing.span("index", chunks=len(all_chunks)):
+        report = index_documents(
+            db, all_chunks, keep_sources=retained_sources,
+            checkpoint_path=os.path.join(build_directory, ingest_checkpoint_filename)
+        )
+    print_index_report(report)
+    # HTTP validators are only saved once the pages they describe are in a published
+    # index; otherwise the next refresh would get 304s and never see the change
+    fetcher.close()
+
+    # A resumed build already holds chunks ingested before a crash, which the published
+    # index lacks; and fingerprints are only ever saved with the content they describe
+    changed = resumed or published.get("fingerprints") != fingerprints or any(
+        counts["added"] or counts["updated"] or counts["deleted"] for counts in report.values()
+    )
+    if not changed and get_index_directory() != persist_directory:
+        shutil.rmtree(build_directory, ignore_errors=True)
+        fetcher.save_validators()
+        status["outcome"] = "up_to_date"
+        print(f"✅ Vectorstore already up to date (index version {current}).")
+        return report
+
+    # 6. Build the lexical index, validate, then switch readers over to the new version
+    lexical_index = build_lexical_index(db, os.path.join(build_directory, lexical_index_filename))
+    print(f"🔤 Built BM25 index over {len(lexical_index)} chunks.")
+    profiles = build_grant_profiles(db, os.path.join(build_directory, grant_profiles_filename))
+    print(f"🗂️ Compiled {len(profiles)} grant profiles.")
+    vector_index = build_vector_codes(db, os.path.join(build_directory, vector_codes_dirname))
+    print(f"🗜️ Saved int8 and binary codes of {len(vector_index)} vectors.")
+    problems = validate_index(db, lexical_index)
+    if problems:
+        shutil.rmtree(build_directory, ignore_errors=True)
+        print(f"❌ Index version {version} failed validation and was not published: {'; '.join(problems)}")
+        status.update(outcome="invalid", problems=problems)
+        return report
+
+    manifest = write_manifest(db, version, build_directory, parent=current, fingerprints=fingerprints)
+    publish_index_version(version=version)
+    fetcher.save_validators()
+    status.update(outcome="published", version=version)
+    deleted = gc_index_versions()
+    print(f"✅ Published index version {version} ({manifest['chunk_count']} chunks, "
+          f"{len(manifest['sources'])} sources); removed {len(deleted)} old versions.")
+    return report
 
 urls_to_scrape = [
     "https://www.enterprisesg.gov.sg/financial-support/enterprise-development-grant",
@@ -144,5 +476,27 @@ urls_to_scrape = [
     "https://www.aetos.com.sg/SFQB"
 ]
 
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Refresh, list or roll back the grant index.")
+    parser.add_argument("--list", action="store_true", help="list completed index versions")
+    parser.add_argument("--rollback", nargs="?", const="", metavar="VERSION",
+                        help="publish VERSION, or the version before the published one")
+    args = parser.parse_args(argv)
+
+    if args.list:
+        current = get_index_version()
+        for manifest in list_index_versions():
+            marker = "👉" if manifest["version"] == current else "  "
+            print(f"{marker} {manifest['version']}  {manifest['built_at']}  {manifest['chunk_count']} chunks  "
+                  f"{len(manifest['sources'])} sources  {manifest['embedding_model']}")
+    elif args.rollback is not None:
+        print(f"⏪ Rolled back to index version {rollback_index(args.rollback or None)}.")
+    else:
+        # Under the refresh daemon's lock, so a manual run never overlaps a scheduled one
+        from helper_functions import refresh_daemon
+        if refresh_daemon.run_refresh(urls_to_scrape)["outcome"] in refresh_daemon.failed_outcomes:
+            return 1
+    return 0
+
 if __name__ == "__main__":
-    refresh_vectorstore(urls_to_scrape)
\ No newline at end of file
+    sys.exit(main())
\ No newline at end of file